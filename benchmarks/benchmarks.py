@@ -0,0 +1,108 @@
+"""
+Benchmarks of the scanning, parsing, planning and dry-run apply phases.
+
+Benchmarks follow the asv conventions: every class is set up once per library size with ``setup(entries)``, each
+``time_*`` method is one timed benchmark and ``teardown(entries)`` removes the generated library.
+"""
+import io
+import os
+import shutil
+import logging
+import tempfile
+import contextlib
+
+from mediarenamer import file_utils, utils
+from mediarenamer.commands import plan_movie_library
+from mediarenamer.plan import apply_plan
+from mediarenamer.walker import walk_library
+
+from .generate import default_benchmark_directory, generate_movie_library, generate_tv_library
+
+
+LOG = logging.getLogger('mediarenamer.benchmarks')
+LOG.addHandler(logging.NullHandler())
+LOG.propagate = False
+
+
+class _LibraryBenchmark(object):
+
+    params = [1000, 10000, 100000, 500000]
+    param_names = ['entries']
+    # Generating and walking the largest library takes minutes, well past the default asv timeout
+    timeout = 1800
+
+    def setup(self, entries: int):
+        self.directory = tempfile.mkdtemp(prefix='mediarenamer-bench-', dir=default_benchmark_directory())
+
+    def teardown(self, entries: int):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class MovieScan(_LibraryBenchmark):
+
+    def setup(self, entries: int):
+        super(MovieScan, self).setup(entries)
+        self.library = generate_movie_library(self.directory, entries)
+        self.folders = file_utils.take_directory_snapshot(self.library).folders
+
+    def time_snapshot_library(self, entries: int):
+        for folder in file_utils.take_directory_snapshot(self.library).folders:
+            file_utils.take_directory_snapshot(folder)
+
+    def time_walk_library_4_jobs(self, entries: int):
+        walk_library(self.folders, lambda folder, claims: file_utils.take_directory_snapshot(folder), jobs=4)
+
+    def time_recursively_list_contents(self, entries: int):
+        file_utils.recursively_list_contents_in_directory(self.library)
+
+
+class TVScan(_LibraryBenchmark):
+
+    def setup(self, entries: int):
+        super(TVScan, self).setup(entries)
+        self.library = generate_tv_library(self.directory, entries)
+        self.seasons = file_utils.recursively_list_contents_in_directory(self.library)[0]
+
+    def time_scan_directory(self, entries: int):
+        for season in self.seasons:
+            file_utils.scan_directory(season)
+
+
+class Parse(_LibraryBenchmark):
+
+    def setup(self, entries: int):
+        super(Parse, self).setup(entries)
+        library = generate_tv_library(self.directory, entries)
+        self.names = [os.path.basename(file) for file in file_utils.recursively_list_contents_in_directory(library)[1]]
+        self.parser = utils.FilenameParser()
+
+    def time_parse_many(self, entries: int):
+        self.parser.parse_many(self.names)
+
+    def time_parse_names_process_pool(self, entries: int):
+        utils.parse_names(self.names, workers=os.cpu_count() or 1)
+
+    def time_extract_functions(self, entries: int):
+        for name in self.names:
+            utils.extract_season_number_from_directory_name(name)
+            utils.extract_episode_number_from_file_name(name)
+            utils.extract_movie_year_from_string(name)
+
+
+class MoviePlan(_LibraryBenchmark):
+
+    def setup(self, entries: int):
+        super(MoviePlan, self).setup(entries)
+        self.library = generate_movie_library(self.directory, entries)
+        self.snapshot = file_utils.take_directory_snapshot(self.library)
+        self.plan = plan_movie_library(self.library, self.snapshot, 1, LOG)
+
+    def time_plan(self, entries: int):
+        plan_movie_library(self.library, self.snapshot, 1, LOG)
+
+    def time_plan_4_jobs(self, entries: int):
+        plan_movie_library(self.library, self.snapshot, 4, LOG)
+
+    def time_dry_run_apply(self, entries: int):
+        with contextlib.redirect_stdout(io.StringIO()):
+            apply_plan(self.plan, dry_run=True, log=LOG)
@@ -0,0 +1,182 @@
+import os
+import random
+from typing import List, Optional
+
+
+TITLE_WORDS = [
+    'The', 'Last', 'Dark', 'Night', 'Star', 'War', 'Lord', 'Ring', 'King', 'Ghost', 'Shadow', 'City', 'River',
+    'Empire', 'Blade', 'Runner', 'Alien', 'Matrix', 'Heat', 'Storm', 'Iron', 'Man', 'Fire', 'Ice', 'Blood',
+    'Moon', 'Sun', 'Dream', 'Edge', 'Tomorrow', 'Planet', 'Silent', 'Hill', 'Lost', 'Highway', 'Mad', 'Max',
+]
+
+RELEASE_TAGS = [
+    '1080p.BluRay.x264-SPARKS', '2160p.UHD.BluRay.x265-TERMiNAL', '720p.WEBRip.x264-GalaxyRG',
+    '1080p.AMZN.WEB-DL.DDP5.1.H.264-NTb', '(1080p BluRay x265 HEVC 10bit AAC 5.1 Tigole)',
+]
+
+JUNK_FILES = ['poster.jpg', 'fanart.jpg', 'cover.jpg', 'RARBG.txt', 'sample.jpg']
+
+MEDIA_EXTENSIONS = ['mkv', 'mkv', 'mkv', 'mp4']
+
+
+def _touch(path: str):
+    os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o644))
+
+
+def _tag(number: int) -> str:
+    # Letters only, digits in a title would be picked up as a year
+    tag = ''
+    while True:
+        number, remainder = divmod(number, 26)
+        tag = chr(ord('a') + remainder) + tag
+        if not number:
+            return tag.capitalize()
+
+
+def _title(rng: random.Random) -> str:
+    return ' '.join(rng.choice(TITLE_WORDS) for _ in range(rng.randint(1, 4)))
+
+
+def movie_names(count: int, seed: int = 0) -> List[str]:
+    """
+    Generates realistic, scene style movie release names.
+
+    :param count: Number of names.
+    :param seed: Seed of the random generator.
+
+    :return: List of release names without extension.
+    """
+    rng = random.Random(seed)
+    names = []
+    for number in range(count):
+        title = f'{_title(rng)} {_tag(number)}'
+        year = rng.randint(1950, 2024)
+        style = rng.random()
+        if style < 0.4:
+            names.append(f'{title.replace(" ", ".")}.{year}.{rng.choice(RELEASE_TAGS)}')
+        elif style < 0.8:
+            names.append(f'{title} ({year})')
+        else:
+            names.append(f'{title} {year} {rng.choice(RELEASE_TAGS)}')
+    return names
+
+
+def episode_names(show: str, season: int, episodes: int, seed: int = 0) -> List[str]:
+    """
+    Generates realistic episode file names of a season.
+
+    :param show: The show name.
+    :param season: The season number.
+    :param episodes: Number of episodes.
+    :param seed: Seed of the random generator.
+
+    :return: List of episode file names.
+    """
+    rng = random.Random(seed)
+    names = []
+    for episode in range(1, episodes + 1):
+        if rng.random() < 0.5:
+            names.append(f'{show} - S{season:02d}E{episode:02d} - {_title(rng)} (1080p WEB-DL x265).mkv')
+        else:
+            names.append(f'{show.replace(" ", ".")}.S{season:02d}E{episode:02d}.720p.WEBRip.x264-GalaxyTV.mkv')
+    return names
+
+
+def generate_movie_library(root: str, entries: int = 1000, seed: int = 0) -> str:
+    """
+    Generates a synthetic Movie library.
+
+    Movie folders hold a media file and junk jpgs, some of them a Featurettes and a Subs folder, and a few movies
+    are left as loose files in the library root.
+
+    :param root: Directory the ``Movie`` library is created in.
+    :param entries: Approximate number of files and folders to create.
+    :param seed: Seed of the random generator.
+
+    :return: Path of the Movie library.
+    """
+    rng = random.Random(seed)
+    library = os.path.join(root, 'Movie')
+    os.makedirs(library, exist_ok=True)
+    created = 0
+    for name in movie_names(max(1, entries // 2), seed):
+        if created >= entries:
+            break
+        extension = rng.choice(MEDIA_EXTENSIONS)
+        if rng.random() < 0.05:
+            _touch(os.path.join(library, f'{name}.{extension}'))
+            created += 1
+            continue
+        folder = os.path.join(library, name)
+        os.mkdir(folder)
+        _touch(os.path.join(folder, f'{name.lower()}.{extension}'))
+        created += 2
+        for junk in rng.sample(JUNK_FILES, rng.randint(0, 2)):
+            _touch(os.path.join(folder, junk))
+            created += 1
+        if rng.random() < 0.2:
+            featurettes = os.path.join(folder, 'Featurettes')
+            os.mkdir(featurettes)
+            _touch(os.path.join(featurettes, 'Behind the Scenes.mkv'))
+            _touch(os.path.join(featurettes, 'thumb.jpg'))
+            created += 3
+        if rng.random() < 0.3:
+            subs = os.path.join(folder, 'Subs')
+            os.mkdir(subs)
+            _touch(os.path.join(subs, 'English.srt'))
+            created += 2
+    return library
+
+
+def generate_tv_library(root: str, entries: int = 1000, seed: int = 0, seasons: int = 5,
+                        episodes: int = 12) -> str:
+    """
+    Generates a synthetic TV library of shows, season folders and episodes with some junk files.
+
+    :param root: Directory the ``TV`` library is created in.
+    :param entries: Approximate number of files and folders to create.
+    :param seed: Seed of the random generator.
+    :param seasons: Number of seasons per show.
+    :param episodes: Number of episodes per season.
+
+    :return: Path of the TV library.
+    """
+    rng = random.Random(seed)
+    library = os.path.join(root, 'TV')
+    os.makedirs(library, exist_ok=True)
+    created = 0
+    number = 0
+    while created < entries:
+        show = f'{_title(rng)} {_tag(number)}'
+        year = rng.randint(1950, 2024)
+        show_folder = os.path.join(library, f'{show} ({year})')
+        os.mkdir(show_folder)
+        created += 1
+        for season in range(1, seasons + 1):
+            season_folder = os.path.join(show_folder, f'Season {season}')
+            os.mkdir(season_folder)
+            created += 1
+            for name in episode_names(show, season, episodes, seed + number * 100 + season):
+                if rng.random() < 0.03:
+                    # Leaves gaps in the seasons
+                    continue
+                _touch(os.path.join(season_folder, name))
+                created += 1
+            if rng.random() < 0.3:
+                _touch(os.path.join(season_folder, 'cover.jpg'))
+                created += 1
+            if created >= entries:
+                break
+        number += 1
+    return library
+
+
+def default_benchmark_directory() -> Optional[str]:
+    """
+    Returns a tmpfs directory to generate libraries in, so benchmarks measure the code instead of the disk.
+
+    :return: Path of /dev/shm if available, None otherwise.
+    """
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return None
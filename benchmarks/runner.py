@@ -0,0 +1,135 @@
+import sys
+import json
+import time
+import inspect
+import argparse
+import platform
+import statistics
+import subprocess
+from typing import Dict, List, Optional
+
+from . import benchmarks
+
+
+def discover_benchmarks(pattern: Optional[str] = None) -> List[type]:
+    """
+    Finds the benchmark classes of the benchmarks module.
+
+    :param pattern: Only return classes whose name contains the pattern.
+
+    :return: List of benchmark classes.
+    """
+    classes = []
+    for name, value in inspect.getmembers(benchmarks, inspect.isclass):
+        if name.startswith('_') or value.__module__ != benchmarks.__name__:
+            continue
+        if pattern and pattern.lower() not in name.lower():
+            continue
+        classes.append(value)
+    return classes
+
+
+def time_benchmark(function, entries: int, repeat: int) -> Dict[str, float]:
+    """
+    Times a single benchmark.
+
+    :param function: The bound ``time_*`` method.
+    :param entries: The library size parameter.
+    :param repeat: Number of timed runs.
+
+    :return: Dictionary of timing statistics in seconds.
+    """
+    # One untimed run warms up the page and dentry caches
+    function(entries)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(entries)
+        samples.append(time.perf_counter() - start)
+    return {
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.mean(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'repeat': repeat,
+    }
+
+
+def extract_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(sizes: List[int], repeat: int = 5, pattern: Optional[str] = None) -> dict:
+    """
+    Runs every benchmark for every library size.
+
+    :param sizes: Library sizes in number of entries.
+    :param repeat: Number of timed runs per benchmark.
+    :param pattern: Only run benchmark classes whose name contains the pattern.
+
+    :return: The results document.
+    """
+    results = {}
+    for benchmark_class in discover_benchmarks(pattern):
+        for entries in sizes:
+            benchmark = benchmark_class()
+            benchmark.setup(entries)
+            try:
+                for name, function in inspect.getmembers(benchmark, inspect.ismethod):
+                    if not name.startswith('time_'):
+                        continue
+                    key = f'{benchmark_class.__name__}.{name}[{entries}]'
+                    results[key] = time_benchmark(function, entries, repeat)
+                    print(f'{key:<55} {results[key]["median"] * 1000:>10.2f} ms', file=sys.stderr)
+            finally:
+                benchmark.teardown(entries)
+    return {
+        'commit': extract_commit(),
+        'created': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'sizes': sizes,
+        'results': results,
+    }
+
+
+def compare_results(base: dict, current: dict) -> List[str]:
+    """
+    Compares the median timings of two result documents.
+
+    :param base: The results to compare against.
+    :param current: The new results.
+
+    :return: Lines of the comparison table.
+    """
+    lines = [f'{"benchmark":<55} {"base ms":>10} {"new ms":>10} {"ratio":>7}']
+    for key, result in current['results'].items():
+        if key not in base['results']:
+            continue
+        base_median = base['results'][key]['median']
+        ratio = result['median'] / base_median if base_median else float('inf')
+        lines.append(f'{key:<55} {base_median * 1000:>10.2f} {result["median"] * 1000:>10.2f} {ratio:>7.2f}')
+    return lines
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Run the MediaRenamer benchmarks')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000], help='Library sizes in entries (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per benchmark (default: %(default)s)')
+    parser.add_argument('--bench', help='Only run benchmark classes whose name contains this string')
+    parser.add_argument('--output', help='Save the results as JSON to this file')
+    parser.add_argument('--compare', metavar='BASE', help='Compare the results with a previously saved JSON file')
+    args = parser.parse_args(argv)
+
+    document = run_benchmarks(args.sizes, args.repeat, args.bench)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=4)
+    if args.compare:
+        with open(args.compare) as f:
+            base = json.load(f)
+        print('\n'.join(compare_results(base, document)))
@@ -0,0 +1,5 @@
+from .mediarenamer import main
+
+
+if __name__ == '__main__':
+    main()
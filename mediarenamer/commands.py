@@ -0,0 +1,1421 @@
+from __future__ import annotations
+
+import os
+import time
+import logging
+from typing import Callable, Iterable, Iterator, Optional, List, Set, Tuple
+
+from .version import __version__
+from .exceptions import MediaRenamerException, FileException, ParserException, DirectoryScanException
+from .media_log import media_log
+from .file_utils import write_to_file, extract_current_directory_basename, extract_list_of_folders_in_directory, \
+    extract_list_of_files_in_directory, rename_file, rename_directory, extract_file_extension, delete_file, \
+    parse_files_in_directory_to_delete, scan_directory, extract_directory_basename, extract_file_basename, \
+    create_directory_for_movie_file, recursively_list_contents_in_directory, take_directory_snapshot, \
+    DirectorySnapshot, extract_movie_directory_for_file, extract_library_entry_for_path
+from .utils import extract_season_number_from_directory_name, extract_episode_number_from_file_name, \
+    extract_show_year_from_directory_name, extract_show_name_from_directory_basename, extract_movie_year_from_string, \
+    extract_episode_title_from_file_name, parse_names, PARSE_PROCESS_THRESHOLD
+from .config import CONFIG_FILE_NAME, DEFAULT_JOBS, DEFAULT_JOBS_PER_DEVICE, DEFAULT_CONCURRENCY, \
+    DEFAULT_SETTLE_SECONDS
+from .walker import PathClaims, walk_library, walk_roots, iter_tree, skip_unreadable, PRUNE_DOWNLOADS
+from .plan import RenamePlan, apply_plan
+from .journal import RenameJournal, create_journal_path, find_latest_journal, resume_journal, rollback_journal
+from .index import ScanIndex
+from .report import ReportWriter
+from .metrics import METRICS
+from .rules import MOVIE, SEASON, MEDIA, KEEP, DELETE, MOVE, RuleTable, get_rules
+from .settings import LibraryConfig, get_config, load_library_config
+from .naming import clean_title
+from .titles import MOVIE as MOVIE_TITLE, SHOW as SHOW_TITLE, TitleIndex, build_title_index, get_title_index, snap_title
+
+
+def run(debug: bool = False, dry_run: bool = False, verbose: bool = False, ignore_errors: bool = False, output_file: str = None,
+        jobs: int = DEFAULT_JOBS, journal_path: Optional[str] = None, use_journal: bool = True,
+        index_path: Optional[str] = None, use_index: bool = True, full_rescan: bool = False, stats: bool = False,
+        stats_json: Optional[str] = None, root: Optional[str] = None, scan_index: Optional[ScanIndex] = None,
+        report_writer: Optional[ReportWriter] = None, parse_workers: Optional[int] = None,
+        concurrency: int = DEFAULT_CONCURRENCY, verify: bool = False, quarantine: Optional[str] = None,
+        config: Optional[LibraryConfig] = None):
+    """
+
+    :param debug:
+    :param dry_run:
+    :param verbose:
+    :param ignore_errors:
+    :param output_file:
+    :param jobs: Number of movie folders processed in parallel.
+    :param journal_path: Journal file to record the applied operations in, a new one is created if not given.
+    :param use_journal: Record the applied operations in a journal.
+    :param index_path: Scan index file, the one in the user cache directory is used if not given.
+    :param use_index: Skip movie folders that did not change since they were last found clean.
+    :param full_rescan: Read every directory again and rebuild the scan index.
+    :param stats: Print a table of phase timings, operation counters and filesystem call latencies at the end.
+    :param stats_json: File to write the phase timings, counters and latencies to as JSON.
+    :param root: The Movie or TV library directory, the current directory if not given.
+    :param scan_index: Scan index shared with other runs, used instead of opening the index file and left open.
+    :param report_writer: Report writer shared with other runs, used instead of output_file and left open.
+    :param parse_workers: Number of processes names are parsed on, a pool is used automatically for very large
+        directories if not given.
+    :param concurrency: Number of independent rename and delete operations applied at the same time.
+    :param verify: Check the container framing of every mkv and mp4 file first and leave truncated files alone.
+    :param quarantine: Directory truncated files are moved into, implies verify.
+    :param config: Settings of the library, the active ones if not given.
+
+    :return:
+    """
+    try:
+        if debug:
+            log = media_log(log_level='DEBUG')
+        else:
+            log = media_log(log_level='INFO')
+    except Exception as e:
+        raise MediaRenamerException(str(e))
+
+    log.info('Starting media renamer...')
+    log.debug(f'Debug mode: {debug}')
+    log.debug(f'Dry run: {dry_run}')
+    log.debug(f'Verbose mode: {verbose}')
+    log.debug(f'Ignore errors: {ignore_errors}')
+    log.debug(f'Jobs: {jobs}')
+    if output_file:
+        log.debug(f'Writing output to file: {output_file}')
+
+    try:
+        """
+        Variables
+        
+        :var seasons:
+        :var episodes:
+        :var folders_to_rename:
+        :var files_to_rename:
+        :var files_to_delete:
+        :var unknown_files:
+        :var current_directory:
+        """
+        folders_to_rename = {}
+        files_to_rename = {}
+        files_to_delete = []
+        master_unknown_folders = []
+        master_unknown_files = []
+        errored_folders = []
+        errored_files = []
+
+        current_directory = os.path.abspath(root) if root else os.getcwd()
+
+        if not current_directory:
+            log.error('Failed to get current directory. Exiting...')
+            exit(1)
+        log.info(f'Current directory: {current_directory}')
+
+        """
+        
+        """
+        directory_basename = extract_directory_basename(current_directory)
+        if not directory_basename:
+            log.error('Failed to extract directory basename. Exiting...')
+            exit(1)
+        if directory_basename == "Movie":
+            log.debug('Movie directory detected')
+        elif directory_basename == "TV":
+            log.debug('TV directory detected')
+        else:
+            log.error('Unknown media directory detected. Exiting...')
+            exit(1)
+        truncated_files = None
+        if verify or quarantine:
+            with METRICS.phase('verify'):
+                truncated_files = verify_library(current_directory, jobs, log, quarantine, dry_run, ignore_errors,
+                                                 config.rules if config is not None else None)
+
+        index = scan_index
+        owns_index = False
+        with METRICS.phase('list'):
+            if index is None and use_index:
+                owns_index = True
+                index = ScanIndex(index_path, fingerprint=extract_rules_fingerprint(config), full_rescan=full_rescan)
+                log.debug(f'Using scan index: {index.path}')
+            if index is not None:
+                snapshot = index.snapshot(current_directory)
+            else:
+                snapshot = take_directory_snapshot(current_directory)
+        files = snapshot.files
+        folders = snapshot.folders
+
+        if directory_basename == 'Movie':
+            try:
+                with METRICS.phase('plan'):
+                    plan = plan_movie_library(current_directory, snapshot, jobs, log, errored_folders, index,
+                                              parse_workers, truncated_files, config)
+            finally:
+                if owns_index:
+                    log.debug(f'Scan index hits: {index.hits}, misses: {index.misses}')
+                    METRICS.count('index_hits', index.hits)
+                    METRICS.count('index_misses', index.misses)
+                    index.close()
+            if errored_folders:
+                METRICS.count('errored_folders', len(errored_folders))
+                log.warning(f'{len(errored_folders)} folders failed to process')
+
+            log.info(f'Planned {len(plan)} operations: {plan.counts()}')
+            journal = None
+            report = report_writer
+            if use_journal and plan and not dry_run:
+                if journal_path and os.path.exists(journal_path):
+                    log.error(f'Journal already exists: {journal_path}. Use --resume to continue it. Exiting...')
+                    exit(1)
+                journal = RenameJournal(journal_path or create_journal_path(current_directory))
+                log.info(f'Recording operations in journal: {journal.path}')
+            if output_file and report is None:
+                report = ReportWriter(output_file)
+            try:
+                with METRICS.phase('apply'):
+                    failed_operations = apply_plan(plan, dry_run=dry_run, ignore_errors=ignore_errors, log=log,
+                                                   journal=journal, root=current_directory, report=report,
+                                                   concurrency=concurrency)
+            finally:
+                if journal:
+                    journal.close()
+                if report and report is not report_writer:
+                    report.close()
+                    log.info(f'Wrote {report.count} operations to: {output_file}')
+            if failed_operations:
+                METRICS.count('failed_operations', len(failed_operations))
+                log.warning(f'{len(failed_operations)} operations failed to apply')
+
+        elif directory_basename == 'TV':
+            if journal_path and os.path.exists(journal_path) and use_journal and not dry_run:
+                log.error(f'Journal already exists: {journal_path}. Use --resume to continue it. Exiting...')
+                exit(1)
+            journal = None
+            report = report_writer
+            if output_file and report is None:
+                report = ReportWriter(output_file)
+            planned = 0
+            failed_operations = []
+            season_plans = plan_tv_library(current_directory, snapshot, log, index, parse_workers, truncated_files,
+                                           config)
+            try:
+                # Seasons are planned and applied one at a time so memory does not grow with the library
+                while True:
+                    with METRICS.phase('plan'):
+                        season_plan = next(season_plans, None)
+                    if season_plan is None:
+                        break
+                    if not season_plan:
+                        continue
+                    if use_journal and not dry_run and journal is None:
+                        journal = RenameJournal(journal_path or create_journal_path(current_directory))
+                        log.info(f'Recording operations in journal: {journal.path}')
+                    with METRICS.phase('apply'):
+                        failed_operations.extend(apply_plan(season_plan, dry_run=dry_run, ignore_errors=ignore_errors,
+                                                            log=log, journal=journal, root=current_directory,
+                                                            report=report, first_sequence=planned,
+                                                            concurrency=concurrency))
+                    planned += len(season_plan)
+                    if index is not None:
+                        index.commit()
+            finally:
+                season_plans.close()
+                if owns_index:
+                    log.debug(f'Scan index hits: {index.hits}, misses: {index.misses}')
+                    METRICS.count('index_hits', index.hits)
+                    METRICS.count('index_misses', index.misses)
+                    index.close()
+                if journal:
+                    journal.close()
+                if report and report is not report_writer:
+                    report.close()
+                    log.info(f'Wrote {report.count} operations to: {output_file}')
+            log.info(f'Planned {planned} operations')
+            if failed_operations:
+                METRICS.count('failed_operations', len(failed_operations))
+                log.warning(f'{len(failed_operations)} operations failed to apply')
+
+        log.info('Complete!')
+
+    except Exception as e:
+        log.exception(MediaRenamerException(str(e)))
+
+    if stats:
+        print(METRICS.summary_table())
+    if stats_json:
+        try:
+            write_to_file(stats_json, METRICS.to_dict(), overwrite=True)
+            log.info(f'Wrote stats to: {stats_json}')
+        except FileException as e:
+            log.error(f'Failed to write stats to: {stats_json}. Error: {e}')
+
+
+def run_roots(roots: List[str], debug: bool = False, dry_run: bool = False, verbose: bool = False,
+              ignore_errors: bool = False, output_file: str = None, jobs: int = DEFAULT_JOBS,
+              jobs_per_device: int = DEFAULT_JOBS_PER_DEVICE, use_journal: bool = True,
+              index_path: Optional[str] = None, use_index: bool = True, full_rescan: bool = False,
+              stats: bool = False, stats_json: Optional[str] = None, parse_workers: Optional[int] = None,
+              concurrency: int = DEFAULT_CONCURRENCY, verify: bool = False, quarantine: Optional[str] = None,
+              config_path: Optional[str] = None):
+    """
+    The multi root run type function, runs every Movie and TV library root in one invocation.
+
+    Roots stored on different devices run in parallel, roots on the same device share ``jobs_per_device`` lanes.
+    Every root gets its own journal and its own config, the library config file of the root or else the user one.
+    The scan index and the report are shared.
+
+    :param roots: The Movie and TV library directories.
+    :param debug: Is debug enabled.
+    :param dry_run: Print the operations instead of applying them.
+    :param verbose: Is verbose enabled.
+    :param ignore_errors: Keep applying the remaining operations when one fails.
+    :param output_file: File to write the operations of all roots to.
+    :param jobs: Number of folders of a root processed in parallel.
+    :param jobs_per_device: Number of roots of the same device processed in parallel.
+    :param use_journal: Record the applied operations in a journal.
+    :param index_path: Scan index file, the one in the user cache directory is used if not given.
+    :param use_index: Skip folders that did not change since they were last found clean.
+    :param full_rescan: Read every directory again and rebuild the scan index.
+    :param stats: Print a table of phase timings, operation counters and filesystem call latencies at the end.
+    :param stats_json: File to write the phase timings, counters and latencies to as JSON.
+    :param parse_workers: Number of processes names are parsed on.
+    :param concurrency: Number of independent rename and delete operations of a root applied at the same time.
+    :param verify: Check the container framing of every mkv and mp4 file first and leave truncated files alone.
+    :param quarantine: Directory truncated files are moved into, implies verify.
+    :param config_path: Config file used for every root instead of the one found for each root.
+    """
+    log = media_log(log_level='DEBUG' if debug else 'INFO')
+
+    configs = {}
+    for root in roots:
+        try:
+            configs[root] = load_library_config(root, config_path)
+        except MediaRenamerException as e:
+            log.error(f'Failed to read config file for root: {root}. Error: {e}')
+    roots = [root for root in roots if root in configs]
+
+    # Every root keeps its own fingerprint, the indexed rows of a root stay valid when another root's config changes
+    fingerprints = dict((root, extract_rules_fingerprint(config)) for root, config in configs.items())
+    index = ScanIndex(index_path, fingerprints=fingerprints, full_rescan=full_rescan) if use_index else None
+    report = ReportWriter(output_file) if output_file else None
+
+    def _run_root(root: str):
+        try:
+            run(debug, dry_run, verbose, ignore_errors, jobs=jobs, use_journal=use_journal, root=root,
+                scan_index=index, report_writer=report, parse_workers=parse_workers, concurrency=concurrency,
+                verify=verify, quarantine=quarantine, config=configs[root])
+        except SystemExit:
+            raise MediaRenamerException(f'Run exited early for root: {root}')
+
+    try:
+        for walk_result in walk_roots(roots, _run_root, jobs_per_device=jobs_per_device):
+            if not walk_result.ok:
+                log.error(f'Failed to process root: {walk_result.folder}. Error: {walk_result.error}')
+    finally:
+        if index:
+            METRICS.count('index_hits', index.hits)
+            METRICS.count('index_misses', index.misses)
+            index.close()
+        if report:
+            report.close()
+            log.info(f'Wrote {report.count} operations to: {output_file}')
+
+    if stats:
+        print(METRICS.summary_table())
+    if stats_json:
+        try:
+            write_to_file(stats_json, METRICS.to_dict(), overwrite=True)
+            log.info(f'Wrote stats to: {stats_json}')
+        except FileException as e:
+            log.error(f'Failed to write stats to: {stats_json}. Error: {e}')
+
+
+def extract_rules_fingerprint(config: Optional[LibraryConfig] = None) -> str:
+    """
+    Extracts a fingerprint of the rules a plan depends on, indexed results are discarded when it changes.
+
+    :param config: Settings of the library, the active ones if not given.
+
+    :return: The rules fingerprint.
+    """
+    title_index = get_title_index()
+    title_fingerprint = title_index.fingerprint if title_index is not None else ''
+    return f'{__version__}|{(config or get_config()).fingerprint}|{title_fingerprint}'
+
+
+def plan_movie_library(current_directory: str, snapshot: DirectorySnapshot, jobs: int, log: logging.Logger,
+                       errored_folders: Optional[List[str]] = None, index: Optional[ScanIndex] = None,
+                       parse_workers: Optional[int] = None, truncated_files: Optional[Set[str]] = None,
+                       config: Optional[LibraryConfig] = None) -> RenamePlan:
+    """
+    Builds the rename plan for a Movie library without touching the disk.
+
+    Loose movie files get a directory and are moved into it, then every movie folder is planned on the library
+    walker and the per-folder plans are merged in folder order.
+
+    :param current_directory: The Movie library directory.
+    :param snapshot: Snapshot of the Movie library directory.
+    :param jobs: Number of movie folders planned in parallel.
+    :param log: The logger.
+    :param errored_folders: List the folders that failed to plan are appended to.
+    :param index: Scan index, movie folders that did not change since they were last found clean are skipped.
+    :param parse_workers: Number of processes the folder names are parsed on up front, only used for very large
+        libraries if not given.
+    :param truncated_files: Media files that failed the integrity check, they and the movie folders they are in are
+        left as they are.
+    :param config: Settings of the library, the active ones if not given.
+
+    :return: The rename plan.
+    """
+    plan = RenamePlan()
+    folders = list(snapshot.folders)
+    planned_directories = {}
+    truncated_files = truncated_files or set()
+    truncated_folders = set(os.path.join(current_directory, os.path.relpath(file, current_directory).split(os.sep)[0])
+                            for file in truncated_files)
+    parser = config.parser if config is not None else None
+    movie_template = (config or get_config()).templates['movie']
+
+    for file in snapshot.files:
+        file_extension = snapshot.extension(file)
+        if file_extension:
+            if file_extension == 'parts':
+                continue
+        if extract_file_basename(file) == CONFIG_FILE_NAME:
+            continue
+        if file in truncated_files:
+            log.warning(f'Skipping truncated file: {file}')
+            continue
+        # A release named file gets the folder of its title and year, the folder plan then renames the file itself
+        file_basename = extract_file_basename(file)
+        file_year = extract_movie_year_from_string(file_basename, parser)
+        file_title = clean_title(file_basename.split(file_year)[0]) if file_year else None
+        if file_title:
+            new_directory = os.path.join(current_directory,
+                                         movie_template.render_parts(title=file_title, year=file_year)[0])
+        else:
+            new_directory = extract_movie_directory_for_file(file, current_directory)
+        if not new_directory:
+            log.warning(f'Failed to extract directory for file: {file}')
+            continue
+        if new_directory not in planned_directories:
+            if new_directory in snapshot.folders or os.path.exists(new_directory):
+                log.warning(f'Directory already exists for file: {file}. Directory: {new_directory}. '
+                            f'Run --find-duplicates to check for a duplicate download')
+                continue
+            log.debug(f'Creating directory for file: {file}. Directory: {new_directory}')
+            plan.mkdir(new_directory)
+            planned_directories[new_directory] = []
+            folders.append(new_directory)
+        plan.move(file, os.path.join(new_directory, file_basename))
+        planned_directories[new_directory].append(file_basename)
+
+    movie_years = {}
+    if (parse_workers is None and len(folders) >= PARSE_PROCESS_THRESHOLD) or (parse_workers or 1) > 1:
+        parsed_folders = parse_names([extract_directory_basename(folder) for folder in folders], parse_workers,
+                                     parser=parser)
+        movie_years = {folder: parsed_folder.year for folder, parsed_folder in zip(folders, parsed_folders)}
+
+    def _plan_folder(folder: str, claims: PathClaims) -> RenamePlan:
+        if folder in truncated_folders:
+            log.warning(f'Skipping folder with truncated media files: {folder}')
+            return RenamePlan()
+        movie_year = movie_years.get(folder)
+        if folder in planned_directories:
+            folder_snapshot = DirectorySnapshot(folder, files=planned_directories[folder])
+            return plan_movie_folder(folder, claims, current_directory, log, folder_snapshot, movie_year=movie_year,
+                                     config=config)
+        if index is None:
+            return plan_movie_folder(folder, claims, current_directory, log, movie_year=movie_year, config=config)
+
+        if index.is_clean(folder):
+            log.debug(f'Skipping unchanged folder: {folder}')
+            return RenamePlan()
+        folder_stat = index.stat(folder)
+        folder_snapshot = index.snapshot(folder)
+        folder_plan = plan_movie_folder(folder, claims, current_directory, log, folder_snapshot, index.snapshot,
+                                        movie_year, config)
+        if not folder_plan and folder_stat is not None:
+            for sub_folder in folder_snapshot.folders:
+                index.touch(sub_folder)
+            index.mark_clean(folder, folder_stat)
+        return folder_plan
+
+    for walk_result in walk_library(folders, _plan_folder, jobs=jobs):
+        if not walk_result.ok:
+            if errored_folders is not None:
+                errored_folders.append(walk_result.folder)
+            log.error(f'Failed to process folder: {walk_result.folder}. Error: {walk_result.error}')
+            continue
+        plan.extend(walk_result.result)
+
+    return plan
+
+
+def plan_movie_entries(current_directory: str, entries: Iterable[str], jobs: int, log: logging.Logger,
+                       truncated_files: Optional[Set[str]] = None) -> RenamePlan:
+    """
+    Builds the rename plan for some entries of a Movie library root without listing the rest of the library.
+
+    :param current_directory: The Movie library directory.
+    :param entries: Loose movie files and movie folders directly inside the library directory.
+    :param jobs: Number of movie folders planned in parallel.
+    :param log: The logger.
+    :param truncated_files: Media files that failed the integrity check, they and the movie folders they are in are
+        left as they are.
+
+    :return: The rename plan.
+    """
+    entries = list(entries)
+    files = [extract_file_basename(entry) for entry in entries if os.path.isfile(entry)]
+    folders = [extract_directory_basename(entry) for entry in entries if os.path.isdir(entry)]
+    snapshot = DirectorySnapshot(current_directory, files=files, folders=folders)
+    return plan_movie_library(current_directory, snapshot, jobs, log, truncated_files=truncated_files)
+
+
+def plan_movie_folder(folder: str, claims: PathClaims, current_directory: str, log: logging.Logger,
+                      snapshot: Optional[DirectorySnapshot] = None,
+                      list_directory: Callable[[str], DirectorySnapshot] = take_directory_snapshot,
+                      movie_year: Optional[str] = None, config: Optional[LibraryConfig] = None) -> RenamePlan:
+    """
+    Plans the renames of a single movie folder and the media inside it.
+
+    :param folder: The movie folder.
+    :param claims: Path claims shared with the other walkers.
+    :param current_directory: The Movie library directory.
+    :param log: The logger.
+    :param snapshot: Planned contents of the folder, the folder is read if not given.
+    :param list_directory: Callable returning the snapshot of a sub folder.
+    :param movie_year: Year already parsed from the folder name, extracted from the name if not given.
+    :param config: Settings of the library, the active ones if not given.
+
+    :return: The rename plan of the folder.
+    """
+    plan = RenamePlan()
+    folder_basename = extract_directory_basename(folder)
+    if not folder_basename:
+        log.warning(f'Failed to extract directory basename for folder: {folder}')
+        return plan
+    if movie_year is None:
+        movie_year = extract_movie_year_from_string(folder_basename, config.parser if config is not None else None)
+    if not movie_year:
+        METRICS.count('parse_misses')
+        log.warning(f'Failed to extract movie year for folder: {folder}')
+        return plan
+    movie_title = clean_title(folder_basename.split(movie_year)[0])
+    if not movie_title:
+        log.warning(f'Failed to extract movie title for folder: {folder}')
+        return plan
+    title_match = snap_title(movie_title, int(movie_year), MOVIE_TITLE)
+    if title_match:
+        title_year = str(title_match.year or movie_year)
+        if (title_match.title, title_year) != (movie_title, movie_year):
+            log.info(f'Matched movie title: {movie_title} ({movie_year}) to {title_match.title} ({title_year}) '
+                     f'for folder: {folder}')
+        movie_title = title_match.title
+        movie_year = title_year
+    movie_template = (config or get_config()).templates['movie']
+    new_folder_name = movie_template.render_parts(title=movie_title, year=movie_year)[0]
+    new_folder = os.path.join(current_directory, new_folder_name)
+    if new_folder != folder:
+        if not claims.claim(new_folder, folder):
+            raise FileException(f'Cannot rename {folder} to {new_folder}, path is claimed by {claims.owner(new_folder)}')
+        log.debug(f'Renaming directory: {folder} to {new_folder}...')
+        plan.rename(folder, new_folder, is_directory=True)
+
+    if snapshot is None:
+        log.debug(f'Extracting files in directory: {folder}...')
+        snapshot = list_directory(folder)
+    files_in_directory = snapshot.files
+    folders_in_directory = snapshot.folders
+    file_basenames = set(extract_file_basename(file) for file in files_in_directory)
+
+    rules = config.rules if config is not None else get_rules()
+    folder_basenames = set(extract_directory_basename(sub_folder) for sub_folder in folders_in_directory)
+
+    if not files_in_directory:
+        log.debug(f'No files in directory: {folder}')
+    else:
+        for file in files_in_directory:
+            file_extension = snapshot.extension(file)
+            if not file_extension:
+                METRICS.count('parse_misses')
+                log.warning(f'Failed to extract file extension for file: {file}')
+                continue
+            file_basename = extract_file_basename(file)
+            current_file = os.path.join(new_folder, file_basename)
+            rule = rules.classify(MOVIE, file_extension)
+            if rule.action == DELETE:
+                log.debug(f'Detected banned file extension for file: {file}')
+                plan.delete(current_file)
+            elif rule.action == MEDIA:
+                log.debug(f'Detected media file extension for file: {file}')
+                new_file_name = movie_template.render_parts(title=movie_title, year=movie_year,
+                                                            ext=file_extension)[-1]
+                new_file = os.path.join(new_folder, new_file_name)
+                if new_file_name == file_basename:
+                    continue
+                if new_file_name in file_basenames:
+                    log.warning(f'Cannot rename file {file} to {new_file}, file already exists')
+                    continue
+                log.debug(f'Renaming file: {file} to {new_file}...')
+                plan.rename(current_file, new_file)
+                file_basenames.discard(file_basename)
+                file_basenames.add(new_file_name)
+            elif rule.action == MOVE:
+                plan_sidecar_move(plan, file, folder, new_folder, rule.target, folder_basenames, log)
+            elif rule.action == KEEP:
+                log.debug(f'Keeping file: {file}')
+            else:
+                log.warning(f'Failed to detect file type for file: {file}')
+
+    if not folders_in_directory:
+        log.debug(f'No folders in directory: {folder}')
+    else:
+        for sub_folder in folders_in_directory:
+            folder_basename = extract_directory_basename(sub_folder)
+            if not folder_basename:
+                log.warning(f'Failed to extract folder basename for folder: {sub_folder}')
+                continue
+            folder_kind = rules.folder_kind(folder_basename)
+            if folder_kind is None:
+                continue
+            log.debug(f'Detected {folder_kind} folder in folder: {sub_folder}')
+            sidecar_snapshot = list_directory(sub_folder)
+            for sidecar_file in sidecar_snapshot.files:
+                file_extension = sidecar_snapshot.extension(sidecar_file)
+                if not file_extension:
+                    log.warning(f'Failed to extract file extension for file: {sidecar_file}')
+                    continue
+                rule = rules.classify(folder_kind, file_extension)
+                if rule.action == DELETE:
+                    log.debug(f'Detected banned file extension for file: {sidecar_file}')
+                    plan.delete(os.path.join(new_folder, folder_basename, extract_file_basename(sidecar_file)))
+                elif rule.action == MOVE:
+                    plan_sidecar_move(plan, sidecar_file, folder, new_folder, rule.target, folder_basenames, log,
+                                      folder_basename)
+                elif rule.action in (MEDIA, KEEP):
+                    log.debug(f'Keeping file: {sidecar_file}')
+                else:
+                    log.warning(f'Failed to detect file type for file: {sidecar_file}')
+
+    return plan
+
+
+def plan_sidecar_move(plan: RenamePlan, file: str, folder: str, new_folder: str, target: str,
+                      folder_basenames: Set[str], log: logging.Logger, sub_folder: Optional[str] = None) -> bool:
+    """
+    Plans the move of a sidecar file into a folder of its movie or season folder, the folder is created if needed.
+
+    :param plan: The plan the operations are added to.
+    :param file: The file.
+    :param folder: The movie or season folder as it is on disk.
+    :param new_folder: The movie or season folder once the plan renamed it.
+    :param target: The folder the file is moved into, relative to the movie or season folder.
+    :param folder_basenames: Basenames of the folders inside the movie or season folder, updated with created folders.
+    :param log: The logger.
+    :param sub_folder: Folder inside the movie or season folder the file is in, None if it is directly inside.
+
+    :return: True if the move was planned.
+    """
+    file_basename = extract_file_basename(file)
+    if sub_folder == target:
+        return False
+    target_folder = os.path.join(new_folder, target)
+    if os.path.exists(os.path.join(folder, target, file_basename)):
+        log.warning(f'Cannot move file {file} to {target_folder}, file already exists')
+        return False
+    if target not in folder_basenames:
+        plan.mkdir(target_folder)
+        folder_basenames.add(target)
+    current_folder = os.path.join(new_folder, sub_folder) if sub_folder else new_folder
+    log.debug(f'Moving file: {file} to {target_folder}...')
+    plan.move(os.path.join(current_folder, file_basename), os.path.join(target_folder, file_basename))
+    return True
+
+
+def snap_show_name(folder: str, show_name: str, log: logging.Logger) -> str:
+    """
+    Replaces a show name with its canonical title when a title index is active.
+
+    Without a year in the folder name only a title with the same lookup key is taken, a similar name alone too easily
+    belongs to another show.
+
+    :param folder: The show folder.
+    :param show_name: The show name extracted from the folder name.
+    :param log: The logger.
+
+    :return: The canonical title, the show name if no title matches.
+    """
+    show_year = extract_show_year_from_directory_name(extract_directory_basename(folder))
+    title_match = snap_title(show_name, int(show_year) if show_year else None, SHOW_TITLE, fuzzy=bool(show_year))
+    if title_match is None:
+        return show_name
+    if title_match.title != show_name:
+        log.info(f'Matched show name: {show_name} to {title_match.title} for folder: {folder}')
+    return title_match.title
+
+
+def iter_tv_shows(snapshot: DirectorySnapshot, log: logging.Logger) -> Iterator[Tuple[str, str]]:
+    """
+    First stage of the TV pipeline, yields the show folders of a TV library.
+
+    :param snapshot: Snapshot of the TV library directory.
+    :param log: The logger.
+
+    :return: Iterator of show folder and show name pairs.
+    """
+    for folder in snapshot.folders:
+        show_name = extract_show_name_from_directory_basename(extract_directory_basename(folder))
+        if not show_name:
+            METRICS.count('parse_misses')
+            log.warning(f'Failed to extract show name for folder: {folder}')
+            continue
+        yield folder, snap_show_name(folder, show_name, log)
+
+
+def iter_tv_seasons(shows: Iterable[Tuple[str, str]], log: logging.Logger, index: Optional[ScanIndex] = None,
+                    parse_workers: Optional[int] = None, rules: Optional[RuleTable] = None) -> Iterator[Tuple[str, str]]:
+    """
+    Second stage of the TV pipeline, yields the season folders of each show.
+
+    :param shows: Iterable of show folder and show name pairs.
+    :param log: The logger.
+    :param index: Scan index to reuse the scan results of unchanged show folders from.
+    :param parse_workers: Number of processes the file names are parsed on.
+    :param rules: Extension rules of the library, the active ones if not given.
+
+    :return: Iterator of show name and season folder pairs.
+    """
+    for show_folder, show_name in shows:
+        scan_results = scan_directory(show_folder, index, parse_workers, rules)
+        if not scan_results['season_folders']:
+            log.warning(f'No season folders found for show: {show_name}')
+        for unknown_folder in scan_results['unknown_folders']:
+            log.debug(f'Skipping folder without season number: {unknown_folder}')
+        for season_folder in scan_results['season_folders']:
+            yield show_name, season_folder
+
+
+def plan_tv_season(show_name: str, season_folder: str, scan_results: dict, log: logging.Logger,
+                   config: Optional[LibraryConfig] = None) -> RenamePlan:
+    """
+    Plans the episode renames and junk file deletes of a single season folder.
+
+    Episodes are renamed to ``Show - S01E01 - Title.ext``, the title is kept when the file name has one.
+
+    :param show_name: The show name.
+    :param season_folder: The season folder.
+    :param scan_results: Scan results of the season folder.
+    :param log: The logger.
+    :param config: Settings of the library, the active ones if not given.
+
+    :return: The rename plan of the season.
+    """
+    plan = RenamePlan()
+    season_number = scan_results['season_number']
+    if not season_number:
+        METRICS.count('parse_misses')
+        log.warning(f'Failed to extract season number for folder: {season_folder}')
+        return plan
+
+    for file in scan_results['files_to_delete']:
+        log.debug(f'Detected banned file extension for file: {file}')
+        plan.delete(file)
+
+    folder_basenames = set(extract_directory_basename(folder)
+                           for folder in scan_results['season_folders'] + scan_results['unknown_folders'])
+    for file, target in scan_results.get('files_to_move', ()):
+        plan_sidecar_move(plan, file, season_folder, season_folder, target, folder_basenames, log)
+
+    for file in scan_results['unknown_files']:
+        METRICS.count('parse_misses')
+        log.warning(f'Failed to extract episode number for file: {file}')
+
+    episodes = []
+    records = []
+    for file in scan_results['episode_files']:
+        file_basename = extract_file_basename(file)
+        file_extension = extract_file_extension(file_basename)
+        episode_number = extract_episode_number_from_file_name(file_basename)
+        if not file_extension or not episode_number:
+            METRICS.count('parse_misses')
+            log.warning(f'Failed to extract episode number for file: {file}')
+            continue
+        episodes.append((file, file_basename))
+        records.append({'show': show_name, 'season': int(season_number), 'episode': int(episode_number),
+                        'title': extract_episode_title_from_file_name(file_basename), 'ext': file_extension})
+
+    new_names = (config or get_config()).templates['episode'].render_many(records)
+    file_basenames = set(extract_file_basename(file) for file in scan_results['episode_files'])
+    for (file, file_basename), new_name in zip(episodes, new_names):
+        new_file_name = new_name[-1]
+        if new_file_name == file_basename:
+            continue
+        if new_file_name in file_basenames:
+            log.warning(f'Cannot rename file {file} to {new_file_name}, file already exists')
+            continue
+        log.debug(f'Renaming file: {file} to {new_file_name}...')
+        plan.rename(file, os.path.join(season_folder, new_file_name))
+        file_basenames.discard(file_basename)
+        file_basenames.add(new_file_name)
+
+    return plan
+
+
+def plan_tv_library(current_directory: str, snapshot: DirectorySnapshot, log: logging.Logger,
+                    index: Optional[ScanIndex] = None, parse_workers: Optional[int] = None,
+                    truncated_files: Optional[Set[str]] = None,
+                    config: Optional[LibraryConfig] = None) -> Iterator[RenamePlan]:
+    """
+    Streams the rename plans of a TV library, one season at a time.
+
+    Shows, seasons and episodes flow through generator stages, so only the season being planned is held in memory.
+
+    :param current_directory: The TV library directory.
+    :param snapshot: Snapshot of the TV library directory.
+    :param log: The logger.
+    :param index: Scan index to reuse the scan results of unchanged folders from.
+    :param parse_workers: Number of processes the file names are parsed on, a pool is used automatically for very
+        large season folders if not given.
+    :param truncated_files: Episode files that failed the integrity check, they are not renamed.
+    :param config: Settings of the library, the active ones if not given.
+
+    :return: Iterator of season rename plans.
+    """
+    rules = config.rules if config is not None else None
+    for file in snapshot.files:
+        log.warning(f'Skipping file outside of a show folder: {file}')
+    for show_name, season_folder in iter_tv_seasons(iter_tv_shows(snapshot, log), log, index, parse_workers, rules):
+        season_plan = plan_tv_season(show_name, season_folder, scan_directory(season_folder, index, parse_workers, rules),
+                                     log, config)
+        if truncated_files:
+            season_plan = RenamePlan(operation for operation in season_plan
+                                     if operation.source not in truncated_files)
+        yield season_plan
+
+
+def run_resume(debug: bool = False, dry_run: bool = False, ignore_errors: bool = False, journal_path: str = None):
+    """
+    The resume run type function, continues an interrupted run from its journal.
+
+    :param debug: Is debug enabled.
+    :param dry_run: Print the remaining operations instead of applying them.
+    :param ignore_errors: Keep applying the remaining operations when one fails.
+    :param journal_path: The journal to resume, the latest journal of the current directory if not given.
+    """
+    log = media_log(log_level='DEBUG' if debug else 'INFO')
+
+    if not journal_path:
+        journal_path = find_latest_journal(os.getcwd())
+        if not journal_path:
+            log.error(f'No journal found for directory: {os.getcwd()}')
+            exit(1)
+    log.info(f'Resuming journal: {journal_path}')
+    try:
+        failed_operations = resume_journal(journal_path, ignore_errors=ignore_errors, dry_run=dry_run, log=log)
+        if failed_operations:
+            log.warning(f'{len(failed_operations)} operations failed to apply')
+    except Exception as e:
+        log.exception(MediaRenamerException(str(e)))
+
+
+def run_rollback(debug: bool = False, dry_run: bool = False, ignore_errors: bool = False, journal_path: str = None):
+    """
+    The rollback run type function, undoes the operations recorded in a journal.
+
+    :param debug: Is debug enabled.
+    :param dry_run: Print the inverse operations instead of applying them.
+    :param ignore_errors: Keep undoing the remaining operations when one fails.
+    :param journal_path: The journal to roll back.
+    """
+    log = media_log(log_level='DEBUG' if debug else 'INFO')
+
+    log.info(f'Rolling back journal: {journal_path}')
+    try:
+        failed_operations = rollback_journal(journal_path, ignore_errors=ignore_errors, dry_run=dry_run, log=log)
+        if failed_operations:
+            log.warning(f'{len(failed_operations)} operations could not be undone')
+    except Exception as e:
+        log.exception(MediaRenamerException(str(e)))
+
+
+def run_path(path: str, debug: bool = False, dry_run: bool = False, ignore_errors: bool = False,
+             output_file: Optional[str] = None, use_journal: bool = True, stats: bool = False,
+             stats_json: Optional[str] = None, concurrency: int = DEFAULT_CONCURRENCY, verify: bool = False,
+             quarantine: Optional[str] = None):
+    """
+    The single item run type function, renames one movie the way ``run`` would without scanning the library.
+
+    Meant for download client post-processing hooks. Only the movie folder, or the new folder of a loose movie file,
+    and its Featurettes and Subs folders are read, so the cost does not grow with the library.
+
+    :param path: A loose movie file, a movie folder or a file inside a movie folder of a Movie library.
+    :param debug: Is debug enabled.
+    :param dry_run: Print the operations instead of applying them.
+    :param ignore_errors: Keep applying the remaining operations when one fails.
+    :param output_file: File to write the operations to as JSON lines.
+    :param use_journal: Record the applied operations in a journal.
+    :param stats: Print a table of phase timings, operation counters and filesystem call latencies at the end.
+    :param stats_json: File to write the phase timings, counters and latencies to as JSON.
+    :param concurrency: Number of independent rename and delete operations applied at the same time.
+    :param verify: Check the container framing of the mkv and mp4 files of the movie first and leave it alone if one
+        is truncated.
+    :param quarantine: Directory truncated files are moved into, implies verify.
+    """
+    log = media_log(log_level='DEBUG' if debug else 'INFO')
+
+    try:
+        if not os.path.exists(path):
+            log.error(f'Path does not exist: {path}. Exiting...')
+            exit(1)
+        library_entry = extract_library_entry_for_path(path, 'Movie')
+        if not library_entry:
+            log.error(f'Path is not inside a Movie directory: {path}. Exiting...')
+            exit(1)
+        current_directory, entry = library_entry
+        log.info(f'Current directory: {current_directory}')
+        log.debug(f'Library entry: {entry}')
+
+        truncated_files = None
+        if verify or quarantine:
+            with METRICS.phase('verify'):
+                truncated_files = verify_library(current_directory, 1, log, quarantine, dry_run, ignore_errors,
+                                                 entries=[entry])
+        with METRICS.phase('plan'):
+            plan = plan_movie_entries(current_directory, [entry], 1, log, truncated_files)
+        log.info(f'Planned {len(plan)} operations: {plan.counts()}')
+
+        journal = None
+        report = None
+        if use_journal and plan and not dry_run:
+            journal = RenameJournal(create_journal_path(current_directory))
+            log.info(f'Recording operations in journal: {journal.path}')
+        if output_file:
+            report = ReportWriter(output_file)
+        try:
+            with METRICS.phase('apply'):
+                failed_operations = apply_plan(plan, dry_run=dry_run, ignore_errors=ignore_errors, log=log,
+                                               journal=journal, root=current_directory, report=report,
+                                               concurrency=concurrency)
+        finally:
+            if journal:
+                journal.close()
+            if report:
+                report.close()
+                log.info(f'Wrote {report.count} operations to: {output_file}')
+        if failed_operations:
+            METRICS.count('failed_operations', len(failed_operations))
+            log.warning(f'{len(failed_operations)} operations failed to apply')
+
+        log.info('Complete!')
+
+    except Exception as e:
+        log.exception(MediaRenamerException(str(e)))
+
+    if stats:
+        print(METRICS.summary_table())
+    if stats_json:
+        try:
+            write_to_file(stats_json, METRICS.to_dict(), overwrite=True)
+            log.info(f'Wrote stats to: {stats_json}')
+        except FileException as e:
+            log.error(f'Failed to write stats to: {stats_json}. Error: {e}')
+
+
+def run_watch(debug: bool = False, dry_run: bool = False, ignore_errors: bool = False, jobs: int = DEFAULT_JOBS,
+              use_journal: bool = True, settle: float = DEFAULT_SETTLE_SECONDS, poll_interval: Optional[float] = None,
+              should_stop: Callable[[], bool] = lambda: False, concurrency: int = DEFAULT_CONCURRENCY,
+              verify: bool = False, quarantine: Optional[str] = None):
+    """
+    The watch run type function, keeps running and renames new downloads in the current directory as they land.
+
+    Only the library root entries that changed are planned, with the same per folder logic as ``run``.
+
+    :param debug: Is debug enabled.
+    :param dry_run: Print the operations instead of applying them.
+    :param ignore_errors: Keep applying the remaining operations when one fails.
+    :param jobs: Number of changed folders processed in parallel.
+    :param use_journal: Record the applied operations in a journal.
+    :param settle: Seconds a new entry has to stop changing before it is renamed.
+    :param poll_interval: Poll the directory at this interval instead of using inotify.
+    :param should_stop: Checked while waiting for events, the watch ends when it returns True.
+    :param concurrency: Number of independent rename and delete operations applied at the same time.
+    :param verify: Check the container framing of the mkv and mp4 files of every new download first and leave the
+        truncated ones alone.
+    :param quarantine: Directory truncated files are moved into, implies verify.
+    """
+    log = media_log(log_level='DEBUG' if debug else 'INFO')
+
+    current_directory = os.getcwd()
+    directory_basename = extract_directory_basename(current_directory)
+    if directory_basename != 'Movie':
+        log.error(f'Watch mode is only supported in a Movie directory, not: {current_directory}. Exiting...')
+        exit(1)
+    if quarantine:
+        try:
+            check_quarantine_directory(current_directory, quarantine)
+        except FileException as e:
+            log.error(f'{e}. Exiting...')
+            exit(1)
+
+    def _handle(paths: List[str]):
+        start = time.perf_counter()
+        truncated_files = None
+        if verify or quarantine:
+            try:
+                truncated_files = verify_library(current_directory, jobs, log, quarantine, dry_run, ignore_errors,
+                                                 entries=paths)
+            except FileException as e:
+                log.error(f'Failed to verify: {paths}. Error: {e}')
+                return
+        plan = plan_movie_entries(current_directory, paths, jobs, log, truncated_files)
+        if not plan:
+            log.debug(f'Nothing to rename for: {paths}')
+            return
+        journal = None
+        if use_journal and not dry_run:
+            journal = RenameJournal(create_journal_path(current_directory))
+        try:
+            failed_operations = apply_plan(plan, dry_run=dry_run, ignore_errors=ignore_errors, log=log,
+                                           journal=journal, root=current_directory, concurrency=concurrency)
+        except FileException as e:
+            log.error(f'Failed to rename: {paths}. Error: {e}')
+            return
+        finally:
+            if journal:
+                journal.close()
+        if failed_operations:
+            log.warning(f'{len(failed_operations)} operations failed to apply')
+        log.info(f'Applied {len(plan) - len(failed_operations)} operations for {len(paths)} entries in '
+                 f'{(time.perf_counter() - start) * 1000:.1f} ms')
+
+    from .watch import watch_directory
+
+    log.info(f'Watching directory: {current_directory}')
+    try:
+        watch_directory(current_directory, _handle, settle=settle, poll_interval=poll_interval,
+                        should_stop=should_stop)
+    except KeyboardInterrupt:
+        log.info('Stopped watching')
+    except Exception as e:
+        log.exception(MediaRenamerException(str(e)))
+
+
+def run_build_title_index(debug: bool = False, tsv_path: str = None, index_path: Optional[str] = None):
+    """
+    The build title index run type function, builds the offline title index from a local IMDb title dump.
+
+    :param debug: Is debug enabled.
+    :param tsv_path: The ``title.basics.tsv`` dump, gzipped or not.
+    :param index_path: The index file to write, the one in the user cache directory if not given.
+    """
+    log = media_log(log_level='DEBUG' if debug else 'INFO')
+
+    log.info(f'Building title index from: {tsv_path}')
+    try:
+        count = build_title_index(tsv_path, index_path)
+        with TitleIndex(index_path) as title_index:
+            log.info(f'Indexed {count} titles in: {title_index.path}')
+    except Exception as e:
+        log.exception(MediaRenamerException(str(e)))
+
+
+def run_find_duplicates(debug: bool = False, jobs: int = DEFAULT_JOBS, output_file: Optional[str] = None,
+                        roots: Optional[List[str]] = None):
+    """
+    The find duplicates run type function, reports media files with identical content.
+
+    :param debug: Is debug enabled.
+    :param jobs: Number of files hashed in parallel.
+    :param output_file: File to write the duplicate sets to as JSON lines.
+    :param roots: The library directories to search, the current directory if not given.
+    """
+    log = media_log(log_level='DEBUG' if debug else 'INFO')
+
+    from .duplicates import find_duplicate_media
+
+    roots = roots or [os.getcwd()]
+    log.info(f'Finding duplicate media files in: {", ".join(roots)}')
+    try:
+        rules = get_rules()
+        duplicates = find_duplicate_media(roots, rules.extensions(MOVIE, MEDIA) | rules.extensions(SEASON, MEDIA), jobs)
+        report = ReportWriter(output_file) if output_file else None
+        try:
+            for duplicate in duplicates:
+                print(f'{duplicate.size} bytes, {len(duplicate.files)} copies, blake2b {duplicate.digest}')
+                for file in duplicate.files:
+                    print(f'    {file}')
+                if report:
+                    report.write_record(duplicate._asdict())
+        finally:
+            if report:
+                report.close()
+                log.info(f'Wrote {report.count} duplicate sets to: {output_file}')
+        wasted = sum(duplicate.size * (len(duplicate.files) - 1) for duplicate in duplicates)
+        log.info(f'Found {len(duplicates)} duplicate sets, {wasted} bytes in redundant copies')
+    except Exception as e:
+        log.exception(MediaRenamerException(str(e)))
+
+
+def run_gaps(debug: bool = False, output_file: Optional[str] = None, roots: Optional[List[str]] = None,
+             index_path: Optional[str] = None, use_index: bool = True, full_rescan: bool = False,
+             parse_workers: Optional[int] = None, verbose: bool = False):
+    """
+    The gaps run type function, reports missing seasons and the missing, duplicate and out of range episodes of every
+    show in one or more TV libraries.
+
+    :param debug: Is debug enabled.
+    :param output_file: File to write one JSON line per show to.
+    :param roots: The TV library directories, the current directory if not given.
+    :param index_path: Scan index file, the one in the user cache directory is used if not given.
+    :param use_index: Reuse the scan results of folders that did not change.
+    :param full_rescan: Read every directory again and rebuild the scan index.
+    :param parse_workers: Number of processes the file names are parsed on.
+    :param verbose: Also list complete seasons.
+    """
+    log = media_log(log_level='DEBUG' if debug else 'INFO')
+
+    from .gaps import TABLE_HEADER, find_show_gaps
+
+    roots = roots or [os.getcwd()]
+    index = ScanIndex(index_path, fingerprint=extract_rules_fingerprint(), full_rescan=full_rescan) if use_index else None
+    report = ReportWriter(output_file) if output_file else None
+    shows = incomplete_shows = 0
+    try:
+        print(TABLE_HEADER)
+        for root in roots:
+            root = os.path.abspath(root)
+            if extract_directory_basename(root) != 'TV':
+                log.error(f'Not a TV library: {root}')
+                continue
+            snapshot = index.snapshot(root) if index is not None else take_directory_snapshot(root)
+            for show_folder, show_name in iter_tv_shows(snapshot, log):
+                # Shows are reported as they are scanned, only one show is held in memory at a time
+                show_gaps = find_show_gaps(show_folder, show_name, index, parse_workers, log)
+                shows += 1
+                incomplete_shows += not show_gaps.complete
+                for row in show_gaps.table_rows(include_complete=verbose):
+                    print(row)
+                if report:
+                    report.write_record(show_gaps.to_dict())
+    except Exception as e:
+        log.exception(MediaRenamerException(str(e)))
+    finally:
+        if index:
+            index.close()
+        if report:
+            report.close()
+            log.info(f'Wrote {report.count} shows to: {output_file}')
+    log.info(f'Checked {shows} shows, {incomplete_shows} with gaps, duplicates or out of range episodes')
+
+
+def run_media_info(debug:bool = False, verbose:bool = False, jobs: int = DEFAULT_JOBS,
+                   probe_cache_path: Optional[str] = None, full_rescan: bool = False):
+    """
+    The run media info run type function.
+
+    :param debug: Is debug enabled.
+    :param verbose: Is verbose enabled.
+    :param jobs: Number of media files probed in parallel.
+    :param probe_cache_path: Probe cache file, the one in the user cache directory is used if not given.
+    :param full_rescan: Probe every file again instead of reusing the results of files that did not change.
+    """
+    try:
+        if debug:
+            log = media_log(log_level='DEBUG')
+        else:
+            log = media_log(log_level='INFO')
+    except Exception as e:
+        raise MediaRenamerException(str(e))
+
+    log.info('Getting media info for current directory...')
+    try:
+        seasons = {}
+        episodes = {}
+
+        current_directory = os.getcwd()
+
+        directory_basename = extract_current_directory_basename()
+        if not directory_basename:
+            log.error('Failed to get directory basename.')
+            return
+
+        show_year = extract_show_year_from_directory_name(directory_basename)
+        show_name = directory_basename.replace(show_year, '')
+        if not show_name:
+            log.error('Failed to get show name.')
+            return
+
+        snapshot = take_directory_snapshot(current_directory)
+        folders_in_directory = snapshot.folders
+        files_in_directory = snapshot.files
+
+        if folders_in_directory:
+            log.info(f'Extracting season folders for show: {show_name}...')
+            for folder_in_directory in folders_in_directory:
+                season_number = extract_season_number_from_directory_name(folder_in_directory)
+                if season_number:
+                    seasons[folder_in_directory] = season_number
+            log.info(f'Extracted {len(seasons)} season folders for show: {show_name}')
+        else:
+            log.info(f'No season folders found for show: {show_name}')
+
+        if files_in_directory:
+            files_to_delete = parse_files_in_directory_to_delete(files_in_directory)
+
+        if files_in_directory:
+            log.info(f'Extracting episode files for show: {show_name}...')
+            for file_in_directory in files_in_directory:
+                episode_number = extract_episode_number_from_file_name(file_in_directory)
+                if episode_number:
+                    episodes[file_in_directory] = episode_number
+            log.info(f'Extracted {len(episodes)} episode files for show: {show_name}')
+        else:
+            log.info(f'No episode files found for show: {show_name}')
+
+        if seasons:
+            from .gaps import find_show_gaps
+            show_gaps = find_show_gaps(current_directory, show_name, log=log)
+            for season_gaps in show_gaps.seasons:
+                log.info(f'Season {season_gaps.season}: {season_gaps.episodes} episodes up to episode '
+                         f'{season_gaps.last_episode}, missing: {len(season_gaps.missing)} ranges, duplicates: '
+                         f'{len(season_gaps.duplicates)}, out of range: {len(season_gaps.out_of_range)}')
+
+        probe_media_files(current_directory, jobs, log, probe_cache_path, full_rescan)
+
+    except Exception as e:
+        log.exception(MediaRenamerException(str(e)))
+
+
+def list_media_files(directory: str, rules: Optional[RuleTable] = None) -> List[str]:
+    """
+    Lists the media files below a directory.
+
+    Hidden files, downloads that are still in progress and folders that can not be read are left out.
+
+    :param directory: The directory.
+    :param rules: Extension rules of the library, the active ones if not given.
+
+    :return: Sorted list of media files.
+    """
+    rules = rules or get_rules()
+    media_extensions = rules.extensions(MOVIE, MEDIA) | rules.extensions(SEASON, MEDIA)
+    return sorted(entry.path for entry in iter_tree(directory, prune=PRUNE_DOWNLOADS, on_error=skip_unreadable)
+                  if not entry.is_dir and (extract_file_extension(entry.name) or '').lower() in media_extensions)
+
+
+def check_quarantine_directory(current_directory: str, quarantine: str):
+    """
+    Checks that a quarantine directory is outside a library, the quarantined files would be walked and verified again
+    on every run otherwise.
+
+    :param current_directory: The Movie or TV library directory.
+    :param quarantine: The quarantine directory.
+    """
+    real_library = os.path.realpath(current_directory)
+    if os.path.commonpath([real_library, os.path.realpath(quarantine)]) == real_library:
+        raise FileException(f'Quarantine directory {quarantine} is inside the library: {current_directory}')
+
+
+def verify_library(current_directory: str, jobs: int, log: logging.Logger, quarantine: Optional[str] = None,
+                   dry_run: bool = False, ignore_errors: bool = False, rules: Optional[RuleTable] = None,
+                   entries: Optional[Iterable[str]] = None) -> Set[str]:
+    """
+    Checks the container framing of every media file in a library and optionally quarantines the truncated ones.
+
+    Truncated files keep their place in the library directory layout below the quarantine directory, e.g.
+    ``quarantine/Movie/Folder/file.mkv``. The quarantine directory has to be on the same filesystem as the library.
+
+    :param current_directory: The Movie or TV library directory.
+    :param jobs: Number of files checked in parallel.
+    :param log: The logger.
+    :param quarantine: Directory truncated files are moved into, they are only reported if not given. It can not be
+        inside the library, the quarantined files would be walked and verified again on every run.
+    :param dry_run: Print the quarantine moves instead of applying them.
+    :param ignore_errors: Keep moving the remaining files when one fails.
+    :param rules: Extension rules of the library, the active ones if not given.
+    :param entries: Loose files and folders of the library to check, the whole library is checked if not given.
+
+    :return: Set of truncated files that are still in the library.
+    """
+    from .verify import verify_files
+
+    if quarantine:
+        check_quarantine_directory(current_directory, quarantine)
+
+    if entries is None:
+        files = list_media_files(current_directory, rules)
+    else:
+        rules = rules or get_rules()
+        media_extensions = rules.extensions(MOVIE, MEDIA) | rules.extensions(SEASON, MEDIA)
+        files = []
+        for entry in entries:
+            if os.path.isdir(entry):
+                files.extend(list_media_files(entry, rules))
+            elif (extract_file_extension(entry) or '').lower() in media_extensions:
+                files.append(entry)
+    log.info(f'Verifying {len(files)} media files...')
+    results = verify_files(files, jobs, on_error=lambda e: log.warning(f'Failed to verify file. Error: {e}'))
+    truncated = [result for result in results if not result.ok]
+    METRICS.count('verified_files', len(results))
+    METRICS.count('truncated_files', len(truncated))
+    for result in truncated:
+        log.warning(f'Truncated file: {result.path}. {result.error}')
+    for result in results:
+        if result.warning:
+            log.warning(f'Possibly incomplete file: {result.path}. {result.warning}')
+    log.info(f'Verified {len(results)} media files, {len(truncated)} truncated')
+    if not truncated or not quarantine:
+        return set(result.path for result in truncated)
+
+    quarantine = os.path.abspath(quarantine)
+    library_parent = os.path.dirname(current_directory)
+    plan = RenamePlan()
+    planned_directories = set()
+    for result in truncated:
+        target = os.path.join(quarantine, os.path.relpath(result.path, library_parent))
+        missing_directories = []
+        directory = os.path.dirname(target)
+        while directory not in planned_directories and not os.path.isdir(directory):
+            missing_directories.append(directory)
+            directory = os.path.dirname(directory)
+        for directory in reversed(missing_directories):
+            plan.mkdir(directory)
+            planned_directories.add(directory)
+        plan.move(result.path, target)
+    log.info(f'Moving {len(truncated)} truncated files to: {quarantine}')
+    failed_operations = apply_plan(plan, dry_run=dry_run, ignore_errors=ignore_errors, log=log,
+                                   root=current_directory)
+    if failed_operations:
+        log.warning(f'{len(failed_operations)} quarantine operations failed to apply')
+    return set(result.path for result in truncated if os.path.lexists(result.path))
+
+
+def probe_media_files(directory: str, jobs: int, log: logging.Logger, probe_cache_path: Optional[str] = None,
+                      full_rescan: bool = False):
+    """
+    Logs the resolution, duration, codec and audio languages of every media file below a directory.
+
+    :param directory: The directory.
+    :param jobs: Number of media files probed in parallel.
+    :param log: The logger.
+    :param probe_cache_path: Probe cache file, the one in the user cache directory is used if not given.
+    :param full_rescan: Ignore the probe cache and probe every file again, the cache is rebuilt.
+    """
+    from .probe import ProbeCache, probe_files
+
+    files = list_media_files(directory)
+    log.info(f'Probing {len(files)} media files...')
+
+    with ProbeCache(probe_cache_path, full_rescan) as cache, METRICS.phase('probe'):
+        probed = probe_files(files, jobs, cache, on_error=lambda e: log.warning(str(e)))
+    METRICS.count('probe_cache_hits', cache.hits)
+    METRICS.count('probe_cache_misses', cache.misses)
+
+    for file in files:
+        info = probed.get(file)
+        if info is not None:
+            log.info(f'{os.path.relpath(file, directory)}: {info.describe()}')
+        elif file in probed:
+            log.debug(f'{os.path.relpath(file, directory)}: not a Matroska or MP4 file')
+    log.info(f'Probed {sum(info is not None for info in probed.values())} of {len(files)} media files, '
+             f'{cache.hits} from the probe cache')
+
+
+def run_movie(debug: bool = False, dry_run: bool = False, verbose: bool = False, ignore_errors: bool = False, output_file: str = None):
+    if extract_current_directory_basename() != "Movie":
+        print("Not in movie directory. Exiting...")
+        exit(1)
+
+    run(debug, dry_run, verbose, ignore_errors, output_file)
+
+
+def run_tv(debug: bool = False, dry_run: bool = False, verbose: bool = False, ignore_errors: bool = False, output_file: str = None):
+    if extract_current_directory_basename() != "TV":
+        print("Not in TV directory. Exiting...")
+        exit(1)
+
+    run(debug, dry_run, verbose, ignore_errors, output_file)
+
+
+def scan_folder_tree(folder: str, claims: PathClaims) -> dict:
+    """
+    Lists every folder and file below a folder.
+
+    :param folder: The folder to scan.
+    :param claims: Path claims shared with the other walkers.
+
+    :return: Dictionary with the scanned folders and files.
+    """
+    scanned_folders = []
+    scanned_files = []
+    for entry in iter_tree(folder, on_error=skip_unreadable):
+        if entry.is_dir:
+            scanned_folders.append(entry.path)
+        else:
+            scanned_files.append(entry.path)
+
+    return {'folders': scanned_folders, 'files': scanned_files}
+
+
+def test_run(jobs: int = DEFAULT_JOBS):
+    log = media_log(log_level='DEBUG')
+
+    log.info('Starting media renamer in test mode...')
+
+    current_directory = os.getcwd()
+
+    results = {}
+
+    scanned_folders = extract_list_of_folders_in_directory(current_directory)
+
+    for walk_result in walk_library(scanned_folders, scan_folder_tree, jobs=jobs):
+        if not walk_result.ok:
+            log.error(f'Failed to scan folder: {walk_result.folder}. Error: {walk_result.error}')
+            continue
+        results[walk_result.folder] = walk_result.result
+
+
+def test2(jobs: int = DEFAULT_JOBS):
+    log = media_log(log_level='DEBUG')
+    log.info('Starting media renamer in test mode...')
+    current_directory = os.getcwd()
+    current_basename = extract_current_directory_basename()
+    show_name = extract_show_name_from_directory_basename(current_basename)
+    if show_name:
+        show_name = snap_show_name(current_directory, show_name, log)
+    log.info(f'Show: {show_name}')
+
+    # The file paths are collected before anything is renamed, so a renamed file is never read a second time
+    try:
+        scanned_files = [entry.path for entry in iter_tree(current_directory, prune=PRUNE_DOWNLOADS,
+                                                           on_error=skip_unreadable)
+                         if not entry.is_dir]
+    except DirectoryScanException as e:
+        log.error(f'Failed to scan folder: {current_directory}. Error: {e}')
+        exit(1)
+
+    for file in scanned_files:
+        log.debug(f'File: {file}')
+        file_extension = extract_file_extension(file)
+        if not file_extension:
+            log.warning(f'File extension not recognized: {file}')
+            continue
+        if get_rules().classify(SEASON, file_extension).action == DELETE:
+            log.warning(f'File extension not allowed: {file}')
+            delete_file(file)
+            continue
+        file_season = extract_season_number_from_directory_name(file)
+        file_episode = extract_episode_number_from_file_name(file)
+        if not file_season or not file_episode:
+            log.warning(f'Couldnt extract season or episode number for file: {file}')
+            continue
+        else:
+            file_basename = extract_file_basename(file)
+            file_path = os.path.dirname(file)
+            new_file_basename = get_config().templates['episode'].render_parts(
+                show=show_name, season=int(file_season), episode=int(file_episode),
+                title=extract_episode_title_from_file_name(file_basename), ext=file_extension)[-1]
+
+            new_file = os.path.join(file_path, new_file_basename)
+            if not rename_file(file, new_file):
+                log.error(f'Rename failed for file: {file}')
+                continue
@@ -6,3 +6,39 @@ ALLOWED_FILE_EXTENSIONS = [
     'avi',
     'srt'
 ]
+
+# Sidecar rules, see rules.parse_rule for the syntax. The defaults keep the behaviour of a plain run, rules listed in
+# RULES are applied after them so they override a default for the same folder kind and extension, e.g.
+# RULES = ['srt move Subs', 'nfo keep', 'txt delete']
+DEFAULT_RULES = [
+    'movie:mkv media',
+    'movie:mp4 media',
+    'movie:jpg delete',
+    'featurettes:mkv keep',
+    'featurettes:mp4 keep',
+    'featurettes:jpg delete',
+    'subs:srt keep',
+    'season:* delete',
+] + [f'season:{extension} media' for extension in ALLOWED_FILE_EXTENSIONS]
+
+RULES = []
+
+MIN_MOVIE_YEAR = 1950
+
+# Highest season and episode numbers the gap report takes at face value, anything above is usually a year, a date or
+# a resolution mistaken for a number
+MAX_SEASON_NUMBER = 100
+MAX_EPISODE_NUMBER = 999
+
+# Library config file, looked up in the library directory first and then in the user config directory
+CONFIG_FILE_NAME = '.mediarenamer.toml'
+
+# Defaults of the command line options, kept here so the entry point can build its parser without importing the
+# modules that use them
+DEFAULT_JOBS = 1
+DEFAULT_JOBS_PER_DEVICE = 1
+DEFAULT_CONCURRENCY = 1
+DEFAULT_SETTLE_SECONDS = 2.0
+
+# Extensions download clients give files that are still being written
+PARTIAL_FILE_EXTENSIONS = frozenset(['parts', 'part', 'crdownload', '!qB'])
@@ -0,0 +1,180 @@
+import os
+import mmap
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .exceptions import FileException
+from .file_utils import extract_file_extension
+from .walker import PRUNE_DOWNLOADS, iter_tree, skip_unreadable
+from .config import DEFAULT_JOBS
+
+
+PARTIAL_HASH_CHUNK_SIZE = 1024 * 1024
+FULL_HASH_BLOCK_SIZE = 8 * 1024 * 1024
+
+
+class DuplicateSet(NamedTuple):
+    """
+    Files with identical content.
+    """
+    size: int
+    digest: str
+    files: List[str]
+
+
+def _new_hash():
+    return hashlib.blake2b(digest_size=20)
+
+
+def _hash_mapped(file_name: str, update: Callable[[memoryview, int], None]):
+    try:
+        with open(file_name, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as view:
+                    update(view, len(mapped))
+    except Exception as e:
+        raise FileException(str(e))
+
+
+def partial_hash(file_name: str, chunk_size: int = PARTIAL_HASH_CHUNK_SIZE) -> str:
+    """
+    Hashes the first and the last chunk of a file.
+
+    Files of up to two chunks are hashed completely, so their partial hash is also their content hash.
+
+    :param file_name: The file to hash.
+    :param chunk_size: Size of the head and tail chunks in bytes.
+
+    :return: Hex digest of the head and tail of the file.
+    """
+    digest = _new_hash()
+
+    def _update(view: memoryview, size: int):
+        if size <= 2 * chunk_size:
+            digest.update(view)
+        else:
+            digest.update(view[:chunk_size])
+            digest.update(view[size - chunk_size:])
+
+    _hash_mapped(file_name, _update)
+    return digest.hexdigest()
+
+
+def full_hash(file_name: str, block_size: int = FULL_HASH_BLOCK_SIZE) -> str:
+    """
+    Hashes the full content of a file, one mapped block at a time so large files are never loaded into memory.
+
+    :param file_name: The file to hash.
+    :param block_size: Number of bytes hashed at once.
+
+    :return: Hex digest of the file content.
+    """
+    digest = _new_hash()
+
+    def _update(view: memoryview, size: int):
+        for start in range(0, size, block_size):
+            digest.update(view[start:start + block_size])
+
+    _hash_mapped(file_name, _update)
+    return digest.hexdigest()
+
+
+def group_files_by_size(files: Iterable[str]) -> Dict[int, List[str]]:
+    """
+    Groups files by size, keeping only sizes shared by more than one file.
+
+    Empty files and extra hard links to an already seen file are left out.
+
+    :param files: The files.
+
+    :return: Dictionary of file size to files.
+    """
+    sizes = {}
+    seen = set()
+    for file_name in files:
+        try:
+            stat = os.stat(file_name)
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            raise FileException(str(e))
+        if not stat.st_size or (stat.st_dev, stat.st_ino) in seen:
+            continue
+        seen.add((stat.st_dev, stat.st_ino))
+        sizes.setdefault(stat.st_size, []).append(file_name)
+    return {size: sorted(group) for size, group in sizes.items() if len(group) > 1}
+
+
+def _group_by_hash(groups: Iterable[Tuple[int, List[str]]], hash_function: Callable[[str], str],
+                   executor: ThreadPoolExecutor) -> List[Tuple[int, str, List[str]]]:
+    def _hash(file_name: str) -> Optional[str]:
+        # A file removed, truncated or made unreadable since it was listed only drops out of its group
+        try:
+            return hash_function(file_name)
+        except FileException as e:
+            logging.getLogger('media_log').warning(f'Skipping file that can not be hashed: {file_name}. Error: {e}')
+            return None
+
+    groups = list(groups)
+    files = [file_name for _, group in groups for file_name in group]
+    digests = dict(zip(files, executor.map(_hash, files)))
+    hashed = []
+    for size, group in groups:
+        by_digest = {}
+        for file_name in group:
+            if digests[file_name] is not None:
+                by_digest.setdefault(digests[file_name], []).append(file_name)
+        hashed.extend((size, digest, same) for digest, same in by_digest.items() if len(same) > 1)
+    return hashed
+
+
+def find_duplicates(files: Iterable[str], jobs: int = DEFAULT_JOBS,
+                    chunk_size: int = PARTIAL_HASH_CHUNK_SIZE) -> List[DuplicateSet]:
+    """
+    Finds sets of files with identical content.
+
+    Candidates are narrowed down in three passes that each read more of a file: the size, a hash of the head and tail
+    chunks, and only for files that still collide a hash of the full content. Hashing runs on a thread pool.
+
+    :param files: The files to compare.
+    :param jobs: Number of files hashed in parallel.
+    :param chunk_size: Size of the head and tail chunks of the partial hash in bytes.
+
+    :return: List of duplicate sets, largest files first.
+    """
+    sizes = group_files_by_size(files)
+    with ThreadPoolExecutor(max_workers=max(1, jobs), thread_name_prefix='hash') as executor:
+        candidates = _group_by_hash(sizes.items(), lambda file_name: partial_hash(file_name, chunk_size), executor)
+        duplicates = [DuplicateSet(size, digest, group) for size, digest, group in candidates
+                      if size <= 2 * chunk_size]
+        full = _group_by_hash(((size, group) for size, _, group in candidates if size > 2 * chunk_size), full_hash,
+                              executor)
+        duplicates.extend(DuplicateSet(size, digest, group) for size, digest, group in full)
+    return sorted(duplicates, key=lambda duplicate: (-duplicate.size, duplicate.files))
+
+
+def find_duplicate_media(directories: Iterable[str], extensions: Optional[Iterable[str]] = None,
+                         jobs: int = DEFAULT_JOBS) -> List[DuplicateSet]:
+    """
+    Finds duplicate media files below one or more library directories.
+
+    Hidden files, downloads that are still in progress and folders that can not be read are left out.
+
+    :param directories: The library directories.
+    :param extensions: Only compare files with these extensions, in any case, all files if not given.
+    :param jobs: Number of files hashed in parallel.
+
+    :return: List of duplicate sets, largest files first.
+    """
+    extensions = frozenset(extension.lower() for extension in extensions) if extensions is not None else None
+    files = []
+    for directory in directories:
+        for entry in iter_tree(directory, prune=PRUNE_DOWNLOADS, on_error=skip_unreadable):
+            if entry.is_dir:
+                continue
+            extension = extract_file_extension(entry.name)
+            if extensions is None or (extension is not None and extension.lower() in extensions):
+                files.append(entry.path)
+    return find_duplicates(files, jobs)
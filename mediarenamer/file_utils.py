@@ -1,23 +1,20 @@
 import os
-import sys
 import json
 from typing import List, Optional, Tuple
 
-try:
-    from .config import ALLOWED_FILE_EXTENSIONS
-    from .exceptions import MediaRenamerException, FileException, ParserException, DirectoryScanException
-    from .utils import extract_season_number_from_directory_name, extract_episode_number_from_file_name
-except ImportError:
-    sys.path.append('./')
-    from config import ALLOWED_FILE_EXTENSIONS
-    from exceptions import MediaRenamerException, FileException, ParserException, DirectoryScanException
-    from utils import extract_season_number_from_directory_name, extract_episode_number_from_file_name
+from .exceptions import MediaRenamerException, FileException, ParserException, DirectoryScanException
+from .utils import extract_season_number_from_directory_name, extract_episode_number_from_file_name, parse_names
+from .metrics import METRICS
+from .walker import iter_tree, skip_unreadable
+from .rules import SEASON, MEDIA, KEEP, DELETE, MOVE, get_rules
 
 
 def write_to_file(filename: str, content: str, overwrite: bool = False, json_data: bool = True) -> bool:
     """
     Writes or appends content to a file.
 
+    Streams of records should use ``report.ReportWriter`` instead, which keeps the file open between records.
+
     :param filename: The filename to write.
     :param content: The content to write.
     :param overwrite: Overwrite existing content.
@@ -44,7 +41,8 @@ def write_to_file(filename: str, content: str, overwrite: bool = False, json_dat
         if json_data:
             try:
                 with open(filename, 'a') as f:
-                    json.dump(content, f, indent=4)
+                    # Appended JSON is written as one line per call so the file stays valid JSON lines
+                    f.write(json.dumps(content) + '\n')
                     return True
             except Exception as e:
                 raise FileException(str(e))
@@ -57,6 +55,24 @@ def write_to_file(filename: str, content: str, overwrite: bool = False, json_dat
                 raise FileException(str(e))
 
 
+def read_roots_file(filename: str) -> List[str]:
+    """
+    Reads the library roots listed in a file, one path per line.
+
+    Empty lines and lines starting with ``#`` are skipped and ``~`` is expanded.
+
+    :param filename: The roots file.
+
+    :return: List of library roots.
+    """
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            lines = [line.strip() for line in f]
+    except Exception as e:
+        raise FileException(str(e))
+    return [os.path.expanduser(line) for line in lines if line and not line.startswith('#')]
+
+
 def extract_current_directory_basename() -> Optional[str]:
     """
     Extracts the current directory name.
@@ -71,6 +87,102 @@ def extract_current_directory_basename() -> Optional[str]:
         raise FileException(str(e))
 
 
+class DirectorySnapshot(object):
+    """
+    A single pass listing of a directory.
+
+    The listing is taken with one ``os.scandir`` call and keeps the ``DirEntry`` objects around so the file type
+    and stat information cached by the operating system can be reused without extra syscalls.
+    """
+
+    __slots__ = ('directory', 'files', 'folders', 'extensions', '_entries')
+
+    def __init__(self, directory: str, files: Optional[List[str]] = None, folders: Optional[List[str]] = None):
+        """
+        :param directory: The directory to snapshot.
+        :param files: Basenames of the files, when given the directory is not read and the snapshot describes the
+            planned contents of the directory instead.
+        :param folders: Basenames of the folders, used together with files.
+        """
+        self.directory = directory
+        self.files = []
+        self.folders = []
+        self.extensions = {}
+        self._entries = {}
+
+        if files is not None or folders is not None:
+            for name in sorted(folders or []):
+                self.folders.append(os.path.join(directory, name))
+            for name in sorted(files or []):
+                full_path = os.path.join(directory, name)
+                self.files.append(full_path)
+                self.extensions[full_path] = extract_file_extension(name)
+            return
+
+        try:
+            with METRICS.timed('scandir'), os.scandir(directory) as iterator:
+                entries = sorted(iterator, key=lambda e: e.name)
+        except Exception as e:
+            raise FileException(str(e))
+
+        for entry in entries:
+            full_path = os.path.join(directory, entry.name)
+            try:
+                if entry.is_dir():
+                    self.folders.append(full_path)
+                elif entry.is_file():
+                    self.files.append(full_path)
+                    self.extensions[full_path] = extract_file_extension(entry.name)
+                else:
+                    continue
+            except OSError:
+                continue
+            self._entries[full_path] = entry
+
+    def __repr__(self) -> str:
+        return f'DirectorySnapshot({self.directory!r}, files={len(self.files)}, folders={len(self.folders)})'
+
+    def extension(self, file_name: str) -> Optional[str]:
+        """
+        Returns the cached extension of a file in the snapshot.
+
+        :param file_name: Full path of the file.
+
+        :return: File extension.
+        """
+        if file_name in self.extensions:
+            return self.extensions[file_name]
+        return extract_file_extension(file_name)
+
+    def stat(self, path: str) -> os.stat_result:
+        """
+        Returns the stat result of an entry, reusing the one cached on the ``DirEntry``.
+
+        :param path: Full path of the entry.
+
+        :return: The stat result.
+        """
+        try:
+            entry = self._entries.get(path)
+            with METRICS.timed('stat'):
+                if entry is not None:
+                    return entry.stat()
+                return os.stat(path)
+        except Exception as e:
+            raise FileException(str(e))
+
+
+def take_directory_snapshot(directory: str) -> DirectorySnapshot:
+    """
+    Lists a directory once and returns its files, folders and file extensions together.
+
+    :param directory: The directory to snapshot.
+
+    :return: The directory snapshot.
+    """
+    return DirectorySnapshot(directory)
+
+
 def extract_list_of_folders_in_directory(directory: str) -> Optional[List[str]]:
     """
     Extracts a list of all folders in a directory.
@@ -79,15 +191,7 @@ def extract_list_of_folders_in_directory(directory: str) -> Optional[List[str]]:
 
     :return: List of all folders in the directory.
     """
-    folders = []
-    try:
-        for entry in os.listdir(directory):
-            full_path = os.path.join(directory, entry)
-            if os.path.isdir(full_path):
-                folders.append(full_path)
-        return folders
-    except Exception as e:
-        raise FileException(str(e))
+    return take_directory_snapshot(directory).folders
 
 
 def extract_list_of_files_in_directory(directory: str) -> Optional[List[str]]:
@@ -98,15 +202,7 @@ def extract_list_of_files_in_directory(directory: str) -> Optional[List[str]]:
 
     :return: List of all files in the directory.
     """
-    files = []
-    try:
-        for entry in os.listdir(directory):
-            full_path = os.path.join(directory, entry)
-            if os.path.isfile(full_path):
-                files.append(full_path)
-        return files
-    except Exception as e:
-        raise FileException(str(e))
+    return take_directory_snapshot(directory).files
 
 
 def rename_file(current_file_name: str, new_file_name: str) -> bool:
@@ -119,7 +215,9 @@ def rename_file(current_file_name: str, new_file_name: str) -> bool:
     :return: True if the file was renamed, False otherwise.
     """
     try:
-        os.rename(current_file_name, new_file_name)
+        with METRICS.timed('rename'):
+            os.rename(current_file_name, new_file_name)
+        METRICS.count('renames')
         return True
     except Exception as e:
         raise FileException(str(e))
@@ -135,7 +233,9 @@ def rename_directory(current_directory_name: str, new_directory_name: str) -> bo
     :return: True if the directory was renamed, False otherwise.
     """
     try:
-        os.rename(current_directory_name, new_directory_name)
+        with METRICS.timed('rename'):
+            os.rename(current_directory_name, new_directory_name)
+        METRICS.count('renames')
         return True
     except Exception as e:
         raise FileException(str(e))
@@ -167,7 +267,26 @@ def delete_file(file_name: str) -> bool:
     :return:
     """
     try:
-        os.remove(file_name)
+        with METRICS.timed('remove'):
+            os.remove(file_name)
+        METRICS.count('deletes')
+        return True
+    except Exception as e:
+        raise FileException(str(e))
+
+
+def delete_directory(directory: str) -> bool:
+    """
+    Deletes an empty directory.
+
+    :param directory: The directory to delete.
+
+    :return: True if the directory was deleted, False otherwise.
+    """
+    try:
+        with METRICS.timed('rmdir'):
+            os.rmdir(directory)
+        METRICS.count('deletes')
         return True
     except Exception as e:
         raise FileException(str(e))
@@ -182,31 +301,46 @@ def parse_files_in_directory_to_delete(files_in_directory: List[str]) -> Optiona
     """
     files_to_delete = []
     try:
+        rules = get_rules()
         for file_in_directory in files_in_directory:
             file_extension = extract_file_extension(file_in_directory)
-            if file_extension not in ALLOWED_FILE_EXTENSIONS:
+            if rules.classify(SEASON, file_extension).action == DELETE:
                 files_to_delete.append(file_in_directory)
         return files_to_delete
     except Exception as e:
         raise ParserException(str(e))
 
 
-def scan_directory(directory: str) -> dict:
+def scan_directory(directory: str, index=None, parse_workers: Optional[int] = None, rules=None) -> dict:
     """
 
     :param directory:
+    :param index: Scan index to reuse the results of an unchanged directory from.
+    :param parse_workers: Number of processes the file names are parsed on, see ``utils.parse_names``.
+    :param rules: Extension rules of the library, the active ones if not given.
     :return:
     """
+    if index is not None:
+        stat = index.stat(directory)
+        cached_scan_results = index.scan_results(directory)
+        if cached_scan_results is not None:
+            return cached_scan_results
+
     scan_results = {}
     season_folders = []
     episode_files = []
     unknown_folders = []
     unknown_files = []
     files_to_delete = []
+    files_to_move = []
 
     directory_basename = extract_directory_basename(directory)
-    folders_in_directory = extract_list_of_folders_in_directory(directory)
-    files_in_directory = extract_list_of_files_in_directory(directory)
+    if index is not None:
+        snapshot = index.snapshot(directory)
+    else:
+        snapshot = take_directory_snapshot(directory)
+    folders_in_directory = snapshot.folders
+    files_in_directory = snapshot.files
 
     if folders_in_directory:
         for folder_in_directory in folders_in_directory:
@@ -217,15 +351,17 @@ def scan_directory(directory: str) -> dict:
                 unknown_folders.append(folder_in_directory)
 
     if files_in_directory:
-        files_in_directory_to_delete = parse_files_in_directory_to_delete(files_in_directory)
-        if files_in_directory_to_delete:
-            files_to_delete.extend(files_in_directory_to_delete)
-
-        for file_in_directory in files_in_directory:
-            if file_in_directory in files_to_delete:
+        rules = rules or get_rules()
+        parsed_files = parse_names([os.path.basename(file) for file in files_in_directory], parse_workers)
+        for file_in_directory, parsed_file in zip(files_in_directory, parsed_files):
+            rule = rules.classify(SEASON, extract_file_extension(parsed_file.name))
+            if rule.action == DELETE:
+                files_to_delete.append(file_in_directory)
+            elif rule.action == MOVE:
+                files_to_move.append([file_in_directory, rule.target])
+            elif rule.action == KEEP:
                 continue
-            episode_number = extract_episode_number_from_file_name(file_in_directory)
-            if episode_number:
+            elif rule.action == MEDIA and parsed_file.episode:
                 episode_files.append(file_in_directory)
             else:
                 unknown_files.append(file_in_directory)
@@ -244,6 +380,9 @@ def scan_directory(directory: str) -> dict:
     scan_results['unknown_folders'] = unknown_folders
     scan_results['unknown_files'] = unknown_files
     scan_results['files_to_delete'] = files_to_delete
+    scan_results['files_to_move'] = files_to_move
+    if index is not None and stat is not None:
+        index.store_scan_results(directory, stat, scan_results)
     return scan_results
 
 
@@ -281,25 +420,82 @@ def extract_file_basename(file_name: str) -> Optional[str]:
         raise FileException(str(e))
 
 
-def create_directory_for_movie_file(file_name: str) -> Optional[str]:
+def create_directory(directory: str) -> bool:
     """
-    Creates a directory for a movie file and moves file to directory.
+    Creates a directory.
+
+    :param directory: The directory to create.
+
+    :return: True if the directory was created, False otherwise.
+    """
+    try:
+        with METRICS.timed('mkdir'):
+            os.mkdir(directory)
+        METRICS.count('mkdirs')
+        return True
+    except Exception as e:
+        raise FileException(str(e))
+
+
+def extract_movie_directory_for_file(file_name: str, directory: str) -> Optional[str]:
+    """
+    Extracts the path of the directory a loose movie file belongs in.
 
     :param file_name: Name of the movie file.
+    :param directory: The directory the new directory is created in.
 
-    :return: Path to the new directory.
+    :return: Path to the movie directory.
     """
     try:
         file_basename = os.path.basename(file_name)
         if not file_basename:
-            return
+            return None
 
         actual_file_name = file_basename.split('.')[0]
         if not actual_file_name:
-            return
+            return None
+
+        return os.path.join(directory, actual_file_name)
+    except Exception as e:
+        raise FileException(str(e))
+
+
+def extract_library_entry_for_path(path: str, library_basename: str) -> Optional[Tuple[str, str]]:
+    """
+    Extracts the library a path belongs to and the entry of the library root that contains it.
+
+    Only the parents of the path are looked at, nothing is read from disk.
+
+    :param path: A file or folder somewhere inside the library.
+    :param library_basename: Basename of the library directory, Movie or TV.
+
+    :return: Tuple of the library directory and the entry, None if the path is not inside such a library.
+    """
+    try:
+        entry = os.path.abspath(path)
+        while True:
+            library = os.path.dirname(entry)
+            if library == entry:
+                return None
+            if os.path.basename(library) == library_basename:
+                return library, entry
+            entry = library
+    except Exception as e:
+        raise FileException(str(e))
+
+
+def create_directory_for_movie_file(file_name: str) -> Optional[str]:
+    """
+    Creates a directory for a movie file and moves file to directory.
+
+    :param file_name: Name of the movie file.
 
-        current_directory = os.getcwd()
-        new_directory = os.path.join(current_directory, actual_file_name)
+    :return: Path to the new directory.
+    """
+    try:
+        new_directory = extract_movie_directory_for_file(file_name, os.getcwd())
+        if not new_directory:
+            return
         if os.path.exists(new_directory):
             return
         os.mkdir(new_directory)
@@ -309,43 +505,33 @@ def create_directory_for_movie_file(file_name: str) -> Optional[str]:
         raise FileException(str(e))
 
 
-def recursively_list_contents_in_directory(directory: str) -> Tuple[List[str], List[str]]:
+def recursively_list_contents_in_directory(directory: str, index=None) -> Tuple[List[str], List[str]]:
     """
     Recursively lists the contents of a directory.
 
     :param directory: The directory to get contents from.
+    :param index: Scan index, only directories whose mtime changed are read again when given.
 
     :return: List of all files and folders in the directory.
     """
     folders = []
     files = []
     try:
-        for root, dirs, files in os.walk(directory):
-            # Get subdirectories
-            for d in dirs:
-                folder_path = os.path.join(root, d)
-                folders.append(folder_path)
-
-            # Get files
-            for f in files:
-                file_path = os.path.join(root, f)
-                files.append(file_path)
+        if index is None:
+            for entry in iter_tree(directory, on_error=skip_unreadable):
+                if entry.is_dir:
+                    folders.append(entry.path)
+                else:
+                    files.append(entry.path)
+        else:
+            pending = [directory]
+            while pending:
+                snapshot = index.snapshot(pending.pop())
+                folders.extend(snapshot.folders)
+                files.extend(snapshot.files)
+                # Like os.walk, symlinked directories are listed but not descended into
+                pending.extend(folder for folder in reversed(snapshot.folders) if not os.path.islink(folder))
 
     except Exception as e:
         print(DirectoryScanException(str(e)))
     return folders, files
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
@@ -0,0 +1,238 @@
+import re
+import logging
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from .config import MAX_SEASON_NUMBER, MAX_EPISODE_NUMBER
+from .exceptions import ParserException
+from .file_utils import scan_directory, extract_directory_basename, extract_file_basename
+from .utils import extract_episode_number_from_file_name, extract_season_number_from_directory_name
+
+# Files holding more than one episode, e.g. ``S01E01E02`` or ``S01E01-E03``
+MULTI_EPISODE_PATTERN = re.compile(r'\bS\d+\s*E(\d+)(?:\s*-?\s*E(\d+))+', re.IGNORECASE)
+
+TABLE_HEADER = f'{"Show":<40} {"Season":>6} {"Episodes":>8}  {"Missing":<24} {"Duplicates":<16} Out of range'
+
+
+class EpisodeSet(object):
+    """
+    Set of episode or season numbers stored as the bits of two integers, one for the numbers seen and one for the
+    numbers seen more than once.
+
+    A season of a hundred episodes takes a few dozen bytes, and gaps and duplicates fall out of a couple of integer
+    operations instead of sorting.
+    """
+
+    __slots__ = ('present', 'repeated')
+
+    def __init__(self, numbers: Iterable[int] = ()):
+        """
+        :param numbers: Numbers to add.
+        """
+        self.present = 0
+        self.repeated = 0
+        for number in numbers:
+            self.add(number)
+
+    def __len__(self) -> int:
+        return bin(self.present).count('1')
+
+    def __contains__(self, number: int) -> bool:
+        return number >= 0 and bool(self.present >> number & 1)
+
+    def add(self, first: int, last: Optional[int] = None):
+        """
+        Adds a number or a range of numbers.
+
+        :param first: The number, or the first number of the range.
+        :param last: The last number of the range, inclusive.
+        """
+        last = first if last is None else last
+        mask = ((1 << (last - first + 1)) - 1) << first
+        self.repeated |= self.present & mask
+        self.present |= mask
+
+    @property
+    def last(self) -> int:
+        """
+        Highest number in the set, 0 if it is empty.
+        """
+        return max(0, self.present.bit_length() - 1)
+
+    def missing(self) -> List[Tuple[int, int]]:
+        """
+        Finds the numbers missing between 1 and the highest number.
+
+        :return: List of missing first and last number pairs.
+        """
+        return _runs(~self.present & ((1 << (self.last + 1)) - 2))
+
+    def duplicates(self) -> List[int]:
+        """
+        Finds the numbers that were added more than once.
+
+        :return: Sorted list of numbers.
+        """
+        return [number for first, last in _runs(self.repeated) for number in range(first, last + 1)]
+
+
+def _runs(bits: int) -> List[Tuple[int, int]]:
+    runs = []
+    while bits:
+        first = (bits & -bits).bit_length() - 1
+        shifted = bits >> first
+        # Number of trailing one bits, the length of the run
+        length = ((shifted + 1) & ~shifted).bit_length() - 1
+        runs.append((first, first + length - 1))
+        bits &= ~(((1 << length) - 1) << first)
+    return runs
+
+
+def format_ranges(ranges: Iterable[Tuple[int, int]]) -> str:
+    """
+    Formats number ranges, e.g. ``4, 7-9``.
+
+    :param ranges: First and last number pairs.
+
+    :return: The formatted ranges.
+    """
+    return ', '.join(str(first) if first == last else f'{first}-{last}' for first, last in ranges)
+
+
+def extract_episode_range_from_file_name(file_name: str) -> Optional[Tuple[int, int]]:
+    """
+    Extracts the episodes a file holds.
+
+    :param file_name: The file name.
+
+    :return: First and last episode number, the same number for a single episode, None if there is none.
+    """
+    try:
+        match = MULTI_EPISODE_PATTERN.search(file_name)
+        if match:
+            numbers = [int(number) for number in re.findall(r'E(\d+)', match.group(0), re.IGNORECASE)]
+            return min(numbers), max(numbers)
+        episode = extract_episode_number_from_file_name(file_name)
+    except Exception as e:
+        raise ParserException(str(e))
+    return (int(episode), int(episode)) if episode else None
+
+
+class SeasonGaps(NamedTuple):
+    """
+    Completeness of a single season folder.
+    """
+    season: int
+    folder: str
+    episodes: int
+    last_episode: int
+    missing: List[Tuple[int, int]]
+    duplicates: List[int]
+    out_of_range: List[str]
+
+    @property
+    def complete(self) -> bool:
+        return not self.missing and not self.duplicates and not self.out_of_range
+
+
+class ShowGaps(NamedTuple):
+    """
+    Completeness of a show, its seasons and the episodes of each season.
+    """
+    show: str
+    folder: str
+    seasons: List[SeasonGaps]
+    missing_seasons: List[Tuple[int, int]]
+    duplicate_seasons: List[int]
+
+    @property
+    def complete(self) -> bool:
+        return not self.missing_seasons and not self.duplicate_seasons and all(
+            season.complete for season in self.seasons)
+
+    def to_dict(self) -> dict:
+        record = self._asdict()
+        record['seasons'] = [season._asdict() for season in self.seasons]
+        return record
+
+    def table_rows(self, include_complete: bool = False) -> List[str]:
+        """
+        Formats the show as rows of the gap table, one per season.
+
+        :param include_complete: Also list seasons without gaps, duplicates or out of range episodes.
+
+        :return: List of table rows, see ``TABLE_HEADER``.
+        """
+        show = self.show if len(self.show) <= 40 else self.show[:37] + '...'
+        rows = []
+        if self.missing_seasons or self.duplicate_seasons:
+            rows.append(f'{show:<40} {"-":>6} {"":>8}  {"seasons " + format_ranges(self.missing_seasons):<24} '
+                        f'{", ".join(f"S{season:02d}" for season in self.duplicate_seasons):<16}')
+        for season in self.seasons:
+            if season.complete and not include_complete:
+                continue
+            rows.append(f'{show:<40} {f"S{season.season:02d}":>6} {f"{season.episodes}/{season.last_episode}":>8}  '
+                        f'{format_ranges(season.missing):<24} {", ".join(map(str, season.duplicates)):<16} '
+                        f'{", ".join(season.out_of_range)}'.rstrip())
+        return rows
+
+
+def find_season_gaps(season_folder: str, season: int, scan_results: dict) -> SeasonGaps:
+    """
+    Finds the gaps, duplicates and out of range episodes of a season folder.
+
+    An episode is out of range when its number is 0 or above ``MAX_EPISODE_NUMBER``, usually a resolution or a date
+    taken for the episode number, or when its file name belongs to another season.
+
+    :param season_folder: The season folder.
+    :param season: The season number of the folder.
+    :param scan_results: Scan results of the season folder.
+
+    :return: The season completeness.
+    """
+    episodes = EpisodeSet()
+    out_of_range = []
+    for file in scan_results['episode_files']:
+        file_basename = extract_file_basename(file)
+        episode_range = extract_episode_range_from_file_name(file_basename)
+        # Season folder names and episode file names share the season pattern
+        file_season = extract_season_number_from_directory_name(file_basename)
+        if not episode_range or episode_range[0] < 1 or episode_range[1] > MAX_EPISODE_NUMBER \
+                or (file_season is not None and int(file_season) != season):
+            out_of_range.append(file_basename)
+            continue
+        episodes.add(*episode_range)
+    return SeasonGaps(season, season_folder, len(episodes), episodes.last, episodes.missing(),
+                      episodes.duplicates(), sorted(out_of_range))
+
+
+def find_show_gaps(show_folder: str, show_name: Optional[str] = None, index=None,
+                   parse_workers: Optional[int] = None, log: Optional[logging.Logger] = None) -> ShowGaps:
+    """
+    Finds the missing seasons of a show and the gaps of each of its seasons.
+
+    Specials in season 0 are listed but never count as a missing season, and seasons numbered by year are left out
+    of the missing seasons. Folders whose own name has no season number are skipped, like the planner does.
+
+    :param show_folder: The show folder.
+    :param show_name: The show name, the folder name if not given.
+    :param index: Scan index to reuse the scan results of unchanged folders from.
+    :param parse_workers: Number of processes the file names are parsed on.
+    :param log: The logger skipped folders are reported to.
+
+    :return: The show completeness.
+    """
+    seasons = []
+    season_numbers = EpisodeSet()
+    for season_folder in scan_directory(show_folder, index, parse_workers)['season_folders']:
+        scan_results = scan_directory(season_folder, index, parse_workers)
+        if not scan_results['season_number']:
+            if log is not None:
+                log.warning(f'Failed to extract season number for folder: {season_folder}')
+            continue
+        season = int(scan_results['season_number'])
+        if season <= MAX_SEASON_NUMBER:
+            season_numbers.add(season)
+        seasons.append(find_season_gaps(season_folder, season, scan_results))
+    seasons.sort(key=lambda season_gaps: (season_gaps.season, season_gaps.folder))
+    return ShowGaps(show_name or extract_directory_basename(show_folder), show_folder, seasons,
+                    season_numbers.missing(), season_numbers.duplicates())
@@ -0,0 +1,289 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+from .exceptions import FileException
+from .file_utils import DirectorySnapshot, take_directory_snapshot, extract_file_basename
+from .metrics import METRICS
+
+
+SCHEMA_VERSION = 2
+
+# Directories modified this close to the moment they were indexed are not trusted, the filesystem mtime granularity
+# could hide a change made right after the listing was taken.
+RACY_WINDOW_NS = 2 * 10 ** 9
+
+# Writes grouped into one transaction. The write lock is only held until the batch is committed, so a concurrent run
+# or a watcher can use the same index, and a crashed run keeps everything but its last batch.
+COMMIT_INTERVAL = 256
+
+
+def extract_index_path() -> str:
+    """
+    Extracts the default path of the scan index.
+
+    :return: Path of the scan index.
+    """
+    cache_directory = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_directory, 'mediarenamer', 'index.sqlite')
+
+
+class ScanIndex(object):
+    """
+    On disk index of directory listings and scan results keyed on the directory mtime and inode.
+
+    A directory whose mtime and inode match the indexed ones has the same entries as when it was indexed, so its
+    listing and parse results can be reused instead of reading the directory again. The mtime of a directory does not
+    change when something deeper in the tree changes, so sub directories are checked on their own.
+
+    Every row records the fingerprint of the rules it was scanned with. A row with another fingerprint is read again
+    and replaced, the rows of libraries with other rules are kept.
+    """
+
+    def __init__(self, path: Optional[str] = None, fingerprint: str = '', full_rescan: bool = False,
+                 fingerprints: Optional[Dict[str, str]] = None):
+        """
+        :param path: Path of the index database, the user cache directory is used if not given.
+        :param fingerprint: Fingerprint of the rules the scan results depend on, indexed scan results with a different
+            fingerprint are not used.
+        :param full_rescan: Ignore the indexed entries and index every directory again.
+        :param fingerprints: Fingerprints of library roots scanned with their own rules, keyed on the root directory.
+            They are used for the directories inside those roots instead of fingerprint.
+        """
+        self.path = path or extract_index_path()
+        self.full_rescan = full_rescan
+        self.fingerprint = fingerprint
+        self.fingerprints = dict((os.path.abspath(root), root_fingerprint)
+                                 for root, root_fingerprint in (fingerprints or {}).items())
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pending = 0
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            self._check_meta()
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS directories ('
+                'path TEXT PRIMARY KEY, mtime_ns INTEGER, inode INTEGER, indexed_ns INTEGER, '
+                'folders TEXT, files TEXT, scan TEXT, clean INTEGER DEFAULT 0, fingerprint TEXT)')
+        except sqlite3.Error as e:
+            raise FileException(str(e))
+
+    def __enter__(self) -> 'ScanIndex':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _check_meta(self):
+        meta = dict(self._connection.execute('SELECT key, value FROM meta').fetchall())
+        if meta.get('schema') != str(SCHEMA_VERSION):
+            self._connection.execute('DROP TABLE IF EXISTS directories')
+            self._connection.execute('DELETE FROM meta')
+            self._connection.execute('INSERT INTO meta (key, value) VALUES (?, ?)', ('schema', str(SCHEMA_VERSION)))
+
+    def _fingerprint(self, directory: str) -> str:
+        """
+        Returns the fingerprint of the rules a directory is scanned with.
+        """
+        if self.fingerprints:
+            path = os.path.abspath(directory)
+            while True:
+                if path in self.fingerprints:
+                    return self.fingerprints[path]
+                parent = os.path.dirname(path)
+                if parent == path:
+                    break
+                path = parent
+        return self.fingerprint
+
+    def _write(self, sql: str, parameters: tuple):
+        # Called with the lock held
+        try:
+            if not self._connection.in_transaction:
+                self._connection.execute('BEGIN')
+            self._connection.execute(sql, parameters)
+            self._pending += 1
+            if self._pending >= COMMIT_INTERVAL:
+                self._commit()
+        except sqlite3.Error as e:
+            raise FileException(str(e))
+
+    def _commit(self):
+        if self._connection.in_transaction:
+            self._connection.execute('COMMIT')
+        self._pending = 0
+
+    def commit(self):
+        """
+        Commits the pending writes, e.g. once a library entry is done.
+        """
+        with self._lock:
+            if self._connection is None:
+                return
+            try:
+                self._commit()
+            except sqlite3.Error as e:
+                raise FileException(str(e))
+
+    def close(self):
+        with self._lock:
+            if self._connection is None:
+                return
+            try:
+                self._commit()
+                self._connection.close()
+            except sqlite3.Error as e:
+                raise FileException(str(e))
+            finally:
+                self._connection = None
+
+    def _stat(self, directory: str) -> Optional[os.stat_result]:
+        try:
+            with METRICS.timed('stat'):
+                return os.stat(directory)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            raise FileException(str(e))
+
+    def _row(self, directory: str, stat: Optional[os.stat_result] = None) -> Optional[tuple]:
+        """
+        Returns the indexed row of a directory if it is still valid.
+        """
+        if self.full_rescan:
+            return None
+        if stat is None:
+            stat = self._stat(directory)
+            if stat is None:
+                return None
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT mtime_ns, inode, indexed_ns, folders, files, scan, clean, fingerprint FROM directories '
+                'WHERE path = ?', (directory,)).fetchone()
+        if row is None:
+            return None
+        mtime_ns, inode, indexed_ns, folders, files, scan, clean, fingerprint = row
+        if mtime_ns != stat.st_mtime_ns or inode != stat.st_ino or mtime_ns >= indexed_ns - RACY_WINDOW_NS:
+            return None
+        if fingerprint != self._fingerprint(directory):
+            return None
+        return folders, files, scan, clean
+
+    def _store(self, directory: str, stat: os.stat_result, folders: Optional[List[str]] = None,
+               files: Optional[List[str]] = None):
+        with self._lock:
+            self._write(
+                'INSERT OR REPLACE INTO directories '
+                '(path, mtime_ns, inode, indexed_ns, folders, files, scan, clean, fingerprint) '
+                'VALUES (?, ?, ?, ?, ?, ?, NULL, 0, ?)',
+                (directory, stat.st_mtime_ns, stat.st_ino, time.time_ns(),
+                 None if folders is None else json.dumps(folders), None if files is None else json.dumps(files),
+                 self._fingerprint(directory)))
+
+    def _update(self, directory: str, stat: os.stat_result, column: str, value):
+        # Only updates the row if it still describes the state the caller read, a directory changed in between keeps
+        # its stale row and is picked up again on the next run.
+        with self._lock:
+            self._write(f'UPDATE directories SET {column} = ? '
+                        f'WHERE path = ? AND mtime_ns = ? AND inode = ? AND fingerprint = ?',
+                        (value, directory, stat.st_mtime_ns, stat.st_ino, self._fingerprint(directory)))
+
+    def snapshot(self, directory: str) -> DirectorySnapshot:
+        """
+        Returns the snapshot of a directory, read from the index if the directory did not change.
+
+        :param directory: The directory.
+
+        :return: The directory snapshot.
+        """
+        stat = self._stat(directory)
+        if stat is not None:
+            row = self._row(directory, stat)
+            if row is not None and row[0] is not None and row[1] is not None:
+                self.hits += 1
+                return DirectorySnapshot(directory, files=json.loads(row[1]), folders=json.loads(row[0]))
+        self.misses += 1
+        snapshot = take_directory_snapshot(directory)
+        if stat is not None:
+            self._store(directory, stat, folders=[extract_file_basename(folder) for folder in snapshot.folders],
+                        files=[extract_file_basename(file) for file in snapshot.files])
+        return snapshot
+
+    def scan_results(self, directory: str) -> Optional[dict]:
+        """
+        Returns the indexed scan results of a directory if the directory did not change.
+
+        :param directory: The directory.
+
+        :return: The scan results or None.
+        """
+        row = self._row(directory)
+        if row is None or row[2] is None:
+            return None
+        return json.loads(row[2])
+
+    def store_scan_results(self, directory: str, stat: os.stat_result, scan_results: dict):
+        """
+        Stores the scan results of a directory.
+
+        :param directory: The directory.
+        :param stat: Stat result of the directory taken before it was scanned.
+        :param scan_results: The scan results.
+        """
+        self._update(directory, stat, 'scan', json.dumps(scan_results))
+
+    def is_clean(self, directory: str) -> bool:
+        """
+        Checks whether a directory and its sub folders are unchanged since the directory was marked clean.
+
+        :param directory: The directory.
+
+        :return: True if the directory does not need to be processed again.
+        """
+        row = self._row(directory)
+        if row is None or not row[3] or row[0] is None:
+            return False
+        for folder in json.loads(row[0]):
+            if self._row(os.path.join(directory, folder)) is None:
+                return False
+        self.hits += 1
+        return True
+
+    def mark_clean(self, directory: str, stat: os.stat_result):
+        """
+        Marks a directory as processed.
+
+        The sub folders of the directory need an indexed row as well, see ``snapshot`` and ``touch``.
+
+        :param directory: The directory.
+        :param stat: Stat result of the directory taken before it was read.
+        """
+        self._update(directory, stat, 'clean', 1)
+
+    def touch(self, directory: str):
+        """
+        Indexes the current state of a directory without reading its listing.
+
+        :param directory: The directory.
+        """
+        stat = self._stat(directory)
+        if stat is not None and self._row(directory, stat) is None:
+            self._store(directory, stat)
+
+    def stat(self, directory: str) -> Optional[os.stat_result]:
+        """
+        Stats a directory, to be passed to the store functions once the directory was read.
+
+        :param directory: The directory.
+
+        :return: The stat result or None if the directory does not exist.
+        """
+        return self._stat(directory)
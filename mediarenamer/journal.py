@@ -0,0 +1,385 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from .version import __version__
+from .exceptions import MediaRenamerException, FileException
+from .plan import MKDIR, MOVE, RENAME, DELETE, RenameOperation, apply_operation
+
+
+DEFAULT_SYNC_EVERY = 256
+
+RECORD_RUN = 'run'
+RECORD_PLAN = 'plan'
+RECORD_BEGIN = 'begin'
+RECORD_DONE = 'done'
+RECORD_FAILED = 'failed'
+RECORD_UNDONE = 'undone'
+
+
+def extract_journal_directory() -> str:
+    """
+    Extracts the directory journals are stored in.
+
+    :return: The journal directory.
+    """
+    state_directory = os.environ.get('XDG_STATE_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'state')
+    return os.path.join(state_directory, 'mediarenamer', 'journals')
+
+
+def extract_journal_prefix(root: str) -> str:
+    """
+    Extracts the file name prefix shared by all journals of a library root.
+
+    :param root: The library root.
+
+    :return: The journal file name prefix.
+    """
+    root = os.path.abspath(root)
+    digest = hashlib.sha1(root.encode('utf-8', 'surrogateescape')).hexdigest()[:8]
+    return f'{os.path.basename(root) or "root"}-{digest}-'
+
+
+def create_journal_path(root: str) -> str:
+    """
+    Creates a new, timestamped journal path for a library root.
+
+    :param root: The library root.
+
+    :return: Path of the new journal.
+    """
+    timestamp = time.strftime('%Y%m%dT%H%M%S')
+    return os.path.join(extract_journal_directory(), f'{extract_journal_prefix(root)}{timestamp}-{os.getpid()}.jsonl')
+
+
+def find_latest_journal(root: str) -> Optional[str]:
+    """
+    Finds the most recent journal of a library root.
+
+    :param root: The library root.
+
+    :return: Path of the latest journal or None.
+    """
+    journal_directory = extract_journal_directory()
+    prefix = extract_journal_prefix(root)
+    try:
+        journals = [name for name in os.listdir(journal_directory) if name.startswith(prefix) and name.endswith('.jsonl')]
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        raise FileException(str(e))
+    if not journals:
+        return None
+    return os.path.join(journal_directory, max(journals))
+
+
+def operation_to_record(operation: RenameOperation) -> dict:
+    return {'kind': operation.kind, 'source': operation.source, 'target': operation.target,
+            'is_directory': operation.is_directory}
+
+
+def operation_from_record(record: dict) -> RenameOperation:
+    return RenameOperation(record['kind'], record['source'], record.get('target'), record.get('is_directory', False))
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
+
+
+class RenameJournal(object):
+    """
+    Append-only JSON lines journal of the operations applied to a library.
+
+    The plan is written and synced before the first operation runs. Every operation then gets a ``begin`` record
+    before it is applied and a ``done`` or ``failed`` record afterwards. Records are flushed to the operating system
+    as they are written, so they survive the process being killed, and synced to disk in batches of ``sync_every``
+    records so a large run does not pay an fsync per rename.
+    """
+
+    def __init__(self, path: str, sync_every: int = DEFAULT_SYNC_EVERY):
+        """
+        :param path: Path of the journal file, appended to if it exists.
+        :param sync_every: Number of records written between two fsync calls.
+        """
+        self.path = path
+        self.sync_every = max(1, sync_every)
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        try:
+            journal_directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(journal_directory, exist_ok=True)
+            self._file = open(path, 'a', encoding='utf-8')
+            if self._file.tell() > 0 and not _ends_with_newline(path):
+                # Terminate a record torn by a crash so the next record starts on its own line
+                self._file.write('\n')
+        except Exception as e:
+            raise FileException(str(e))
+
+    def __enter__(self) -> 'RenameJournal':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _write(self, record: dict, sync: bool = False):
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with self._lock:
+            try:
+                self._file.write(line)
+                self._file.flush()
+                self._unsynced += 1
+                if sync or self._unsynced >= self.sync_every:
+                    os.fsync(self._file.fileno())
+                    self._unsynced = 0
+            except Exception as e:
+                raise FileException(str(e))
+
+    def sync(self):
+        """
+        Syncs all written records to disk.
+        """
+        with self._lock:
+            if self._unsynced and not self._file.closed:
+                try:
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                except Exception as e:
+                    raise FileException(str(e))
+                self._unsynced = 0
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.sync()
+        with self._lock:
+            self._file.close()
+
+    def record_plan(self, operations: Iterable[RenameOperation], root: Optional[str] = None,
+                    first_sequence: int = 0) -> int:
+        """
+        Writes the operations a run is about to apply.
+
+        :param operations: The operations in the order they are applied.
+        :param root: The library root of the run.
+        :param first_sequence: Sequence number of the first operation, for runs that record their plan in parts.
+
+        :return: Number of operations written.
+        """
+        self._write({'type': RECORD_RUN, 'root': root, 'started': time.time(), 'version': __version__})
+        count = 0
+        for sequence, operation in enumerate(operations, first_sequence):
+            record = operation_to_record(operation)
+            record['type'] = RECORD_PLAN
+            record['seq'] = sequence
+            self._write(record)
+            count += 1
+        self.sync()
+        return count
+
+    def begin(self, sequence: int, operation: RenameOperation):
+        self._write({'type': RECORD_BEGIN, 'seq': sequence})
+
+    def done(self, sequence: int):
+        self._write({'type': RECORD_DONE, 'seq': sequence})
+
+    def failed(self, sequence: int, error: str):
+        self._write({'type': RECORD_FAILED, 'seq': sequence, 'error': error})
+
+    def undone(self, sequence: int):
+        self._write({'type': RECORD_UNDONE, 'seq': sequence})
+
+
+def read_journal(path: str) -> Iterator[dict]:
+    """
+    Streams the records of a journal.
+
+    A torn last line, left behind by a crash in the middle of a write, is skipped.
+
+    :param path: Path of the journal file.
+
+    :return: Iterator of journal records.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    return
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+    except Exception as e:
+        raise FileException(str(e))
+
+
+def _read_journal_state(path: str) -> Tuple[set, set]:
+    done = set()
+    undone = set()
+    for record in read_journal(path):
+        record_type = record.get('type')
+        if record_type == RECORD_DONE:
+            done.add(record['seq'])
+        elif record_type == RECORD_UNDONE:
+            undone.add(record['seq'])
+    return done, undone
+
+
+def pending_operations(path: str) -> Iterator[Tuple[int, RenameOperation]]:
+    """
+    Streams the planned operations of a journal that were never completed.
+
+    :param path: Path of the journal file.
+
+    :return: Iterator of sequence number and operation pairs in plan order.
+    """
+    done, undone = _read_journal_state(path)
+    for record in read_journal(path):
+        if record.get('type') == RECORD_PLAN and record['seq'] not in done and record['seq'] not in undone:
+            yield record['seq'], operation_from_record(record)
+
+
+def completed_operations(path: str) -> List[Tuple[int, RenameOperation]]:
+    """
+    Lists the operations of a journal that were applied and not rolled back yet.
+
+    :param path: Path of the journal file.
+
+    :return: List of sequence number and operation pairs in plan order.
+    """
+    done, undone = _read_journal_state(path)
+    completed = done - undone
+    return [(record['seq'], operation_from_record(record)) for record in read_journal(path)
+            if record.get('type') == RECORD_PLAN and record['seq'] in completed]
+
+
+def is_operation_applied(operation: RenameOperation) -> bool:
+    """
+    Checks whether the effect of an operation is already visible on disk.
+
+    Used on resume for operations that have a ``begin`` record but no ``done`` record.
+
+    :param operation: The operation.
+
+    :return: True if the operation does not need to run again.
+    """
+    if operation.kind == MKDIR:
+        return os.path.isdir(operation.source)
+    elif operation.kind == DELETE:
+        return not os.path.lexists(operation.source)
+    return not os.path.lexists(operation.source) and os.path.lexists(operation.target)
+
+
+def invert_operation(operation: RenameOperation) -> Optional[RenameOperation]:
+    """
+    Builds the operation that undoes an operation.
+
+    :param operation: The operation to undo.
+
+    :return: The inverse operation, None if the operation can not be undone.
+    """
+    if operation.kind == MKDIR:
+        return RenameOperation(DELETE, operation.source, is_directory=True)
+    elif operation.kind in (MOVE, RENAME):
+        return RenameOperation(operation.kind, operation.target, operation.source, operation.is_directory)
+    return None
+
+
+def resume_journal(path: str, ignore_errors: bool = False, dry_run: bool = False,
+                   log: Optional[logging.Logger] = None) -> List[RenameOperation]:
+    """
+    Continues an interrupted run from its journal.
+
+    :param path: Path of the journal file.
+    :param ignore_errors: Keep applying the remaining operations when one fails.
+    :param dry_run: Print the remaining operations instead of applying them.
+    :param log: The logger.
+
+    :return: List of operations that failed.
+    """
+    if log is None:
+        log = logging.getLogger('media_log')
+
+    failed = []
+    resumed = 0
+    journal = None if dry_run else RenameJournal(path)
+    try:
+        for sequence, operation in pending_operations(path):
+            if dry_run:
+                print(operation.describe())
+                continue
+            if is_operation_applied(operation):
+                log.debug(f'Already applied: {operation.describe()}')
+                journal.done(sequence)
+                continue
+            journal.begin(sequence, operation)
+            try:
+                apply_operation(operation)
+            except FileException as e:
+                journal.failed(sequence, str(e))
+                if not ignore_errors:
+                    raise
+                log.error(f'Failed to apply: {operation.describe()}. Error: {e}')
+                failed.append(operation)
+                continue
+            journal.done(sequence)
+            resumed += 1
+    finally:
+        if journal:
+            journal.close()
+
+    log.info(f'Resumed {resumed} operations from journal: {path}')
+    return failed
+
+
+def rollback_journal(path: str, ignore_errors: bool = False, dry_run: bool = False,
+                     log: Optional[logging.Logger] = None) -> List[RenameOperation]:
+    """
+    Undoes the operations recorded in a journal, newest first.
+
+    Deleted files can not be restored and are reported instead.
+
+    :param path: Path of the journal file.
+    :param ignore_errors: Keep undoing the remaining operations when one fails.
+    :param dry_run: Print the inverse operations instead of applying them.
+    :param log: The logger.
+
+    :return: List of operations that could not be undone.
+    """
+    if log is None:
+        log = logging.getLogger('media_log')
+
+    failed = []
+    undone = 0
+    journal = None if dry_run else RenameJournal(path)
+    try:
+        for sequence, operation in reversed(completed_operations(path)):
+            inverse = invert_operation(operation)
+            if inverse is None:
+                log.warning(f'Cannot undo: {operation.describe()}')
+                failed.append(operation)
+                continue
+            if dry_run:
+                print(inverse.describe())
+                continue
+            try:
+                apply_operation(inverse)
+            except FileException as e:
+                if not ignore_errors:
+                    raise
+                log.error(f'Failed to undo: {operation.describe()}. Error: {e}')
+                failed.append(operation)
+                continue
+            journal.undone(sequence)
+            undone += 1
+    finally:
+        if journal:
+            journal.close()
+
+    log.info(f'Rolled back {undone} operations from journal: {path}')
+    return failed
@@ -3,400 +3,25 @@ from __future__ import print_function
 import os
 import sys
 import argparse
-import logging
-from typing import Optional, List
-
-try:
-    from .version import __version__
-    from .exceptions import MediaRenamerException, FileException, ParserException
-    from .media_log import media_log
-    from .file_utils import write_to_file, extract_current_directory_basename, extract_list_of_folders_in_directory, \
-        extract_list_of_files_in_directory, rename_file, rename_directory, extract_file_extension, delete_file, \
-        parse_files_in_directory_to_delete, scan_directory, extract_directory_basename, extract_file_basename, \
-        create_directory_for_movie_file, recursively_list_contents_in_directory
-    from .utils import extract_season_number_from_directory_name, extract_episode_number_from_file_name, \
-        extract_show_year_from_directory_name, extract_show_name_from_directory_basename, extract_movie_year_from_string
-    from .config import ALLOWED_FILE_EXTENSIONS
-except ImportError:
-    __version__ = 'development'
-    sys.path.append('./')
-    from media_log import media_log
-    from exceptions import MediaRenamerException, FileException, ParserException
-    from file_utils import write_to_file, extract_current_directory_basename, extract_list_of_folders_in_directory, \
-        extract_list_of_files_in_directory, rename_file, rename_directory, extract_file_extension, delete_file, \
-        parse_files_in_directory_to_delete, scan_directory, extract_directory_basename, extract_file_basename, \
-        create_directory_for_movie_file, recursively_list_contents_in_directory
-    from utils import extract_season_number_from_directory_name, extract_episode_number_from_file_name, \
-        extract_show_year_from_directory_name, extract_show_name_from_directory_basename, extract_movie_year_from_string
-    from config import ALLOWED_FILE_EXTENSIONS
-
-
-MEDIA_FILE_EXTENSIONS = [
-    'mp4',
-    'mkv'
-]
-
-BANNED_FILE_EXTENSIONS = [
-    'jpg'
-]
-
-
-def run(debug: bool = False, dry_run: bool = False, verbose: bool = False, ignore_errors: bool = False, output_file: str = None):
-    """
-
-    :param debug:
-    :param dry_run:
-    :param verbose:
-    :param ignore_errors:
-    :param output_file:
-
-    :return:
-    """
-    try:
-        if debug:
-            log = media_log(log_level='DEBUG')
-        else:
-            log = media_log(log_level='INFO')
-    except Exception as e:
-        raise MediaRenamerException(str(e))
-
-    log.info('Starting media renamer...')
-    log.debug(f'Debug mode: {debug}')
-    log.debug(f'Dry run: {dry_run}')
-    log.debug(f'Verbose mode: {verbose}')
-    log.debug(f'Ignore errors: {ignore_errors}')
-    if output_file:
-        log.debug(f'Writing output to file: {output_file}')
-
-    try:
-        """
-        Variables
-        
-        :var seasons:
-        :var episodes:
-        :var folders_to_rename:
-        :var files_to_rename:
-        :var files_to_delete:
-        :var unknown_files:
-        :var current_directory:
-        """
-        folders_to_rename = {}
-        files_to_rename = {}
-        files_to_delete = []
-        master_unknown_folders = []
-        master_unknown_files = []
-        errored_folders = []
-        errored_files = []
-
-        current_directory = os.getcwd()
-
-        if not current_directory:
-            log.error('Failed to get current directory. Exiting...')
-            exit(1)
-        log.info(f'Current directory: {current_directory}')
-
-        """
-        
-        """
-        directory_basename = extract_directory_basename(current_directory)
-        if not directory_basename:
-            log.error('Failed to extract directory basename. Exiting...')
-            exit(1)
-        if directory_basename == "Movie":
-            log.debug('Movie directory detected')
-        elif directory_basename == "TV":
-            log.debug('TV directory detected')
-        else:
-            log.error('Unknown media directory detected. Exiting...')
-            exit(1)
-        files = extract_list_of_files_in_directory(current_directory)
-        folders = extract_list_of_folders_in_directory(current_directory)
-
-        if directory_basename == 'Movie':
-            for file in files:
-                file_extension = extract_file_extension(file)
-                if file_extension:
-                    if file_extension == 'parts':
-                        continue
-                log.debug(f'Creating directory for file: {file}...')
-                new_directory = create_directory_for_movie_file(file)
-                if not new_directory:
-                    log.warning(f'Failed to create directory for file: {file}')
-                else:
-                    log.debug(f'Created directory for file: {file}. Directory: {new_directory}')
-                    folders.append(new_directory)
-
-            for folder in folders:
-                folder_basename = extract_directory_basename(folder)
-                if not folder_basename:
-                    log.warning(f'Failed to extract directory basename for folder: {folder}')
-                    continue
-                movie_year = extract_movie_year_from_string(folder_basename)
-                if not movie_year:
-                    log.warning(f'Failed to extract movie year for folder: {folder}')
-                    continue
-                movie_title = folder_basename.split(movie_year)[0]
-                if not movie_title:
-                    log.warning(f'Failed to extract movie title for folder: {folder}')
-                    continue
-                movie_title = movie_title.replace('(', ' ')
-                movie_title = movie_title.replace(')', ' ')
-                movie_title = movie_title.replace('.', ' ')
-                new_folder_name = f'{movie_title} ({movie_year})'
-                new_folder = os.path.join(current_directory, new_folder_name)
-                log.debug(f'Renaming directory: {folder} to {new_folder}...')
-                if not dry_run:
-                    if not rename_directory(folder, new_folder):
-                        log.warning(f'Failed to rename directory for folder: {folder}')
-                        continue
-                else:
-                    new_folder = folder
-
-                log.debug(f'Extracting files in directory: {new_folder}...')
-                files_in_directory = extract_list_of_files_in_directory(new_folder)
-                folders_in_directory = extract_list_of_folders_in_directory(new_folder)
-
-                if not files_in_directory:
-                    log.debug(f'No files in directory: {new_folder}')
-                else:
-                    for file in files_in_directory:
-                        file_extension = extract_file_extension(file)
-                        if not file_extension:
-                            log.warning(f'Failed to extract file extension for file: {file}')
-                            continue
-                        if file_extension in BANNED_FILE_EXTENSIONS:
-                            log.debug(f'Detected banned file extension for file: {file}')
-                            if not dry_run:
-                                delete_file(file)
-                        elif file_extension in MEDIA_FILE_EXTENSIONS:
-                            log.debug(f'Detected media file extension for file: {file}')
-                            folder_basename = extract_directory_basename(new_folder)
-                            new_file_name = f'{folder_basename}.{file_extension}'
-                            new_file = os.path.join(new_folder, new_file_name)
-                            log.debug(f'Renaming file: {file} to {new_file}...')
-                            if not dry_run:
-                                if not rename_file(file, new_file_name):
-                                    log.warning(f'Failed to rename file {file} to {new_file_name}')
-                                    continue
-                        else:
-                            log.warning(f'Failed to detect file type for file: {file}')
-
-                if not folders_in_directory:
-                    log.debug(f'No folders in directory: {new_folder}')
-                else:
-                    for folder in folders_in_directory:
-                        folder_basename = extract_directory_basename(folder)
-                        if not folder_basename:
-                            log.warning(f'Failed to extract folder basename for folder: {folder}')
-                            continue
-                        if folder_basename == 'Featurettes':
-                            log.debug(f'Detected featurettes folder in folder: {folder}')
-                            files_in_featurettes = extract_list_of_files_in_directory(folder)
-                            folders_in_featurettes = extract_list_of_folders_in_directory(folder)
-                            for file_in_featurettes in files_in_featurettes:
-                                file_extension = extract_file_extension(file_in_featurettes)
-                                if not file_extension:
-                                    log.warning(f'Failed to extract file extension for file: {file_in_featurettes}')
-                                    continue
-                                if file_extension in BANNED_FILE_EXTENSIONS:
-                                    log.debug(f'Detected banned file extension for file: {file_in_featurettes}')
-                                    if not dry_run:
-                                        delete_file(file_in_featurettes)
-                                elif file_extension in MEDIA_FILE_EXTENSIONS:
-                                    log.debug(f'Detected media file extension for file: {file_in_featurettes}')
-                                else:
-                                    log.warning(f'Failed to detect file type for file: {file_in_featurettes}')
-                        elif folder_basename == 'Subs':
-                            log.debug(f'Detected subs folder in folder: {folder}')
-                            files_in_subs = extract_list_of_files_in_directory(folder)
-                            folders_in_subs = extract_list_of_folders_in_directory(folder)
-                            for file_in_subs in files_in_subs:
-                                file_extension = extract_file_extension(file_in_subs)
-                                if not file_extension:
-                                    log.warning(f'Failed to extract file extension for file: {file_in_subs}')
-                                    continue
-                                elif file_extension == 'srt':
-                                    log.debug(f'Found subtitle file: {file_in_subs}')
-                                    continue
-                                else:
-                                    log.warning(f'Failed to detect file type for file: {file_in_subs}')
-
-        log.info('Complete!')
-
-    except Exception as e:
-        log.exception(MediaRenamerException(str(e)))
-
-
-def run_media_info(debug:bool = False, verbose:bool = False):
-    """
-    The run media info run type function.
-
-    :param debug: Is debug enabled.
-    :param verbose: Is verbose enabled.
-    """
-    try:
-        if debug:
-            log = media_log(log_level='DEBUG')
-        else:
-            log = media_log(log_level='INFO')
-    except Exception as e:
-        raise MediaRenamerException(str(e))
-
-    log.info('Getting media info for current directory...')
-    try:
-        seasons = {}
-        episodes = {}
-
-        current_directory = os.getcwd()
-
-        directory_basename = extract_current_directory_basename()
-        if not directory_basename:
-            log.error('Failed to get directory basename.')
-            return
-
-        show_year = extract_show_year_from_directory_name(directory_basename)
-        show_name = directory_basename.replace(show_year, '')
-        if not show_name:
-            log.error('Failed to get show name.')
-            return
-
-        folders_in_directory = extract_list_of_folders_in_directory(current_directory)
-        files_in_directory = extract_list_of_files_in_directory(current_directory)
-
-        if folders_in_directory:
-            log.info(f'Extracting season folders for show: {show_name}...')
-            for folder_in_directory in folders_in_directory:
-                season_number = extract_season_number_from_directory_name(folder_in_directory)
-                if season_number:
-                    seasons[folder_in_directory] = season_number
-            log.info(f'Extracted {len(seasons)} season folders for show: {show_name}')
-        else:
-            log.info(f'No season folders found for show: {show_name}')
-
-        if files_in_directory:
-            files_to_delete = parse_files_in_directory_to_delete(files_in_directory)
-
-        if files_in_directory:
-            log.info(f'Extracting episode files for show: {show_name}...')
-            for file_in_directory in files_in_directory:
-                episode_number = extract_episode_number_from_file_name(file_in_directory)
-                if episode_number:
-                    episodes[file_in_directory] = episode_number
-            log.info(f'Extracted {len(episodes)} episode files for show: {show_name}')
-        else:
-            log.info(f'No episode files found for show: {show_name}')
-
-    except Exception as e:
-        log.exception(MediaRenamerException(str(e)))
-
-
-def run_movie(debug: bool = False, dry_run: bool = False, verbose: bool = False, ignore_errors: bool = False, output_file: str = None):
-    if extract_current_directory_basename() != "Movie":
-        print("Not in movie directory. Exiting...")
-        exit(1)
-
-    try:
-        pass
-
-    except Exception as e:
-        print(e)
-        exit(1)
-
-
-def run_tv(debug: bool = False, dry_run: bool = False, verbose: bool = False, ignore_errors: bool = False, output_file: str = None):
-    pass
 
+if not __package__:
+    # Run as a script, import the package the way the console entry point does
+    sys.path[0] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    __package__ = 'mediarenamer'
 
-def test_run():
-    log = media_log(log_level='DEBUG')
+# Only the option defaults are imported up front, everything a run type needs is imported by main once the arguments
+# are parsed so printing the help or the version does not pay for the logging, regex, sqlite and pool setup
+from .version import __version__
+from .config import DEFAULT_JOBS, DEFAULT_JOBS_PER_DEVICE, DEFAULT_CONCURRENCY, DEFAULT_SETTLE_SECONDS
 
-    log.info('Starting media renamer in test mode...')
 
-    current_directory = os.getcwd()
-
-    results = {}
-
-    scanned_folders = extract_list_of_folders_in_directory(current_directory)
-
-    for folder in scanned_folders:
-        scanned = {}
-        scanned_folders = []
-        scanned_files = []
-        try:
-            for root, dirs, files in os.walk(current_directory):
-                # Get subdirectories
-                for d in dirs:
-                    folder_path = os.path.join(root, d)
-                    scanned_folders.append(folder_path)
-
-                # Get files
-                for f in files:
-                    file_path = os.path.join(root, f)
-                    scanned_files.append(file_path)
-
-        except Exception as e:
-            log.exception(str(e))
-            continue
-
-        scanned['folders'] = scanned_folders
-        scanned['files'] = scanned_files
-        results[folder] = scanned
-
-
-def test2():
-    log = media_log(log_level='DEBUG')
-    log.info('Starting media renamer in test mode...')
-    current_directory = os.getcwd()
-    current_basename = extract_current_directory_basename()
-    show_name = extract_show_name_from_directory_basename(current_basename)
-    log.info(f'Show: {show_name}')
-
-    scanned_folders = []
-    scanned_files = []
+def __getattr__(name: str):
+    # The run type functions used to live in this module, keep them importable from here
+    from . import commands
     try:
-        for root, dirs, files in os.walk(current_directory):
-            # Get subdirectories
-            for d in dirs:
-                folder_path = os.path.join(root, d)
-                scanned_folders.append(folder_path)
-
-            # Get files
-            for f in files:
-                file_path = os.path.join(root, f)
-                scanned_files.append(file_path)
-
-    except Exception as e:
-        log.exception(str(e))
-        exit(1)
-
-    for file in scanned_files:
-        log.debug(f'File: {file}')
-        file_extension = extract_file_extension(file)
-        if not file_extension:
-            log.warning(f'File extension not recognized: {file}')
-            continue
-        if file_extension not in ALLOWED_FILE_EXTENSIONS:
-            log.warning(f'File extension not allowed: {file}')
-            delete_file(file)
-            continue
-        file_season = extract_season_number_from_directory_name(file)
-        file_episode = extract_episode_number_from_file_name(file)
-        if not file_season or not file_episode:
-            log.warning(f'Couldnt extract season or episode number for file: {file}')
-            continue
-        else:
-            file_basename = extract_file_basename(file)
-            file_path = os.path.dirname(file)
-            episode_details = file_basename.split('-')[-1]
-            if episode_details:
-                new_file_basename = f'{show_name} S{file_season}E{file_episode} - {episode_details}'
-            else:
-                new_file_basename = f'{show_name} S{file_season}E{file_episode}.{file_extension}'
-
-            new_file = os.path.join(file_path, new_file_basename)
-            if not rename_file(file, new_file):
-                log.error(f'Rename failed for file: {file}')
-                continue
+        return getattr(commands, name)
+    except AttributeError:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}') from None
 
 
 def main():
@@ -406,6 +31,15 @@ def main():
     FILENAME_TO_WRITE = None
     DEBUG = False
     DRY_RUN = False
+    JOBS = DEFAULT_JOBS
+    JOURNAL = None
+    USE_JOURNAL = True
+    INDEX = None
+    USE_INDEX = True
+    FULL_RESCAN = False
+    STATS = False
+    STATS_JSON = None
+    ROOTS = []
 
     parser = argparse.ArgumentParser(description='A simple command line tool for media handling and processing for Plex library')
 
@@ -414,17 +48,56 @@ def main():
     general_group.add_argument('--version', action='store_true', help='Print program version and exit')
     general_group.add_argument('-U', '--update', action='store_true', help='Update this program to latest version. Make sure that you have sufficient permissions (run with sudo if needed)')
     general_group.add_argument('-i', '--ignore-errors', action='store_true', help='Dont exit the program on error and keep processing files')
-    general_group.add_argument('--output-file', help='File to save previous directory/file names and new names')
+    general_group.add_argument('--output-file', help='File to save previous directory/file names and new names as JSON lines, gzipped if it ends in .gz')
+    general_group.add_argument('--config', metavar='FILE', help='TOML config file with the library settings (default: .mediarenamer.toml in the library directory, then config.toml in the user config directory, looked up for every root)')
     general_group.add_argument('-d', '--debug', action='store_true', help='Enable debug mode')
 
     run_option_group = parser.add_argument_group('Run Options')
     run_option_group.add_argument('-r', '--run', action='store_true', help='Run the program')
-    run_option_group.add_argument('-m', '--media-info', action='store_true', help='Show media info generated for current directory')
+    run_option_group.add_argument('-m', '--media-info', action='store_true', help='Show media info generated for current directory, with the resolution, duration, codec and audio languages read from the header of every mkv and mp4 file')
+    run_option_group.add_argument('--gaps', action='store_true', help='Report missing seasons and missing, duplicate and out of range episodes of every show in the current TV library or the given roots, --output-file writes one JSON line per show')
+    run_option_group.add_argument('--find-duplicates', action='store_true', help='Report media files with identical content in the current directory or the given roots')
     run_option_group.add_argument('-t', '--test', action='store_true', help='Run tests')
+    run_option_group.add_argument('-c', '--concurrency', type=int, help=f'Number of independent rename and delete operations applied at the same time, useful on high latency network shares (default: {DEFAULT_CONCURRENCY} or the config file)')
+    run_option_group.add_argument('--parse-workers', type=int, metavar='N', help='Number of processes file names are parsed on, 1 disables the process pool (default: one per CPU for directories of 20000+ entries)')
+    run_option_group.add_argument('--path', metavar='PATH', help='Rename a single movie file or folder inside a Movie library without scanning the rest of it, for download client post-processing hooks')
+    run_option_group.add_argument('--root', action='append', metavar='PATH', help='Movie or TV library to run on instead of the current directory, can be given more than once')
+    run_option_group.add_argument('--roots-file', metavar='FILE', help='File listing Movie or TV libraries to run on, one path per line')
+    run_option_group.add_argument('--jobs-per-device', type=int, help=f'Number of libraries on the same disk processed in parallel (default: {DEFAULT_JOBS_PER_DEVICE} or the config file)')
+    run_option_group.add_argument('-w', '--watch', action='store_true', help='Keep running and rename new downloads in the current directory as they land')
     run_option_group.add_argument('--dry-run', action='store_true', help='Run program like normal but dont alter any directories or files')
+    run_option_group.add_argument('--verify', action='store_true', help='Check the container framing of every mkv and mp4 file before renaming and leave truncated files alone')
+    run_option_group.add_argument('--quarantine', metavar='DIR', help='Move truncated mkv and mp4 files into this directory before renaming, implies --verify. Must be outside the library and on the same filesystem')
+    run_option_group.add_argument('-j', '--jobs', type=int, help=f'Number of folders to scan and rename in parallel (default: {DEFAULT_JOBS} or the config file)')
+    run_option_group.add_argument('--stats', action='store_true', help='Print phase timings, operation counters and filesystem call latencies at the end of the run')
+    run_option_group.add_argument('--stats-json', metavar='FILE', help='Write phase timings, operation counters and filesystem call latencies to a JSON file')
+
+    watch_group = parser.add_argument_group('Watch Options')
+    watch_group.add_argument('--settle', type=float, default=DEFAULT_SETTLE_SECONDS, metavar='SECONDS', help='Seconds a new download has to stop changing before it is renamed (default: %(default)s)')
+    watch_group.add_argument('--poll-interval', type=float, metavar='SECONDS', help='Poll the directory at this interval instead of using inotify')
+
+    index_group = parser.add_argument_group('Index Options')
+    index_group.add_argument('--index', help='Scan index file used to skip unchanged folders (default: index in the user cache directory)')
+    index_group.add_argument('--no-index', action='store_true', help='Dont read or update the scan index')
+    index_group.add_argument('--full-rescan', action='store_true', help='Ignore the scan index and probe cache and read every directory and file again')
+
+    titles_group = parser.add_argument_group('Title Options')
+    titles_group.add_argument('--titles', nargs='?', const='', metavar='INDEX', help='Match parsed movie and show names to their canonical title and year in an offline title index (default: index in the user cache directory)')
+    titles_group.add_argument('--build-title-index', metavar='TSV', help='Build the title index from a local IMDb title.basics.tsv dump, gzipped or not, into --titles or the user cache directory')
+
+    journal_group = parser.add_argument_group('Journal Options')
+    journal_group.add_argument('--journal', help='Journal file to record applied operations in (default: a new journal in the user state directory)')
+    journal_group.add_argument('--no-journal', action='store_true', help='Dont record applied operations in a journal')
+    journal_group.add_argument('--resume', nargs='?', const='', metavar='JOURNAL', help='Continue an interrupted run from its journal (default: latest journal of the current directory)')
+    journal_group.add_argument('--rollback', metavar='JOURNAL', help='Undo the operations recorded in a journal')
 
     args = parser.parse_args()
 
+    if (args.root or args.roots_file) and not (args.run or args.find_duplicates or args.gaps):
+        parser.error('--root and --roots-file need --run, --find-duplicates or --gaps')
+    if (args.verify or args.quarantine) and not (args.run or args.path or args.watch):
+        parser.error('--verify and --quarantine need --run, --path or --watch')
+
     if args.verbose:
         VERBOSE = True
     if args.ignore_errors:
@@ -436,20 +109,144 @@ def main():
         DEBUG = True
     if args.dry_run:
         DRY_RUN = True
-
-
-    if args.run:
+    if args.journal:
+        JOURNAL = args.journal
+    if args.no_journal:
+        USE_JOURNAL = False
+    if args.index:
+        INDEX = args.index
+    if args.no_index:
+        USE_INDEX = False
+    if args.full_rescan:
+        FULL_RESCAN = True
+    if args.root:
+        ROOTS.extend(args.root)
+    if args.roots_file:
+        from .exceptions import FileException
+        from .file_utils import read_roots_file
+        try:
+            ROOTS.extend(read_roots_file(args.roots_file))
+        except FileException as e:
+            parser.error(f'Failed to read roots file: {e}')
+    if args.run or args.path or args.watch or args.find_duplicates or args.gaps:
+        from .exceptions import MediaRenamerException
+        from .settings import apply_config, extract_user_config_path, find_config_path, load_config
+        config_path = args.config
+        if not config_path and ROOTS:
+            # Every root reads its own library config file when it is run, the user one only sets the defaults
+            user_config_path = extract_user_config_path()
+            config_path = user_config_path if os.path.isfile(user_config_path) else None
+        elif not config_path:
+            library = os.getcwd()
+            if args.path:
+                from .file_utils import extract_library_entry_for_path
+                library_entry = extract_library_entry_for_path(args.path, 'Movie')
+                library = library_entry[0] if library_entry else os.path.dirname(os.path.abspath(args.path))
+            config_path = find_config_path(library)
+        if config_path:
+            try:
+                config = load_config(config_path)
+            except MediaRenamerException as e:
+                parser.error(f'Failed to read config file: {e}')
+            apply_config(config)
+            for option in ('jobs', 'jobs_per_device', 'concurrency', 'parse_workers'):
+                if getattr(args, option) is None:
+                    setattr(args, option, getattr(config, option))
+            if (args.run or args.find_duplicates or args.gaps) and not ROOTS and not args.path:
+                ROOTS.extend(config.roots)
+    if args.jobs is None:
+        args.jobs = DEFAULT_JOBS
+    if args.jobs_per_device is None:
+        args.jobs_per_device = DEFAULT_JOBS_PER_DEVICE
+    if args.concurrency is None:
+        args.concurrency = DEFAULT_CONCURRENCY
+    if args.jobs < 1:
+        parser.error('--jobs must be at least 1')
+    JOBS = args.jobs
+    if args.concurrency < 1:
+        parser.error('--concurrency must be at least 1')
+    if args.parse_workers is not None and args.parse_workers < 1:
+        parser.error('--parse-workers must be at least 1')
+    if args.jobs_per_device < 1:
+        parser.error('--jobs-per-device must be at least 1')
+    if args.path and (ROOTS or JOURNAL):
+        parser.error('--path can not be used with --root, --roots-file or --journal')
+    if ROOTS and JOURNAL:
+        parser.error('--journal can not be used with --root or --roots-file, every library gets its own journal')
+    if args.stats:
+        STATS = True
+    if args.stats_json:
+        STATS_JSON = args.stats_json
+    if args.titles is not None and (args.run or args.path or args.watch or args.gaps):
+        from .exceptions import MediaRenamerException
+        from .titles import TitleIndex, set_title_index
+        try:
+            set_title_index(TitleIndex(args.titles or None))
+        except MediaRenamerException as e:
+            parser.error(f'Failed to open title index: {e}, build it with --build-title-index')
+
+
+    if args.path:
+        from .commands import run_path
+        run_path(args.path, DEBUG, DRY_RUN, IGNORE_ERRORS, FILENAME_TO_WRITE, use_journal=USE_JOURNAL, stats=STATS,
+                 stats_json=STATS_JSON, concurrency=args.concurrency, verify=args.verify, quarantine=args.quarantine)
+
+    elif args.run and ROOTS:
+        from .commands import run_roots
+        run_roots(ROOTS, DEBUG, DRY_RUN, VERBOSE, IGNORE_ERRORS, FILENAME_TO_WRITE, jobs=JOBS,
+                  jobs_per_device=args.jobs_per_device, use_journal=USE_JOURNAL, index_path=INDEX,
+                  use_index=USE_INDEX, full_rescan=FULL_RESCAN, stats=STATS, stats_json=STATS_JSON,
+                  parse_workers=args.parse_workers, concurrency=args.concurrency, verify=args.verify,
+                  quarantine=args.quarantine, config_path=args.config)
+
+    elif args.run:
+        from .commands import run
         if WRITE_TO_FILE:
-            run(DEBUG, DRY_RUN, VERBOSE, IGNORE_ERRORS, FILENAME_TO_WRITE)
+            run(DEBUG, DRY_RUN, VERBOSE, IGNORE_ERRORS, FILENAME_TO_WRITE, jobs=JOBS, journal_path=JOURNAL,
+                use_journal=USE_JOURNAL, index_path=INDEX, use_index=USE_INDEX, full_rescan=FULL_RESCAN, stats=STATS,
+                stats_json=STATS_JSON, parse_workers=args.parse_workers, concurrency=args.concurrency,
+                verify=args.verify, quarantine=args.quarantine)
         else:
-            run(DEBUG, DRY_RUN, VERBOSE, IGNORE_ERRORS)
+            run(DEBUG, DRY_RUN, VERBOSE, IGNORE_ERRORS, jobs=JOBS, journal_path=JOURNAL, use_journal=USE_JOURNAL,
+                index_path=INDEX, use_index=USE_INDEX, full_rescan=FULL_RESCAN, stats=STATS, stats_json=STATS_JSON,
+                parse_workers=args.parse_workers, concurrency=args.concurrency, verify=args.verify,
+                quarantine=args.quarantine)
+
+    elif args.watch:
+        from .commands import run_watch
+        run_watch(DEBUG, DRY_RUN, IGNORE_ERRORS, JOBS, use_journal=USE_JOURNAL, settle=args.settle,
+                  poll_interval=args.poll_interval, concurrency=args.concurrency, verify=args.verify,
+                  quarantine=args.quarantine)
+
+    elif args.resume is not None:
+        from .commands import run_resume
+        run_resume(DEBUG, DRY_RUN, IGNORE_ERRORS, args.resume or JOURNAL)
+
+    elif args.rollback:
+        from .commands import run_rollback
+        run_rollback(DEBUG, DRY_RUN, IGNORE_ERRORS, args.rollback)
+
+    elif args.build_title_index:
+        from .commands import run_build_title_index
+        run_build_title_index(DEBUG, args.build_title_index, args.titles or None)
+
+    elif args.find_duplicates:
+        from .commands import run_find_duplicates
+        run_find_duplicates(DEBUG, JOBS, FILENAME_TO_WRITE, ROOTS)
+
+    elif args.gaps:
+        from .commands import run_gaps
+        run_gaps(DEBUG, FILENAME_TO_WRITE, ROOTS, index_path=INDEX, use_index=USE_INDEX, full_rescan=FULL_RESCAN,
+                 parse_workers=args.parse_workers, verbose=VERBOSE)
 
     elif args.media_info:
-        run_media_info(DEBUG, VERBOSE)
+        from .commands import run_media_info
+        run_media_info(DEBUG, VERBOSE, JOBS, full_rescan=FULL_RESCAN)
 
     elif args.test:
-        #test_run()
-        test2()
+        from .commands import test2
+        #test_run(JOBS)
+        test2(JOBS)
 
     elif args.version:
         if __version__ == 'development':
@@ -0,0 +1,174 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+
+# Upper bounds of the latency histogram buckets in microseconds, the last bucket is open ended
+HISTOGRAM_BOUNDS_US = [2 ** exponent for exponent in range(0, 25)]
+
+
+class Histogram(object):
+    """
+    Latency histogram with power of two microsecond buckets.
+    """
+
+    __slots__ = ('count', 'total_ns', 'min_ns', 'max_ns', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = 0
+        self.buckets = [0] * (len(HISTOGRAM_BOUNDS_US) + 1)
+
+    def observe(self, elapsed_ns: int):
+        self.count += 1
+        self.total_ns += elapsed_ns
+        if self.min_ns is None or elapsed_ns < self.min_ns:
+            self.min_ns = elapsed_ns
+        if elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+        # Bucket index is the bit length of the latency in microseconds, values above the last bound overflow
+        self.buckets[min((elapsed_ns // 1000).bit_length(), len(HISTOGRAM_BOUNDS_US))] += 1
+
+    def percentile(self, percent: float) -> float:
+        """
+        Returns the upper bound of the bucket holding a percentile, in seconds.
+
+        :param percent: The percentile, between 0 and 100.
+
+        :return: Latency in seconds.
+        """
+        if not self.count:
+            return 0.0
+        rank = self.count * percent / 100.0
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= rank:
+                if index >= len(HISTOGRAM_BOUNDS_US):
+                    return self.max_ns / 1e9
+                return min(HISTOGRAM_BOUNDS_US[index] / 1e6, self.max_ns / 1e9)
+        return self.max_ns / 1e9
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'total': self.total_ns / 1e9,
+            'mean': self.total_ns / self.count / 1e9 if self.count else 0.0,
+            'min': (self.min_ns or 0) / 1e9,
+            'max': self.max_ns / 1e9,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'buckets_us': {str(bound): count for bound, count in zip(HISTOGRAM_BOUNDS_US + ['inf'], self.buckets)
+                           if count},
+        }
+
+
+class Metrics(object):
+    """
+    Process wide phase timers, operation counters and filesystem call latency histograms.
+
+    Recording is thread safe so the library walker threads can share one registry.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.phases = {}
+            self.counters = {}
+            self.histograms = {}
+            self._started = time.perf_counter_ns()
+
+    def count(self, name: str, value: int = 1):
+        """
+        Increments an operation counter.
+
+        :param name: The counter name.
+        :param value: The increment.
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, elapsed_ns: int):
+        """
+        Records the latency of a call.
+
+        :param name: The call name.
+        :param elapsed_ns: The latency in nanoseconds.
+        """
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(elapsed_ns)
+            self.counters['syscalls'] = self.counters.get('syscalls', 0) + 1
+
+    @contextmanager
+    def timed(self, name: str) -> Iterator[None]:
+        """
+        Times a filesystem call into its latency histogram.
+
+        :param name: The call name.
+        """
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter_ns() - start)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Times a phase of a run, phases entered more than once are summed.
+
+        :param name: The phase name.
+        """
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            elapsed_ns = time.perf_counter_ns() - start
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0) + elapsed_ns
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                'elapsed': (time.perf_counter_ns() - self._started) / 1e9,
+                'phases': {name: elapsed_ns / 1e9 for name, elapsed_ns in self.phases.items()},
+                'counters': dict(sorted(self.counters.items())),
+                'calls': {name: histogram.to_dict() for name, histogram in sorted(self.histograms.items())},
+            }
+
+    def summary_table(self) -> str:
+        """
+        Formats the recorded metrics as a plain text table.
+
+        :return: The summary table.
+        """
+        document = self.to_dict()
+        lines = [f'{"phase":<16} {"seconds":>10}']
+        for name, seconds in document['phases'].items():
+            lines.append(f'{name:<16} {seconds:>10.3f}')
+        lines.append(f'{"total":<16} {document["elapsed"]:>10.3f}')
+        lines.append('')
+        lines.append(f'{"counter":<16} {"value":>10}')
+        for name, value in document['counters'].items():
+            lines.append(f'{name:<16} {value:>10}')
+        if document['calls']:
+            lines.append('')
+            lines.append(f'{"call":<16} {"count":>10} {"total s":>10} {"mean ms":>10} {"p50 ms":>10} {"p99 ms":>10} '
+                         f'{"max ms":>10}')
+            for name, call in document['calls'].items():
+                lines.append(f'{name:<16} {call["count"]:>10} {call["total"]:>10.3f} {call["mean"] * 1000:>10.3f} '
+                             f'{call["p50"] * 1000:>10.3f} {call["p99"] * 1000:>10.3f} {call["max"] * 1000:>10.3f}')
+        return '\n'.join(lines)
+
+
+METRICS = Metrics()
@@ -0,0 +1,248 @@
+from string import Formatter
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from .exceptions import ParserException
+
+
+# Fields a template can use, seasons and episodes are numbers and everything else is text
+TEXT_FIELDS = frozenset(['title', 'year', 'show', 'ext'])
+NUMBER_FIELDS = frozenset(['season', 'episode'])
+FIELDS = TEXT_FIELDS | NUMBER_FIELDS
+
+PATH_SEPARATOR = '/'
+OPTIONAL_START = '['
+OPTIONAL_END = ']'
+
+# Built in templates following the Plex naming guides. A movie gets a folder and a media file named after it, an
+# episode is renamed inside its season folder and keeps its title when the file name has one.
+PLEX_TEMPLATES = {
+    'movie': '{title} ({year})/{title} ({year}).{ext}',
+    'episode': '{show} - S{season:02d}E{episode:02d}[ - {title}].{ext}',
+}
+
+# Number of path components the planners use from each template
+TEMPLATE_DEPTHS = {
+    'movie': 2,
+    'episode': 1,
+}
+
+# Characters that are not allowed in file names on one of the platforms a Plex library is shared with. Everything is
+# replaced in a single str.translate pass, runs of whitespace left behind are collapsed afterwards.
+FILE_NAME_TABLE = str.maketrans({
+    **{chr(code): ' ' for code in range(32)},
+    '/': '-',
+    '\\': '-',
+    ':': ' -',
+    '*': None,
+    '?': None,
+    '"': "'",
+    '<': None,
+    '>': None,
+    '|': '-',
+})
+# Separators left over from release names, turned into spaces along with the file name cleanup
+TITLE_TABLE = str.maketrans({
+    **FILE_NAME_TABLE,
+    ord('.'): ' ',
+    ord('('): ' ',
+    ord(')'): ' ',
+})
+
+
+def sanitize_name(name: str, table: dict = FILE_NAME_TABLE) -> str:
+    """
+    Makes a text usable as a file name.
+
+    :param name: The text.
+    :param table: Translate table, FILE_NAME_TABLE only removes characters no file name can contain.
+
+    :return: The text without invalid characters and runs of whitespace.
+    """
+    return ' '.join(name.translate(table).split())
+
+
+def clean_title(title: str) -> str:
+    """
+    Cleans up a title taken from a release name, separators become spaces.
+
+    :param title: The title, e.g. ``The.Matrix.(``.
+
+    :return: The clean title, e.g. ``The Matrix``.
+    """
+    return sanitize_name(title, TITLE_TABLE)
+
+
+def _split_optional(component: str, template: str) -> List[Tuple[str, bool]]:
+    groups = []
+    literal = []
+    optional = False
+    index = 0
+    while index < len(component):
+        character = component[index]
+        if character in (OPTIONAL_START, OPTIONAL_END) and component[index + 1:index + 2] == character:
+            literal.append(character)
+            index += 2
+            continue
+        if character == OPTIONAL_START:
+            if optional:
+                raise ParserException(f'Invalid template: {template!r}, optional groups can not be nested')
+            groups.append((''.join(literal), False))
+            literal, optional = [], True
+        elif character == OPTIONAL_END:
+            if not optional:
+                raise ParserException(f'Invalid template: {template!r}, unmatched {OPTIONAL_END}')
+            groups.append((''.join(literal), True))
+            literal, optional = [], False
+        else:
+            literal.append(character)
+        index += 1
+    if optional:
+        raise ParserException(f'Invalid template: {template!r}, unmatched {OPTIONAL_START}')
+    groups.append((''.join(literal), False))
+    return [(text, group_optional) for text, group_optional in groups if text]
+
+
+def _compile_group(text: str, template: str) -> Tuple[str, Tuple[str, ...]]:
+    fields = []
+    try:
+        parsed = list(Formatter().parse(text))
+    except ValueError as e:
+        raise ParserException(f'Invalid template: {template!r}, {e}')
+    for _, field, _, conversion in parsed:
+        if field is None:
+            continue
+        if field not in FIELDS:
+            raise ParserException(f'Invalid template: {template!r}, unknown field {field!r}')
+        if conversion:
+            raise ParserException(f'Invalid template: {template!r}, conversions are not supported')
+        fields.append(field)
+    return text, tuple(fields)
+
+
+class NameTemplate(object):
+    """
+    A naming template compiled once into plain format strings.
+
+    Templates use ``str.format`` fields, e.g. ``{title} ({year})/{title} ({year}).{ext}``. A ``/`` separates a
+    folder from the name inside it and a ``[...]`` group is left out when one of its fields is empty, ``[[`` and
+    ``]]`` are literal brackets. Text fields are sanitized before they are formatted, the literal parts of the
+    template are used as they are.
+    """
+
+    __slots__ = ('template', 'fields', '_components')
+
+    def __init__(self, template: str):
+        """
+        :param template: The template.
+        """
+        if not isinstance(template, str) or not template:
+            raise ParserException(f'Invalid template: {template!r}')
+        self.template = template
+        components = []
+        fields = set()
+        for component in template.split(PATH_SEPARATOR):
+            groups = []
+            for text, optional in _split_optional(component, template):
+                format_string, group_fields = _compile_group(text, template)
+                groups.append((format_string, group_fields if optional else None))
+                fields.update(group_fields)
+            if not groups:
+                raise ParserException(f'Invalid template: {template!r}, empty path component')
+            components.append(tuple(groups))
+        self._components = tuple(components)
+        self.fields = frozenset(fields)
+        try:
+            self.render(title='Title', year='2000', show='Show', season=1, episode=1, ext='mkv')
+        except Exception as e:
+            raise ParserException(f'Invalid template: {template!r}, {e!r}')
+
+    def __repr__(self) -> str:
+        return f'NameTemplate({self.template!r})'
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, NameTemplate):
+            return NotImplemented
+        return self.template == other.template
+
+    def __hash__(self) -> int:
+        return hash(self.template)
+
+    def __reduce__(self):
+        return NameTemplate, (self.template,)
+
+    @property
+    def depth(self) -> int:
+        """
+        Number of path components a rendered name has.
+        """
+        return len(self._components)
+
+    def _values(self, fields: Mapping) -> Dict[str, object]:
+        values = {}
+        for field in self.fields:
+            value = fields.get(field)
+            if field in TEXT_FIELDS:
+                value = sanitize_name(str(value)) if value else ''
+            values[field] = value
+        return values
+
+    def _render(self, values: Dict[str, object]) -> List[str]:
+        components = []
+        for groups in self._components:
+            parts = []
+            for format_string, optional_fields in groups:
+                if optional_fields is not None and not all(values[field] for field in optional_fields):
+                    continue
+                parts.append(format_string.format_map(values))
+            components.append(''.join(parts))
+        return components
+
+    def render_parts(self, **fields) -> List[str]:
+        """
+        Renders the template into its path components.
+
+        :param fields: The field values, fields that are not given are empty.
+
+        :return: List of path components, e.g. the folder and the file name.
+        """
+        return self._render(self._values(fields))
+
+    def render(self, **fields) -> str:
+        """
+        Renders the template.
+
+        :param fields: The field values, fields that are not given are empty.
+
+        :return: The name, path components joined with ``/``.
+        """
+        return PATH_SEPARATOR.join(self.render_parts(**fields))
+
+    def render_many(self, records: Iterable[Mapping]) -> List[List[str]]:
+        """
+        Renders the template for a batch of records.
+
+        :param records: Field values of every record.
+
+        :return: List of path components of every record, in the order of the records.
+        """
+        values = self._values
+        render = self._render
+        return [render(values(record)) for record in records]
+
+
+def compile_templates(templates: Mapping[str, str], depths: Optional[Mapping[str, int]] = None) \
+        -> Dict[str, NameTemplate]:
+    """
+    Compiles a set of named templates.
+
+    :param templates: Dictionary of template name to template.
+    :param depths: Number of path components each named template must have.
+
+    :return: Dictionary of template name to compiled template.
+    """
+    compiled = {}
+    for name, template in templates.items():
+        compiled[name] = NameTemplate(template)
+        if depths and name in depths and compiled[name].depth != depths[name]:
+            raise ParserException(f'Invalid template: {name} {template!r} must have {depths[name]} path components')
+    return compiled
@@ -0,0 +1,317 @@
+import os
+import sys
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+from .config import DEFAULT_CONCURRENCY
+from .exceptions import MediaRenamerException, FileException
+from .file_utils import create_directory, rename_file, rename_directory, delete_file, delete_directory
+
+
+MKDIR = 'mkdir'
+MOVE = 'move'
+RENAME = 'rename'
+DELETE = 'delete'
+
+OPERATION_KINDS = (MKDIR, MOVE, RENAME, DELETE)
+
+
+class RenameOperation(object):
+    """
+    A single filesystem operation of a rename plan.
+
+    Paths are expressed against the state of the library right before the operation runs, so the operations of a
+    plan have to be applied in plan order.
+    """
+
+    __slots__ = ('kind', 'source', 'target', 'is_directory')
+
+    def __init__(self, kind: str, source: str, target: Optional[str] = None, is_directory: bool = False):
+        """
+        :param kind: One of mkdir, move, rename or delete.
+        :param source: The path the operation reads, the created directory for mkdir.
+        :param target: The path the operation writes, None for mkdir and delete.
+        :param is_directory: Is the source a directory.
+        """
+        if kind not in OPERATION_KINDS:
+            raise MediaRenamerException(f'Unknown operation kind: {kind}')
+        if kind in (MOVE, RENAME) and not target:
+            raise MediaRenamerException(f'Operation {kind} needs a target path')
+        self.kind = kind
+        self.source = source
+        self.target = target
+        self.is_directory = is_directory or kind == MKDIR
+
+    def __repr__(self) -> str:
+        return f'RenameOperation({self.kind!r}, {self.source!r}, {self.target!r}, is_directory={self.is_directory!r})'
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, RenameOperation):
+            return NotImplemented
+        return (self.kind, self.source, self.target, self.is_directory) == \
+            (other.kind, other.source, other.target, other.is_directory)
+
+    def __hash__(self) -> int:
+        return hash((self.kind, self.source, self.target, self.is_directory))
+
+    def describe(self) -> str:
+        """
+        Returns a human readable description of the operation.
+
+        :return: The description.
+        """
+        if self.target:
+            return f'{self.kind.upper():<6} {self.source} -> {self.target}'
+        return f'{self.kind.upper():<6} {self.source}'
+
+
+class RenamePlan(object):
+    """
+    Ordered list of operations built by a planning pass before anything on disk is touched.
+    """
+
+    def __init__(self, operations: Optional[Iterable[RenameOperation]] = None):
+        self.operations = list(operations) if operations else []
+
+    def __repr__(self) -> str:
+        return f'RenamePlan({len(self.operations)} operations)'
+
+    def __iter__(self) -> Iterator[RenameOperation]:
+        return iter(self.operations)
+
+    def __len__(self) -> int:
+        return len(self.operations)
+
+    def __bool__(self) -> bool:
+        return bool(self.operations)
+
+    def add(self, operation: RenameOperation) -> RenameOperation:
+        self.operations.append(operation)
+        return operation
+
+    def extend(self, operations: Iterable[RenameOperation]):
+        self.operations.extend(operations)
+
+    def mkdir(self, directory: str) -> RenameOperation:
+        return self.add(RenameOperation(MKDIR, directory))
+
+    def move(self, source: str, target: str, is_directory: bool = False) -> RenameOperation:
+        return self.add(RenameOperation(MOVE, source, target, is_directory))
+
+    def rename(self, source: str, target: str, is_directory: bool = False) -> RenameOperation:
+        return self.add(RenameOperation(RENAME, source, target, is_directory))
+
+    def delete(self, file_name: str) -> RenameOperation:
+        return self.add(RenameOperation(DELETE, file_name))
+
+    def counts(self) -> dict:
+        """
+        Counts the operations of the plan by kind.
+
+        :return: Dictionary of operation kind to count.
+        """
+        counts = dict.fromkeys(OPERATION_KINDS, 0)
+        for operation in self.operations:
+            counts[operation.kind] += 1
+        return counts
+
+    def batched(self) -> List[RenameOperation]:
+        """
+        Returns the operations in the order the applier runs them.
+
+        Deletes are batched at the end of the plan. Their paths are already expressed against the final layout and
+        no later operation depends on them, so nothing is removed before every rename succeeded.
+
+        :return: Ordered list of operations.
+        """
+        operations = [operation for operation in self.operations if operation.kind != DELETE]
+        operations.extend(operation for operation in self.operations if operation.kind == DELETE)
+        return operations
+
+
+def apply_operation(operation: RenameOperation) -> bool:
+    """
+    Applies a single operation to disk.
+
+    :param operation: The operation.
+
+    :return: True if the operation was applied.
+    """
+    if operation.kind == MKDIR:
+        return create_directory(operation.source)
+    elif operation.kind == DELETE:
+        if operation.is_directory:
+            return delete_directory(operation.source)
+        return delete_file(operation.source)
+    elif operation.is_directory:
+        return rename_directory(operation.source, operation.target)
+    else:
+        return rename_file(operation.source, operation.target)
+
+
+def _path_ancestors(path: str) -> Iterator[str]:
+    path = os.path.normpath(path)
+    while True:
+        yield path
+        parent = os.path.dirname(path)
+        if parent == path:
+            return
+        path = parent
+
+
+def build_dependencies(operations: List[RenameOperation]) -> List[Set[int]]:
+    """
+    Finds the operations every operation of a plan has to wait for.
+
+    An operation depends on every earlier operation whose source or target is the same path as, an ancestor of or
+    a descendant of its own source or target. A file rename inside a renamed directory therefore waits for the
+    directory rename and a move into a new directory waits for its mkdir, while operations on unrelated paths do
+    not depend on each other.
+
+    :param operations: The operations in plan order.
+
+    :return: List of the indexes of the operations each operation depends on.
+    """
+    touched = {}  # type: Dict[str, List[int]]
+    below = {}  # type: Dict[str, List[int]]
+    dependencies = []
+    for index, operation in enumerate(operations):
+        depends_on = set()
+        paths = [operation.source] if operation.target is None else [operation.source, operation.target]
+        for path in paths:
+            ancestors = list(_path_ancestors(path))
+            for ancestor in ancestors:
+                depends_on.update(touched.get(ancestor, ()))
+            depends_on.update(below.get(ancestors[0], ()))
+            touched.setdefault(ancestors[0], []).append(index)
+            for ancestor in ancestors[1:]:
+                below.setdefault(ancestor, []).append(index)
+        depends_on.discard(index)
+        dependencies.append(depends_on)
+    return dependencies
+
+
+async def _apply_concurrently(operations: List[RenameOperation], dependencies: List[Set[int]], concurrency: int,
+                              ignore_errors: bool, log: logging.Logger, journal, report,
+                              first_sequence: int) -> List[Optional[Exception]]:
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    loop = asyncio.get_running_loop()
+    done = [loop.create_future() for _ in operations]
+    errors = [None] * len(operations)  # type: List[Optional[Exception]]
+    aborted = []
+    # Only as many operations as there are threads get past the abort check, so a failure stops the ones queued behind
+    lanes = asyncio.Semaphore(concurrency)
+
+    async def _apply(index: int, operation: RenameOperation, executor):
+        try:
+            for dependency in dependencies[index]:
+                await done[dependency]
+            failed_dependencies = [dependency for dependency in dependencies[index] if errors[dependency]]
+            if failed_dependencies:
+                errors[index] = FileException(
+                    f'Skipped, depends on failed operation: {operations[failed_dependencies[0]].describe()}')
+                if report is not None:
+                    report.write_operation(operation, 'failed', str(errors[index]))
+                return
+            async with lanes:
+                if aborted:
+                    return
+                sequence = first_sequence + index
+                log.debug(f'Applying: {operation.describe()}')
+                if journal is not None:
+                    journal.begin(sequence, operation)
+                try:
+                    if not await loop.run_in_executor(executor, apply_operation, operation):
+                        raise FileException(f'Operation returned no result: {operation.describe()}')
+                except FileException as e:
+                    errors[index] = e
+                    if journal is not None:
+                        journal.failed(sequence, str(e))
+                    if report is not None:
+                        report.write_operation(operation, 'failed', str(e))
+                    if not ignore_errors:
+                        aborted.append(e)
+                    return
+            if journal is not None:
+                journal.done(sequence)
+            if report is not None:
+                report.write_operation(operation, 'applied')
+        finally:
+            done[index].set_result(None)
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='apply') as executor:
+        await asyncio.gather(*(_apply(index, operation, executor) for index, operation in enumerate(operations)))
+    if aborted:
+        raise aborted[0]
+    return errors
+
+
+def apply_plan(plan: RenamePlan, dry_run: bool = False, ignore_errors: bool = False,
+               log: Optional[logging.Logger] = None, journal=None, root: Optional[str] = None,
+               report=None, first_sequence: int = 0, concurrency: int = DEFAULT_CONCURRENCY) -> List[RenameOperation]:
+    """
+    Applies a rename plan to disk.
+
+    :param plan: The plan to apply.
+    :param dry_run: Print the plan instead of applying it.
+    :param ignore_errors: Keep applying the remaining operations when one fails.
+    :param log: The logger.
+    :param journal: Journal the operations are recorded in before they are applied.
+    :param root: The library root, recorded in the journal.
+    :param report: Report writer every operation is written to with its outcome.
+    :param first_sequence: Journal sequence number of the first operation, for plans applied in parts.
+    :param concurrency: Number of operations applied at the same time. Above 1 independent operations run on a
+        thread pool driven by asyncio, each operation still waits for the operations on its parent and child paths.
+
+    :return: List of operations that failed.
+    """
+    if log is None:
+        log = logging.getLogger('media_log')
+
+    operations = plan.batched()
+    if journal is not None and not dry_run and operations:
+        journal.record_plan(operations, root, first_sequence)
+        log.debug(f'Recorded {len(operations)} operations in journal: {journal.path}')
+
+    failed = []
+    if concurrency > 1 and not dry_run and len(operations) > 1:
+        # asyncio takes longer to import than most plans take to apply sequentially, so it is only loaded here
+        import asyncio
+        errors = asyncio.run(_apply_concurrently(operations, build_dependencies(operations), concurrency,
+                                                 ignore_errors, log, journal, report, first_sequence))
+        for operation, error in zip(operations, errors):
+            if error is not None:
+                log.error(f'Failed to apply: {operation.describe()}. Error: {error}')
+                failed.append(operation)
+        return failed
+
+    for sequence, operation in enumerate(operations, first_sequence):
+        if dry_run:
+            # One write per line keeps the lines of roots applied in parallel from interleaving
+            sys.stdout.write(f'{operation.describe()}\n')
+            if report is not None:
+                report.write_operation(operation, 'planned')
+            continue
+        log.debug(f'Applying: {operation.describe()}')
+        if journal is not None:
+            journal.begin(sequence, operation)
+        try:
+            if not apply_operation(operation):
+                raise FileException(f'Operation returned no result: {operation.describe()}')
+        except FileException as e:
+            if journal is not None:
+                journal.failed(sequence, str(e))
+            if report is not None:
+                report.write_operation(operation, 'failed', str(e))
+            if not ignore_errors:
+                raise
+            log.error(f'Failed to apply: {operation.describe()}. Error: {e}')
+            failed.append(operation)
+            continue
+        if journal is not None:
+            journal.done(sequence)
+        if report is not None:
+            report.write_operation(operation, 'applied')
+    return failed
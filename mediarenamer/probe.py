@@ -0,0 +1,586 @@
+import os
+import mmap
+import struct
+import threading
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .version import __version__
+from .config import DEFAULT_JOBS
+from .exceptions import FileException, ParserException
+from .metrics import METRICS
+
+# Bumped whenever the pickled form of the probe cache changes
+PROBE_CACHE_VERSION = 1
+
+MATROSKA = 'matroska'
+MP4 = 'mp4'
+
+# Smallest file that can hold a container header
+MIN_PROBE_SIZE = 16
+
+# Matroska element IDs, only the ones on the path to the segment info and the track headers
+EBML_ID = 0x1A45DFA3
+EBML_DOC_TYPE_ID = 0x4282
+SEGMENT_ID = 0x18538067
+SEEK_HEAD_ID = 0x114D9B74
+SEEK_ID = 0x4DBB
+SEEK_ID_ID = 0x53AB
+SEEK_POSITION_ID = 0x53AC
+INFO_ID = 0x1549A966
+TIMECODE_SCALE_ID = 0x2AD7B1
+DURATION_ID = 0x4489
+TRACKS_ID = 0x1654AE6B
+TRACK_ENTRY_ID = 0xAE
+TRACK_TYPE_ID = 0x83
+CODEC_ID_ID = 0x86
+LANGUAGE_ID = 0x22B59C
+LANGUAGE_IETF_ID = 0x22B59D
+VIDEO_ID = 0xE0
+PIXEL_WIDTH_ID = 0xB0
+PIXEL_HEIGHT_ID = 0xBA
+CLUSTER_ID = 0x1F43B675
+MATROSKA_DOC_TYPES = frozenset(['matroska', 'webm'])
+MATROSKA_VIDEO_TRACK = 1
+MATROSKA_AUDIO_TRACK = 2
+DEFAULT_TIMECODE_SCALE = 1000000
+DEFAULT_MATROSKA_LANGUAGE = 'eng'
+
+# MP4 boxes a file can start with
+MP4_TOP_LEVEL_BOXES = frozenset([b'ftyp', b'moov', b'mdat', b'free', b'skip', b'wide', b'pdin'])
+UNDETERMINED_LANGUAGE = 'und'
+UNKNOWN_CODEC = 'unknown'
+
+# Codec names as ffprobe reports them
+CODEC_NAMES = {
+    'V_MPEG4/ISO/AVC': 'h264',
+    'V_MPEGH/ISO/HEVC': 'hevc',
+    'V_MPEG4/ISO/ASP': 'mpeg4',
+    'V_MPEG2': 'mpeg2video',
+    'V_AV1': 'av1',
+    'V_VP8': 'vp8',
+    'V_VP9': 'vp9',
+    'A_AAC': 'aac',
+    'A_AC3': 'ac3',
+    'A_EAC3': 'eac3',
+    'A_DTS': 'dts',
+    'A_TRUEHD': 'truehd',
+    'A_FLAC': 'flac',
+    'A_OPUS': 'opus',
+    'A_VORBIS': 'vorbis',
+    'A_MPEG/L3': 'mp3',
+    'avc1': 'h264',
+    'avc3': 'h264',
+    'hvc1': 'hevc',
+    'hev1': 'hevc',
+    'av01': 'av1',
+    'vp09': 'vp9',
+    'mp4v': 'mpeg4',
+    'mp4a': 'aac',
+    'ac-3': 'ac3',
+    'ec-3': 'eac3',
+    'Opus': 'opus',
+    'fLaC': 'flac',
+    'alac': 'alac',
+    '.mp3': 'mp3',
+}
+
+
+class MediaInfo(NamedTuple):
+    """
+    Stream details read from the header of a media file.
+    """
+    container: str
+    duration: Optional[float]
+    width: Optional[int]
+    height: Optional[int]
+    video_codec: Optional[str]
+    audio_codecs: List[str]
+    audio_languages: List[str]
+
+    @property
+    def resolution(self) -> Optional[str]:
+        """
+        Resolution of the video track, e.g. ``1920x1080``.
+        """
+        if not self.width or not self.height:
+            return None
+        return f'{self.width}x{self.height}'
+
+    def describe(self) -> str:
+        minutes, seconds = divmod(int(self.duration or 0), 60)
+        hours, minutes = divmod(minutes, 60)
+        return ', '.join([
+            self.resolution or 'unknown resolution',
+            f'{hours}:{minutes:02d}:{seconds:02d}' if self.duration else 'unknown duration',
+            self.video_codec or 'unknown codec',
+            '/'.join(self.audio_languages) or 'no audio',
+        ])
+
+
+def _codec_name(codec: str) -> str:
+    return CODEC_NAMES.get(codec) or CODEC_NAMES.get(codec.split('/')[0]) or codec.strip().lower()
+
+
+def _string(view: memoryview, start: int, end: int) -> str:
+    return bytes(view[start:end]).rstrip(b'\0').decode('utf-8', 'replace')
+
+
+def read_ebml_id(view: memoryview, position: int, end: int) -> Tuple[int, int]:
+    """
+    Reads an EBML element ID, the length marker bits are kept as the Matroska specification writes IDs.
+
+    :return: The element ID and the position after it.
+    """
+    first = view[position]
+    length = 9 - first.bit_length()
+    if not first or length > 4 or position + length > end:
+        raise ParserException(f'Invalid EBML element ID at offset {position}')
+    return int.from_bytes(view[position:position + length], 'big'), position + length
+
+
+def read_ebml_size(view: memoryview, position: int, end: int) -> Tuple[Optional[int], int]:
+    """
+    Reads an EBML element data size.
+
+    :return: The data size, None if it is unknown, and the position after it.
+    """
+    first = view[position]
+    length = 9 - first.bit_length()
+    if not first or position + length > end:
+        raise ParserException(f'Invalid EBML element size at offset {position}')
+    mask = (1 << (7 * length)) - 1
+    size = int.from_bytes(view[position:position + length], 'big') & mask
+    # A size with every bit set is unknown, the element runs to the end of its parent
+    return (None if size == mask else size), position + length
+
+
+def ebml_elements(view: memoryview, start: int, end: int):
+    """
+    Iterates the child elements of an EBML element without reading their data.
+
+    Elements cut off by the end of the file are clamped to it, so the header of a truncated file can still be read.
+    """
+    position = start
+    while position < end:
+        element_id, position = read_ebml_id(view, position, end)
+        if position >= end:
+            return
+        size, data_start = read_ebml_size(view, position, end)
+        data_end = end if size is None else min(data_start + size, end)
+        yield element_id, data_start, data_end
+        position = data_end
+
+
+def ebml_uint(view: memoryview, start: int, end: int) -> int:
+    return int.from_bytes(view[start:end], 'big')
+
+
+def _ebml_float(view: memoryview, start: int, end: int) -> Optional[float]:
+    if end - start == 4:
+        return struct.unpack_from('>f', view, start)[0]
+    if end - start == 8:
+        return struct.unpack_from('>d', view, start)[0]
+    return None
+
+
+def _parse_matroska_info(view: memoryview, start: int, end: int, info: dict):
+    timecode_scale = DEFAULT_TIMECODE_SCALE
+    duration = None
+    for element_id, data_start, data_end in ebml_elements(view, start, end):
+        if element_id == TIMECODE_SCALE_ID:
+            timecode_scale = ebml_uint(view, data_start, data_end)
+        elif element_id == DURATION_ID:
+            duration = _ebml_float(view, data_start, data_end)
+    if duration:
+        info['duration'] = duration * timecode_scale / 1e9
+
+
+def _parse_matroska_tracks(view: memoryview, start: int, end: int, info: dict):
+    for element_id, entry_start, entry_end in ebml_elements(view, start, end):
+        if element_id != TRACK_ENTRY_ID:
+            continue
+        track_type = codec = language = language_ietf = width = height = None
+        for child_id, data_start, data_end in ebml_elements(view, entry_start, entry_end):
+            if child_id == TRACK_TYPE_ID:
+                track_type = ebml_uint(view, data_start, data_end)
+            elif child_id == CODEC_ID_ID:
+                codec = _string(view, data_start, data_end)
+            elif child_id == LANGUAGE_ID:
+                language = _string(view, data_start, data_end)
+            elif child_id == LANGUAGE_IETF_ID:
+                language_ietf = _string(view, data_start, data_end)
+            elif child_id == VIDEO_ID:
+                for video_id, video_start, video_end in ebml_elements(view, data_start, data_end):
+                    if video_id == PIXEL_WIDTH_ID:
+                        width = ebml_uint(view, video_start, video_end)
+                    elif video_id == PIXEL_HEIGHT_ID:
+                        height = ebml_uint(view, video_start, video_end)
+        if track_type == MATROSKA_VIDEO_TRACK and 'video_codec' not in info:
+            info['video_codec'] = _codec_name(codec) if codec else None
+            info['width'], info['height'] = width, height
+        elif track_type == MATROSKA_AUDIO_TRACK:
+            info['audio_codecs'].append(_codec_name(codec) if codec else UNKNOWN_CODEC)
+            info['audio_languages'].append(language or language_ietf or DEFAULT_MATROSKA_LANGUAGE)
+
+
+def parse_matroska_seek_head(view: memoryview, start: int, end: int) -> Dict[int, int]:
+    """
+    Reads the seek head of a Matroska segment.
+
+    :return: Dictionary of element ID to its position relative to the start of the segment data.
+    """
+    positions = {}
+    for element_id, seek_start, seek_end in ebml_elements(view, start, end):
+        if element_id != SEEK_ID:
+            continue
+        seek_id = seek_position = None
+        for child_id, data_start, data_end in ebml_elements(view, seek_start, seek_end):
+            if child_id == SEEK_ID_ID:
+                seek_id = ebml_uint(view, data_start, data_end)
+            elif child_id == SEEK_POSITION_ID:
+                seek_position = ebml_uint(view, data_start, data_end)
+        if seek_id is not None and seek_position is not None:
+            positions.setdefault(seek_id, seek_position)
+    return positions
+
+
+def _probe_matroska(view: memoryview) -> MediaInfo:
+    end = len(view)
+    elements = ebml_elements(view, 0, end)
+    element_id, data_start, data_end = next(elements)
+    doc_type = None
+    for child_id, child_start, child_end in ebml_elements(view, data_start, data_end):
+        if child_id == EBML_DOC_TYPE_ID:
+            doc_type = _string(view, child_start, child_end)
+    if doc_type not in MATROSKA_DOC_TYPES:
+        raise ParserException(f'Unsupported EBML document type {doc_type!r}')
+
+    for element_id, segment_start, segment_end in elements:
+        if element_id == SEGMENT_ID:
+            break
+    else:
+        raise ParserException('Missing Matroska segment')
+
+    info = {'audio_codecs': [], 'audio_languages': []}
+    parsers = {INFO_ID: _parse_matroska_info, TRACKS_ID: _parse_matroska_tracks}
+    parsed = set()
+    seek_positions = {}
+    # The segment info and tracks come before the first cluster in almost every file, the clusters holding the
+    # actual frames are never read. Anything still missing at that point is found through the seek head.
+    for element_id, data_start, data_end in ebml_elements(view, segment_start, segment_end):
+        if element_id == CLUSTER_ID:
+            break
+        if element_id in parsers and element_id not in parsed:
+            parsers[element_id](view, data_start, data_end, info)
+            parsed.add(element_id)
+        elif element_id == SEEK_HEAD_ID:
+            seek_positions.update(parse_matroska_seek_head(view, data_start, data_end))
+        if len(parsed) == len(parsers):
+            break
+    for element_id, parser in parsers.items():
+        position = seek_positions.get(element_id)
+        if element_id in parsed or position is None or segment_start + position >= segment_end:
+            continue
+        for found_id, data_start, data_end in ebml_elements(view, segment_start + position, segment_end):
+            if found_id == element_id:
+                parser(view, data_start, data_end, info)
+            break
+
+    return MediaInfo(MATROSKA, info.get('duration'), info.get('width'), info.get('height'),
+                     info.get('video_codec'), info['audio_codecs'], info['audio_languages'])
+
+
+def _mp4_boxes(view: memoryview, start: int, end: int):
+    """
+    Iterates the child boxes of an MP4 box without reading their data.
+    """
+    position = start
+    while position + 8 <= end:
+        size = struct.unpack_from('>I', view, position)[0]
+        box_type = bytes(view[position + 4:position + 8])
+        header = 8
+        if size == 1:
+            if position + 16 > end:
+                return
+            size = struct.unpack_from('>Q', view, position + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - position
+        if size < header:
+            raise ParserException(f'Invalid MP4 box size at offset {position}')
+        yield box_type, position + header, min(position + size, end)
+        position += size
+
+
+def _mp4_child(view: memoryview, start: int, end: int, box_type: bytes) -> Optional[Tuple[int, int]]:
+    for child_type, data_start, data_end in _mp4_boxes(view, start, end):
+        if child_type == box_type:
+            return data_start, data_end
+    return None
+
+
+def _mp4_language(packed: int) -> str:
+    # ISO 639-2/T code packed as three 5 bit letters offset from 0x60
+    letters = [((packed >> shift) & 0x1F) + 0x60 for shift in (10, 5, 0)]
+    if not all(0x61 <= letter <= 0x7A for letter in letters):
+        return UNDETERMINED_LANGUAGE
+    return bytes(letters).decode('ascii')
+
+
+def _parse_mp4_track(view: memoryview, start: int, end: int, info: dict):
+    width = height = None
+    tkhd = _mp4_child(view, start, end, b'tkhd')
+    if tkhd:
+        # Fixed point 16.16 display size at the end of the track header
+        offset = tkhd[0] + (88 if view[tkhd[0]] == 1 else 76)
+        if offset + 8 <= tkhd[1]:
+            width, height = (value >> 16 for value in struct.unpack_from('>II', view, offset))
+
+    mdia = _mp4_child(view, start, end, b'mdia')
+    if not mdia:
+        return
+    handler = language = codec = None
+    for box_type, data_start, data_end in _mp4_boxes(view, mdia[0], mdia[1]):
+        if box_type == b'hdlr' and data_start + 12 <= data_end:
+            handler = bytes(view[data_start + 8:data_start + 12])
+        elif box_type == b'mdhd':
+            offset = data_start + (32 if view[data_start] == 1 else 20)
+            if offset + 2 <= data_end:
+                language = _mp4_language(struct.unpack_from('>H', view, offset)[0])
+        elif box_type == b'minf':
+            stbl = _mp4_child(view, data_start, data_end, b'stbl')
+            stsd = stbl and _mp4_child(view, stbl[0], stbl[1], b'stsd')
+            if stsd and stsd[0] + 16 <= stsd[1]:
+                codec = bytes(view[stsd[0] + 12:stsd[0] + 16]).decode('latin-1')
+                if not width and stsd[0] + 44 <= stsd[1]:
+                    # Coded size of the first visual sample entry
+                    width, height = struct.unpack_from('>HH', view, stsd[0] + 40)
+
+    if handler == b'vide' and 'video_codec' not in info:
+        info['video_codec'] = _codec_name(codec) if codec else None
+        info['width'], info['height'] = width or None, height or None
+    elif handler == b'soun':
+        info['audio_codecs'].append(_codec_name(codec) if codec else UNKNOWN_CODEC)
+        info['audio_languages'].append(language or UNDETERMINED_LANGUAGE)
+
+
+def _probe_mp4(view: memoryview) -> MediaInfo:
+    # The movie box is found by hopping from box header to box header, a media data box in front of it is skipped
+    # without touching its pages
+    moov = _mp4_child(view, 0, len(view), b'moov')
+    if not moov:
+        raise ParserException('Missing MP4 movie box')
+
+    info = {'audio_codecs': [], 'audio_languages': []}
+    for box_type, data_start, data_end in _mp4_boxes(view, moov[0], moov[1]):
+        if box_type == b'mvhd':
+            if view[data_start] == 1:
+                timescale, duration = struct.unpack_from('>IQ', view, data_start + 20)
+                unknown = 0xFFFFFFFFFFFFFFFF
+            else:
+                timescale, duration = struct.unpack_from('>II', view, data_start + 12)
+                unknown = 0xFFFFFFFF
+            if timescale and duration != unknown:
+                info['duration'] = duration / timescale
+        elif box_type == b'trak':
+            _parse_mp4_track(view, data_start, data_end, info)
+
+    return MediaInfo(MP4, info.get('duration'), info.get('width'), info.get('height'), info.get('video_codec'),
+                     info['audio_codecs'], info['audio_languages'])
+
+
+def _probe_view(view: memoryview) -> Optional[MediaInfo]:
+    if struct.unpack_from('>I', view, 0)[0] == EBML_ID:
+        return _probe_matroska(view)
+    if bytes(view[4:8]) in MP4_TOP_LEVEL_BOXES:
+        return _probe_mp4(view)
+    return None
+
+
+def probe_file(file_name: str) -> Optional[MediaInfo]:
+    """
+    Reads the stream details of a Matroska or MP4 file from its header.
+
+    The file is memory mapped and parsed in place, only the pages holding the element and box headers on the way to
+    the track descriptions are read from disk, never the media data.
+
+    :param file_name: The media file.
+
+    :return: The stream details, None if the file is not a Matroska or MP4 file.
+    """
+    try:
+        with open(file_name, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < MIN_PROBE_SIZE:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if hasattr(mapped, 'madvise') and hasattr(mmap, 'MADV_RANDOM'):
+                    # Headers are scattered over the file, read ahead would only pull in media data
+                    mapped.madvise(mmap.MADV_RANDOM)
+                with memoryview(mapped) as view:
+                    try:
+                        return _probe_view(view)
+                    except ParserException as e:
+                        error = str(e)
+                    except (IndexError, StopIteration, struct.error, ValueError) as e:
+                        error = f'Truncated header, {e}'
+    except Exception as e:
+        raise FileException(str(e))
+    raise ParserException(f'Failed to probe {file_name}: {error}')
+
+
+def extract_probe_cache_path() -> str:
+    """
+    Extracts the default path of the probe cache.
+
+    :return: Path of the probe cache.
+    """
+    cache_directory = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_directory, 'mediarenamer', 'probe.pickle')
+
+
+class ProbeCache(object):
+    """
+    On disk cache of probe results keyed on the inode, size and mtime of the probed file.
+
+    A file whose inode, size and mtime match the cached ones still has the same header, renaming a file keeps its
+    inode so a renamed library does not have to be probed again.
+    """
+
+    def __init__(self, path: Optional[str] = None, full_rescan: bool = False):
+        """
+        :param path: Path of the cache file, the user cache directory is used if not given.
+        :param full_rescan: Ignore the cached results and probe every file again.
+        """
+        self.path = path or extract_probe_cache_path()
+        self.full_rescan = full_rescan
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = self._read()  # type: Dict[Tuple[int, int], Tuple[int, int, Optional[MediaInfo]]]
+        self._changed = False
+
+    def __enter__(self) -> 'ProbeCache':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _read(self) -> dict:
+        import pickle
+
+        try:
+            with open(self.path, 'rb') as f:
+                version, entries = pickle.load(f)
+            if version == (__version__, PROBE_CACHE_VERSION):
+                return entries
+        except Exception:
+            pass
+        return {}
+
+    def lookup(self, stat: os.stat_result) -> Tuple[bool, Optional[MediaInfo]]:
+        """
+        Looks up the cached probe result of a file.
+
+        :param stat: Stat result of the file.
+
+        :return: Whether the file is cached and its cached probe result.
+        """
+        with self._lock:
+            entry = None if self.full_rescan else self._entries.get((stat.st_dev, stat.st_ino))
+            if entry is None or entry[:2] != (stat.st_size, stat.st_mtime_ns):
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            return True, entry[2]
+
+    def store(self, stat: os.stat_result, info: Optional[MediaInfo]):
+        """
+        Caches the probe result of a file.
+
+        :param stat: Stat result of the file when it was probed.
+        :param info: The probe result.
+        """
+        with self._lock:
+            self._entries[(stat.st_dev, stat.st_ino)] = (stat.st_size, stat.st_mtime_ns, info)
+            self._changed = True
+
+    def close(self):
+        import pickle
+
+        with self._lock:
+            if not self._changed:
+                return
+            temporary_path = f'{self.path}.{os.getpid()}.tmp'
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                with open(temporary_path, 'wb') as f:
+                    pickle.dump(((__version__, PROBE_CACHE_VERSION), self._entries), f,
+                                protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(temporary_path, self.path)
+                self._changed = False
+            except Exception:
+                # The cache only saves time, files that can not be cached are probed again next time
+                try:
+                    os.remove(temporary_path)
+                except OSError:
+                    pass
+
+
+def probe_cached(file_name: str, cache: Optional[ProbeCache] = None) -> Optional[MediaInfo]:
+    """
+    Probes a file unless its probe result is cached.
+
+    :param file_name: The media file.
+    :param cache: The probe cache.
+
+    :return: The stream details, None if the file is not a Matroska or MP4 file.
+    """
+    if cache is None:
+        return probe_file(file_name)
+    try:
+        stat = os.stat(file_name)
+    except Exception as e:
+        raise FileException(str(e))
+    found, info = cache.lookup(stat)
+    if found:
+        return info
+    with METRICS.timed('probe'):
+        info = probe_file(file_name)
+    cache.store(stat, info)
+    return info
+
+
+def probe_files(files: Iterable[str], jobs: int = DEFAULT_JOBS, cache: Optional[ProbeCache] = None,
+                on_error: Optional[Callable[[Exception], None]] = None) -> Dict[str, Optional[MediaInfo]]:
+    """
+    Probes media files on a thread pool.
+
+    :param files: The media files.
+    :param jobs: Number of files probed in parallel.
+    :param cache: Probe cache to read and update.
+    :param on_error: Called with the error when a file can not be probed, the file is left out.
+
+    :return: Dictionary of file to its stream details, None for files that are not Matroska or MP4 files.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def _probe(file_name: str):
+        try:
+            return probe_cached(file_name, cache), None
+        except (FileException, ParserException) as e:
+            return None, e
+
+    files = list(files)
+    probed = {}
+    with ThreadPoolExecutor(max_workers=max(1, jobs), thread_name_prefix='probe') as executor:
+        for file_name, (info, error) in zip(files, executor.map(_probe, files)):
+            if error is None:
+                probed[file_name] = info
+            elif on_error is None:
+                raise error
+            else:
+                on_error(error)
+    return probed
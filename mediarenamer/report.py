@@ -0,0 +1,117 @@
+import io
+import json
+import threading
+from typing import Iterator, Optional
+
+from .exceptions import FileException
+
+
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+DEFAULT_FLUSH_EVERY = 1000
+
+STATUS_PLANNED = 'planned'
+STATUS_APPLIED = 'applied'
+STATUS_FAILED = 'failed'
+
+
+def is_compressed_report(filename: str) -> bool:
+    return filename.endswith('.gz')
+
+
+class ReportWriter(object):
+    """
+    Streams one JSON line per old to new operation to a report file.
+
+    The file is opened once and written through a large buffer that is flushed every ``flush_every`` records, so a
+    run of any size is written in constant memory with a handful of write calls.
+    """
+
+    def __init__(self, filename: str, compress: Optional[bool] = None, buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 flush_every: int = DEFAULT_FLUSH_EVERY):
+        """
+        :param filename: The report file, overwritten if it exists.
+        :param compress: Gzip the report, defaults to True for filenames ending in .gz.
+        :param buffer_size: Size of the write buffer in bytes.
+        :param flush_every: Number of records written between two flushes.
+        """
+        self.filename = filename
+        self.flush_every = max(1, flush_every)
+        self.count = 0
+        self._lock = threading.Lock()
+        if compress is None:
+            compress = is_compressed_report(filename)
+        try:
+            if compress:
+                import gzip
+                self._file = io.TextIOWrapper(io.BufferedWriter(gzip.open(filename, 'wb', compresslevel=6),
+                                                                buffer_size=buffer_size), encoding='utf-8')
+            else:
+                self._file = open(filename, 'w', buffering=buffer_size, encoding='utf-8')
+        except Exception as e:
+            raise FileException(str(e))
+
+    def __enter__(self) -> 'ReportWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write_record(self, record: dict):
+        """
+        Writes a single record.
+
+        :param record: The JSON serializable record.
+        """
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with self._lock:
+            try:
+                self._file.write(line)
+                self.count += 1
+                if self.count % self.flush_every == 0:
+                    self._file.flush()
+            except Exception as e:
+                raise FileException(str(e))
+
+    def write_operation(self, operation, status: str = STATUS_APPLIED, error: Optional[str] = None):
+        """
+        Writes the record of a rename plan operation.
+
+        :param operation: The operation.
+        :param status: One of planned, applied or failed.
+        :param error: The error of a failed operation.
+        """
+        record = {'op': operation.kind, 'old': operation.source, 'new': operation.target, 'status': status}
+        if error:
+            record['error'] = error
+        self.write_record(record)
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            try:
+                self._file.close()
+            except Exception as e:
+                raise FileException(str(e))
+
+
+def read_report(filename: str) -> Iterator[dict]:
+    """
+    Streams the records of a report written by ``ReportWriter``.
+
+    :param filename: The report file, gzipped reports are detected from their header.
+
+    :return: Iterator of report records.
+    """
+    try:
+        with open(filename, 'rb') as f:
+            compressed = f.read(2) == b'\x1f\x8b'
+        if compressed:
+            import gzip
+        opener = gzip.open if compressed else open
+        with opener(filename, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    except Exception as e:
+        raise FileException(str(e))
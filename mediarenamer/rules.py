@@ -0,0 +1,181 @@
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+from .config import DEFAULT_RULES, RULES
+from .exceptions import ParserException
+
+
+# Folder kinds, the kind of the folder a file is in decides which rules apply to it
+MOVIE = 'movie'
+FEATURETTES = 'featurettes'
+SUBS = 'subs'
+SEASON = 'season'
+FOLDER_KINDS = (MOVIE, FEATURETTES, SUBS, SEASON)
+
+# Sidecar folders inside a movie folder and their kind
+SIDECAR_FOLDERS = {
+    'Featurettes': FEATURETTES,
+    'Subs': SUBS,
+}
+
+# Actions
+MEDIA = 'media'
+KEEP = 'keep'
+DELETE = 'delete'
+MOVE = 'move'
+UNKNOWN = 'unknown'
+ACTIONS = (MEDIA, KEEP, DELETE, MOVE, UNKNOWN)
+
+ANY = '*'
+
+
+class Rule(NamedTuple):
+    """
+    What to do with the files of one extension in one kind of folder.
+    """
+    folder_kind: str
+    extension: str
+    action: str
+    target: Optional[str] = None
+
+    def describe(self) -> str:
+        rule = f'{self.folder_kind}:{self.extension} {self.action}'
+        return f'{rule} {self.target}' if self.target else rule
+
+
+def parse_rule(rule: str) -> Rule:
+    """
+    Parses a rule written as ``[kind:]extension action [target]``.
+
+    The kind is one of movie, featurettes, subs or season and defaults to every kind, the extension ``*`` matches
+    every extension without a rule of its own. The action is one of media, keep, delete, move or unknown, move takes
+    the folder the file is moved into, relative to the movie or season folder.
+
+    :param rule: The rule, e.g. ``srt move Subs``, ``nfo keep`` or ``featurettes:txt delete``.
+
+    :return: The parsed rule.
+    """
+    parts = rule.split()
+    if len(parts) < 2:
+        raise ParserException(f'Invalid rule: {rule!r}, expected [kind:]extension action [target]')
+    folder_kind, _, extension = parts[0].rpartition(':')
+    folder_kind = folder_kind.lower() or ANY
+    extension = extension.lower().lstrip('.')
+    action = parts[1].lower()
+    target = ' '.join(parts[2:]).strip('/') or None
+    if folder_kind != ANY and folder_kind not in FOLDER_KINDS:
+        raise ParserException(f'Invalid rule: {rule!r}, unknown folder kind {folder_kind!r}')
+    if not extension:
+        raise ParserException(f'Invalid rule: {rule!r}, missing extension')
+    if action not in ACTIONS:
+        raise ParserException(f'Invalid rule: {rule!r}, unknown action {action!r}')
+    if (action == MOVE) != (target is not None):
+        raise ParserException(f'Invalid rule: {rule!r}, only the move action takes a target folder')
+    return Rule(folder_kind, extension, action, target)
+
+
+class RuleTable(object):
+    """
+    Rules compiled into dispatch tables, every file is classified with a single dictionary lookup.
+    """
+
+    __slots__ = ('_rules', '_defaults', '_extensions', 'fingerprint')
+
+    def __init__(self, rules: Iterable[Rule]):
+        """
+        :param rules: The rules, a later rule overrides an earlier one for the same folder kind and extension.
+        """
+        table = {}  # type: Dict[Tuple[str, str], Rule]
+        defaults = {folder_kind: Rule(folder_kind, ANY, UNKNOWN) for folder_kind in FOLDER_KINDS}
+        applied = []  # type: List[str]
+        for rule in rules:
+            applied.append(rule.describe())
+            folder_kinds = FOLDER_KINDS if rule.folder_kind == ANY else (rule.folder_kind,)
+            for folder_kind in folder_kinds:
+                # A rule for every kind never moves a file into the folder it is already in
+                if rule.folder_kind == ANY and rule.action == MOVE and SIDECAR_FOLDERS.get(rule.target) == folder_kind:
+                    continue
+                compiled = rule._replace(folder_kind=folder_kind)
+                if rule.extension == ANY:
+                    defaults[folder_kind] = compiled
+                else:
+                    table[(folder_kind, rule.extension)] = compiled
+
+        self._rules = table
+        self._defaults = defaults
+        extensions = {}
+        for (folder_kind, extension), rule in table.items():
+            extensions.setdefault((folder_kind, rule.action), set()).add(extension)
+        self._extensions = {key: frozenset(value) for key, value in extensions.items()}
+        self.fingerprint = ','.join(applied)
+
+    def __repr__(self) -> str:
+        return f'RuleTable({len(self._rules)} rules)'
+
+    def classify(self, folder_kind: str, extension: Optional[str]) -> Rule:
+        """
+        Finds the rule for a file.
+
+        :param folder_kind: Kind of the folder the file is in.
+        :param extension: Extension of the file.
+
+        :return: The rule, the default rule of the folder kind if no rule matches the extension.
+        """
+        return self._rules.get((folder_kind, extension.lower() if extension else None)) or self._defaults[folder_kind]
+
+    def extensions(self, folder_kind: str, action: str) -> FrozenSet[str]:
+        """
+        Lists the extensions with a rule for an action.
+
+        :param folder_kind: The folder kind.
+        :param action: The action.
+
+        :return: Set of extensions.
+        """
+        return self._extensions.get((folder_kind, action), frozenset())
+
+    @staticmethod
+    def folder_kind(folder_basename: str) -> Optional[str]:
+        """
+        Extracts the kind of a sidecar folder inside a movie folder.
+
+        :param folder_basename: Basename of the folder.
+
+        :return: The folder kind, None if the folder is not a sidecar folder.
+        """
+        return SIDECAR_FOLDERS.get(folder_basename)
+
+
+def compile_rules(rules: Iterable[str]) -> RuleTable:
+    """
+    Parses and compiles rules.
+
+    :param rules: The rules, see ``parse_rule``.
+
+    :return: The compiled rules.
+    """
+    return RuleTable(parse_rule(rule) for rule in rules)
+
+
+_rule_table = None  # type: Optional[RuleTable]
+
+
+def get_rules() -> RuleTable:
+    """
+    Returns the default rules followed by the configured rules, compiled on first use.
+
+    :return: The compiled rules.
+    """
+    global _rule_table
+    if _rule_table is None:
+        _rule_table = compile_rules(list(DEFAULT_RULES) + list(RULES))
+    return _rule_table
+
+
+def set_rules(rule_table: Optional[RuleTable]):
+    """
+    Replaces the rules returned by ``get_rules``.
+
+    :param rule_table: The compiled rules, None compiles the default and configured rules again on next use.
+    """
+    global _rule_table
+    _rule_table = rule_table
@@ -0,0 +1,286 @@
+import os
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+from .version import __version__
+from .config import DEFAULT_RULES, RULES, MIN_MOVIE_YEAR, CONFIG_FILE_NAME
+from .exceptions import FileException, ParserException
+from .naming import PLEX_TEMPLATES, TEMPLATE_DEPTHS, NameTemplate, compile_templates
+from .rules import RuleTable, compile_rules, set_rules
+from .utils import FilenameParser, set_year_bounds
+
+# Bumped whenever the pickled form of LibraryConfig changes
+CONFIG_CACHE_VERSION = 2
+
+CONFIG_KEYS = frozenset(['roots', 'rules', 'extensions', 'templates', 'years', 'concurrency'])
+EXTENSION_ACTIONS = ('media', 'keep', 'delete')
+YEAR_KEYS = frozenset(['min', 'max'])
+CONCURRENCY_KEYS = frozenset(['jobs', 'jobs_per_device', 'concurrency', 'parse_workers'])
+
+
+class LibraryConfig(NamedTuple):
+    """
+    Validated and compiled library settings.
+
+    Concurrency settings left out of the config file are None, the command line defaults apply to them.
+    """
+    path: Optional[str]
+    roots: List[str]
+    rules: RuleTable
+    templates: Dict[str, NameTemplate]
+    min_year: int
+    max_year: Optional[int]
+    jobs: Optional[int] = None
+    jobs_per_device: Optional[int] = None
+    concurrency: Optional[int] = None
+    parse_workers: Optional[int] = None
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Fingerprint of the settings a plan depends on.
+
+        A missing newest year is the current year, it is resolved here so indexed parse results are discarded when
+        the year changes.
+        """
+        templates = ','.join(f'{key}={value.template}' for key, value in sorted(self.templates.items()))
+        max_year = self.max_year if self.max_year is not None else datetime.now().year
+        return f'{self.rules.fingerprint}|{templates}|{self.min_year}-{max_year}'
+
+    @property
+    def parser(self) -> FilenameParser:
+        """
+        Name parser accepting movie years between the year bounds.
+        """
+        return FilenameParser(self.min_year, self.max_year)
+
+
+def extract_user_config_path() -> str:
+    """
+    Extracts the path of the config file in the user config directory.
+
+    :return: Path of the user config file.
+    """
+    config_directory = os.environ.get('XDG_CONFIG_HOME') or os.path.join(os.path.expanduser('~'), '.config')
+    return os.path.join(config_directory, 'mediarenamer', 'config.toml')
+
+
+def extract_config_cache_path(path: str) -> str:
+    """
+    Extracts the path the compiled form of a config file is cached at.
+
+    :param path: The config file.
+
+    :return: Path of the cache file.
+    """
+    import hashlib
+
+    cache_directory = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    digest = hashlib.sha1(os.path.abspath(path).encode('utf-8', 'surrogateescape')).hexdigest()[:8]
+    return os.path.join(cache_directory, 'mediarenamer', f'config-{digest}.pickle')
+
+
+def find_config_path(directory: str) -> Optional[str]:
+    """
+    Finds the config file of a library, the one in the library directory or else the one in the user config directory.
+
+    :param directory: The library directory.
+
+    :return: Path of the config file, None if there is none.
+    """
+    for path in (os.path.join(directory, CONFIG_FILE_NAME), extract_user_config_path()):
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def default_config() -> LibraryConfig:
+    """
+    Builds the settings used when there is no config file.
+
+    :return: The default settings.
+    """
+    return LibraryConfig(None, [], compile_rules(list(DEFAULT_RULES) + list(RULES)), compile_templates(PLEX_TEMPLATES),
+                         MIN_MOVIE_YEAR, None)
+
+
+def _check_keys(section: dict, allowed: frozenset, name: str):
+    if not isinstance(section, dict):
+        raise ParserException(f'Invalid config: {name} must be a table')
+    unknown = sorted(set(section) - allowed)
+    if unknown:
+        raise ParserException(f'Invalid config: unknown {name} keys {", ".join(unknown)}')
+
+
+def _check_strings(value, name: str) -> List[str]:
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise ParserException(f'Invalid config: {name} must be a list of strings')
+    return value
+
+
+def _check_positive(value, name: str) -> int:
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise ParserException(f'Invalid config: {name} must be a positive integer')
+    return value
+
+
+def compile_config(content: dict, path: Optional[str] = None) -> LibraryConfig:
+    """
+    Validates the content of a config file and compiles it.
+
+    :param content: The parsed config file.
+    :param path: The config file, relative roots are resolved against its directory.
+
+    :return: The compiled settings.
+    """
+    _check_keys(content, CONFIG_KEYS, 'top level')
+
+    base_directory = os.path.dirname(os.path.abspath(path)) if path else os.getcwd()
+    roots = [os.path.join(base_directory, os.path.expanduser(root))
+             for root in _check_strings(content.get('roots', []), 'roots')]
+
+    rules = list(DEFAULT_RULES) + list(RULES)
+    extensions = content.get('extensions', {})
+    _check_keys(extensions, frozenset(EXTENSION_ACTIONS), 'extensions')
+    for action in EXTENSION_ACTIONS:
+        for extension in _check_strings(extensions.get(action, []), f'extensions.{action}'):
+            if action == 'media':
+                rules.extend([f'movie:{extension} media', f'season:{extension} media'])
+            else:
+                rules.append(f'{extension} {action}')
+    rules.extend(_check_strings(content.get('rules', []), 'rules'))
+
+    templates = dict(PLEX_TEMPLATES)
+    _check_keys(content.get('templates', {}), frozenset(PLEX_TEMPLATES), 'templates')
+    templates.update(content.get('templates', {}))
+    try:
+        templates = compile_templates(templates, TEMPLATE_DEPTHS)
+    except ParserException as e:
+        raise ParserException(f'Invalid config: {e}')
+
+    years = content.get('years', {})
+    _check_keys(years, YEAR_KEYS, 'years')
+    min_year = _check_positive(years.get('min', MIN_MOVIE_YEAR), 'years.min')
+    max_year = years.get('max')
+    if max_year is not None and _check_positive(max_year, 'years.max') < min_year:
+        raise ParserException('Invalid config: years.max is before years.min')
+
+    concurrency = content.get('concurrency', {})
+    _check_keys(concurrency, CONCURRENCY_KEYS, 'concurrency')
+    limits = {key: _check_positive(value, f'concurrency.{key}') for key, value in concurrency.items()}
+
+    return LibraryConfig(path, roots, compile_rules(rules), templates, min_year, max_year, **limits)
+
+
+def _read_cached_config(cache_path: str, key: tuple) -> Optional[LibraryConfig]:
+    import pickle
+
+    try:
+        with open(cache_path, 'rb') as f:
+            cached = pickle.load(f)
+        if cached[0] == key:
+            return cached[1]
+    except Exception:
+        pass
+    return None
+
+
+def _write_cached_config(cache_path: str, key: tuple, config: LibraryConfig):
+    import pickle
+
+    temporary_path = f'{cache_path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(temporary_path, 'wb') as f:
+            pickle.dump((key, config), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, cache_path)
+    except Exception:
+        # The cache only saves time, a config that can not be cached is compiled again next time
+        try:
+            os.remove(temporary_path)
+        except OSError:
+            pass
+
+
+def load_config(path: str, use_cache: bool = True) -> LibraryConfig:
+    """
+    Loads a TOML config file.
+
+    The compiled settings are cached next to the scan index, keyed on the path, mtime and size of the config file, so
+    repeated runs with an unchanged config skip parsing, validation and rule compilation.
+
+    :param path: The config file.
+    :param use_cache: Read and write the compiled settings cache.
+
+    :return: The compiled settings.
+    """
+    path = os.path.abspath(path)
+    try:
+        stat = os.stat(path)
+    except Exception as e:
+        raise FileException(str(e))
+
+    key = (path, stat.st_mtime_ns, stat.st_size, __version__, CONFIG_CACHE_VERSION)
+    cache_path = extract_config_cache_path(path)
+    if use_cache:
+        config = _read_cached_config(cache_path, key)
+        if config is not None:
+            return config
+
+    try:
+        import tomllib
+    except ImportError:
+        raise FileException('Reading a config file needs Python 3.11 or newer')
+    try:
+        with open(path, 'rb') as f:
+            content = tomllib.load(f)
+    except tomllib.TOMLDecodeError as e:
+        raise ParserException(f'Invalid config: {path}: {e}')
+    except Exception as e:
+        raise FileException(str(e))
+
+    config = compile_config(content, path)
+    if use_cache:
+        _write_cached_config(cache_path, key, config)
+    return config
+
+
+def load_library_config(directory: str, config_path: Optional[str] = None) -> LibraryConfig:
+    """
+    Loads the settings of a library, looked up the same way for every library of a multi root run.
+
+    :param directory: The library directory.
+    :param config_path: Config file given on the command line, it is used for every library if given.
+
+    :return: The settings of the library, the defaults if it has no config file.
+    """
+    config_path = config_path or find_config_path(directory)
+    return load_config(config_path) if config_path else default_config()
+
+
+_active_config = None  # type: Optional[LibraryConfig]
+
+
+def get_config() -> LibraryConfig:
+    """
+    Returns the settings applied by ``apply_config``, the defaults if none were applied.
+
+    :return: The settings.
+    """
+    global _active_config
+    if _active_config is None:
+        _active_config = default_config()
+    return _active_config
+
+
+def apply_config(config: Optional[LibraryConfig]):
+    """
+    Makes settings the ones used by the planners and the name parser.
+
+    :param config: The settings, None goes back to the defaults.
+    """
+    global _active_config
+    _active_config = config
+    config = get_config()
+    set_rules(config.rules)
+    set_year_bounds(config.min_year, config.max_year)
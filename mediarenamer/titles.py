@@ -0,0 +1,382 @@
+import os
+import re
+import sys
+import mmap
+import struct
+import unicodedata
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from .exceptions import FileException, ParserException
+
+# Bumped whenever the layout of the index file changes
+TITLE_INDEX_VERSION = 1
+TITLE_INDEX_MAGIC = b'MRTI'
+
+MOVIE = 'movie'
+SHOW = 'show'
+# Title types of an IMDb title.basics.tsv dump that are indexed, and what they are indexed as
+TITLE_TYPES = {
+    'movie': MOVIE,
+    'tvMovie': MOVIE,
+    'tvSeries': SHOW,
+    'tvMiniSeries': SHOW,
+}
+KIND_CODES = {MOVIE: 1, SHOW: 2}
+KIND_NAMES = {code: kind for kind, code in KIND_CODES.items()}
+
+# Header: magic, version, record count, trigram count, record, trigram, posting and string section offsets
+HEADER = struct.Struct('<4sIIIQQQQ')
+# Record: key offset, key length, title offset, title length, year, kind, sorted by key
+RECORD = struct.Struct('<IHIHHBx')
+# Trigram: trigram, first posting, posting count, sorted by trigram
+TRIGRAM = struct.Struct('<III')
+
+# Share of the trigrams of the longer of two keys they need to have in common for a fuzzy match
+MIN_TITLE_SIMILARITY = 0.6
+# Largest number of candidates a fuzzy lookup verifies
+MAX_FUZZY_CANDIDATES = 20000
+# Largest difference between a parsed year and the year of a matched title
+MAX_YEAR_DISTANCE = 1
+
+NORMALIZE_PATTERN = re.compile(r'[^a-z0-9]+')
+
+
+class TitleMatch(NamedTuple):
+    """
+    Canonical title found for a parsed name.
+    """
+    title: str
+    year: Optional[int]
+    kind: str
+    score: float
+
+
+def normalize_title(title: str) -> str:
+    """
+    Normalizes a title into its lookup key, accents and punctuation are dropped and words are separated by one space.
+
+    :param title: The title, e.g. ``Amélie: The Movie``.
+
+    :return: The lookup key, e.g. ``amelie the movie``.
+    """
+    title = unicodedata.normalize('NFKD', title.replace('&', ' and ')).encode('ascii', 'ignore').decode('ascii')
+    return NORMALIZE_PATTERN.sub(' ', title.lower()).strip()
+
+
+def extract_trigrams(key: str) -> set:
+    """
+    Extracts the trigrams of a lookup key, padded so the start and end of the key count as well.
+
+    :param key: The lookup key.
+
+    :return: Set of trigrams packed into integers.
+    """
+    padded = f'  {key} '.encode('ascii')
+    return set(int.from_bytes(padded[index:index + 3], 'big') for index in range(len(padded) - 2))
+
+
+def extract_title_index_path() -> str:
+    """
+    Extracts the default path of the title index.
+
+    :return: Path of the title index.
+    """
+    cache_directory = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_directory, 'mediarenamer', 'titles.idx')
+
+
+def _iter_title_basics(tsv_path: str) -> Iterator[Tuple[str, str, Optional[int], str]]:
+    if tsv_path.endswith('.gz'):
+        import gzip
+        f = gzip.open(tsv_path, 'rt', encoding='utf-8', newline='\n')
+    else:
+        f = open(tsv_path, 'r', encoding='utf-8', newline='\n')
+    with f:
+        columns = f.readline().rstrip('\n').split('\t')
+        try:
+            type_column, primary_column, original_column, adult_column, year_column = (
+                columns.index(name) for name in ('titleType', 'primaryTitle', 'originalTitle', 'isAdult', 'startYear'))
+        except ValueError:
+            raise ParserException(f'Invalid title dump: {tsv_path}, expected the title.basics.tsv columns')
+        width = len(columns)
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) != width:
+                continue
+            kind = TITLE_TYPES.get(fields[type_column])
+            if kind is None or fields[adult_column] == '1':
+                continue
+            year = int(fields[year_column]) if fields[year_column].isdigit() else None
+            title = fields[primary_column]
+            yield normalize_title(title), title, year, kind
+            original_key = normalize_title(fields[original_column])
+            if original_key and original_key != normalize_title(title):
+                yield original_key, title, year, kind
+
+
+def build_title_index(tsv_path: str, index_path: Optional[str] = None) -> int:
+    """
+    Builds the title index from a local IMDb ``title.basics.tsv`` dump, gzipped or not.
+
+    Movies and series are indexed under their primary and original titles, both leading to the primary title. The
+    index is written to a temporary file and moved into place, so a running lookup never sees a partial index.
+
+    :param tsv_path: The title dump.
+    :param index_path: The index file, the one in the user cache directory is used if not given.
+
+    :return: Number of indexed titles.
+    """
+    from array import array
+
+    index_path = index_path or extract_title_index_path()
+    try:
+        entries = sorted(set((key.encode('ascii'), title.encode('utf-8'), year or 0, KIND_CODES[kind])
+                             for key, title, year, kind in _iter_title_basics(tsv_path) if key))
+    except ParserException:
+        raise
+    except Exception as e:
+        raise FileException(str(e))
+
+    strings = bytearray()
+    string_offsets = {}  # type: Dict[bytes, int]
+
+    def _string(value: bytes) -> int:
+        offset = string_offsets.get(value)
+        if offset is None:
+            offset = string_offsets[value] = len(strings)
+            strings.extend(value)
+        return offset
+
+    records = bytearray(RECORD.size * len(entries))
+    postings = {}  # type: Dict[int, array]
+    for record_id, (key, title, year, kind) in enumerate(entries):
+        RECORD.pack_into(records, record_id * RECORD.size, _string(key), len(key), _string(title), len(title),
+                         year, kind)
+        for trigram in extract_trigrams(key.decode('ascii')):
+            postings.setdefault(trigram, array('I')).append(record_id)
+
+    trigrams = bytearray(TRIGRAM.size * len(postings))
+    posting_ids = array('I')
+    for position, trigram in enumerate(sorted(postings)):
+        TRIGRAM.pack_into(trigrams, position * TRIGRAM.size, trigram, len(posting_ids), len(postings[trigram]))
+        posting_ids.extend(postings[trigram])
+    if posting_ids.itemsize != 4:
+        raise FileException('Unsupported platform, 32 bit unsigned integers are needed to write the title index')
+    if sys.byteorder != 'little':
+        posting_ids.byteswap()
+
+    records_offset = HEADER.size
+    trigrams_offset = records_offset + len(records)
+    postings_offset = trigrams_offset + len(trigrams)
+    strings_offset = postings_offset + len(posting_ids) * 4
+    temporary_path = f'{index_path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+        with open(temporary_path, 'wb') as f:
+            f.write(HEADER.pack(TITLE_INDEX_MAGIC, TITLE_INDEX_VERSION, len(entries), len(postings), records_offset,
+                                trigrams_offset, postings_offset, strings_offset))
+            f.write(records)
+            f.write(trigrams)
+            posting_ids.tofile(f)
+            f.write(strings)
+        os.replace(temporary_path, index_path)
+    except Exception as e:
+        try:
+            os.remove(temporary_path)
+        except OSError:
+            pass
+        raise FileException(str(e))
+    return len(entries)
+
+
+class TitleIndex(object):
+    """
+    Read only title index, memory mapped and searched in place.
+
+    Records are sorted by their lookup key, so exact and prefix lookups are a binary search over the mapped records.
+    Fuzzy lookups go through the trigram posting lists, only the rarest trigrams of the query are read to collect
+    candidates and every candidate is then scored on the trigrams of its key.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        :param path: The index file, the one in the user cache directory is used if not given.
+        """
+        self.path = path or extract_title_index_path()
+        try:
+            with open(self.path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                self._mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception as e:
+            raise FileException(str(e))
+        self.fingerprint = f'{os.path.abspath(self.path)}:{stat.st_size}:{stat.st_mtime_ns}'
+        try:
+            magic, version, self._count, trigram_count, self._records, trigrams, self._postings, self._strings = \
+                HEADER.unpack_from(self._mapped, 0)
+        except struct.error:
+            magic = version = None
+        if magic != TITLE_INDEX_MAGIC or version != TITLE_INDEX_VERSION:
+            self._mapped.close()
+            raise ParserException(f'Invalid title index: {self.path}, build it again')
+        # The trigram table is small, a dictionary of it saves a binary search per trigram of every fuzzy lookup
+        values = struct.unpack_from(f'<{trigram_count * 3}I', self._mapped, trigrams)
+        self._trigrams = {values[index]: (values[index + 1], values[index + 2])
+                          for index in range(0, len(values), 3)}
+
+    def __enter__(self) -> 'TitleIndex':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self):
+        self._mapped.close()
+
+    def _record(self, record_id: int) -> Tuple[int, int, int, int, int, int]:
+        return RECORD.unpack_from(self._mapped, self._records + record_id * RECORD.size)
+
+    def _key(self, record_id: int) -> bytes:
+        key_offset, key_length = RECORD.unpack_from(self._mapped, self._records + record_id * RECORD.size)[:2]
+        start = self._strings + key_offset
+        return self._mapped[start:start + key_length]
+
+    def _match(self, record_id: int, score: float) -> TitleMatch:
+        _, _, title_offset, title_length, year, kind = self._record(record_id)
+        start = self._strings + title_offset
+        return TitleMatch(self._mapped[start:start + title_length].decode('utf-8'), year or None, KIND_NAMES[kind],
+                          score)
+
+    def _bisect(self, key: bytes) -> int:
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def prefix(self, text: str, kind: Optional[str] = None, limit: int = 10) -> List[TitleMatch]:
+        """
+        Finds the titles whose lookup key starts with the normalized text.
+
+        :param text: The start of a title.
+        :param kind: Only find titles of this kind, movie or show.
+        :param limit: Largest number of titles returned.
+
+        :return: List of titles in lookup key order.
+        """
+        key = normalize_title(text).encode('ascii')
+        matches = []
+        record_id = self._bisect(key)
+        while record_id < self._count and len(matches) < limit and self._key(record_id).startswith(key):
+            match = self._match(record_id, 1.0)
+            if kind is None or match.kind == kind:
+                matches.append(match)
+            record_id += 1
+        return matches
+
+    def _fuzzy_candidates(self, trigrams: set) -> set:
+        postings = sorted((self._trigrams[trigram] for trigram in trigrams if trigram in self._trigrams),
+                          key=lambda posting: posting[1])
+        # A key sharing enough trigrams with the query has to be in at least one of the rarest lists
+        required = max(1, int(len(trigrams) * MIN_TITLE_SIMILARITY + 0.999))
+        candidates = set()
+        for first, count in postings[:max(0, len(trigrams) - required + 1)]:
+            if len(candidates) + count > MAX_FUZZY_CANDIDATES:
+                break
+            candidates.update(struct.unpack_from(f'<{count}I', self._mapped, self._postings + first * 4))
+        return candidates
+
+    def match(self, title: str, year: Optional[int] = None, kind: Optional[str] = None,
+              fuzzy: bool = True) -> Optional[TitleMatch]:
+        """
+        Finds the canonical title of a parsed name.
+
+        A title with the same lookup key wins, otherwise the title whose key shares the most trigrams with the lookup
+        key, as long as they share at least ``MIN_TITLE_SIMILARITY`` of them. Titles more than ``MAX_YEAR_DISTANCE``
+        years off the given year never match, between equally good titles the closest year wins.
+
+        :param title: The parsed title.
+        :param year: The parsed year, any year matches if not given.
+        :param kind: Only match titles of this kind, movie or show.
+        :param fuzzy: Also look for similar titles, only a title with the same lookup key matches otherwise.
+
+        :return: The canonical title, None if no title is close enough.
+        """
+        key = normalize_title(title)
+        if not key:
+            return None
+
+        def _acceptable(match: TitleMatch) -> bool:
+            if kind is not None and match.kind != kind:
+                return False
+            return year is None or match.year is None or abs(match.year - year) <= MAX_YEAR_DISTANCE
+
+        def _best(matches: List[TitleMatch]) -> Optional[TitleMatch]:
+            matches = [match for match in matches if _acceptable(match)]
+            if not matches:
+                return None
+            return min(matches, key=lambda match: (-match.score, abs((match.year or 0) - (year or match.year or 0)),
+                                                   match.year or 0))
+
+        encoded_key = key.encode('ascii')
+        exact = []
+        record_id = self._bisect(encoded_key)
+        while record_id < self._count and self._key(record_id) == encoded_key:
+            exact.append(self._match(record_id, 1.0))
+            record_id += 1
+        best = _best(exact)
+        if best is not None or not fuzzy:
+            return best
+
+        trigrams = extract_trigrams(key)
+        scored = []
+        for candidate in self._fuzzy_candidates(trigrams):
+            candidate_trigrams = extract_trigrams(self._key(candidate).decode('ascii'))
+            score = len(trigrams & candidate_trigrams) / max(len(trigrams), len(candidate_trigrams))
+            if score >= MIN_TITLE_SIMILARITY:
+                scored.append(self._match(candidate, score))
+        return _best(scored)
+
+
+_title_index = None  # type: Optional[TitleIndex]
+
+
+def get_title_index() -> Optional[TitleIndex]:
+    """
+    Returns the title index names are snapped to, None if titles are taken from the names as they are.
+
+    :return: The title index.
+    """
+    return _title_index
+
+
+def set_title_index(title_index: Optional[TitleIndex]):
+    """
+    Replaces the title index returned by ``get_title_index``.
+
+    :param title_index: The title index, None stops snapping names to canonical titles.
+    """
+    global _title_index
+    _title_index = title_index
+
+
+def snap_title(title: str, year: Optional[int] = None, kind: Optional[str] = None,
+               fuzzy: bool = True) -> Optional[TitleMatch]:
+    """
+    Finds the canonical title of a parsed name in the active title index.
+
+    :param title: The parsed title.
+    :param year: The parsed year.
+    :param kind: Only match titles of this kind, movie or show.
+    :param fuzzy: Also look for similar titles, see ``TitleIndex.match``.
+
+    :return: The canonical title, None if there is no title index or no title is close enough.
+    """
+    if _title_index is None or not title:
+        return None
+    return _title_index.match(title, year, kind, fuzzy)
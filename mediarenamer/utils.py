@@ -1,13 +1,196 @@
 from datetime import datetime
-import sys
+import os
 import re
-from typing import Optional, List
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Sequence
 
-try:
-    from .exceptions import MediaRenamerException, ParserException
-except ImportError:
-    sys.path.append('./')
-    from exceptions import MediaRenamerException, ParserException
+from .config import MIN_MOVIE_YEAR
+from .exceptions import MediaRenamerException, ParserException
+
+
+SEASON_PATTERN = re.compile(r'(?:Season\s*|S)(\d+)', re.IGNORECASE)
+EPISODE_PATTERN = re.compile(r'(?:Episode\s*|E|Part\s*)(\d+)', re.IGNORECASE)
+YEAR_PATTERN = re.compile(r'\b(\d{4})\b')
+SHOW_YEAR_PATTERN = re.compile(r'\((\d+)\)')
+SHOW_NAME_END_PATTERN = re.compile(r'[\s._\-\[(]*(?:\b(?:Season\s*|S)\d+|\b(?:Episode|Part)\s*\d+|\b(?:19|20)\d{2}\b|\(\d+\)).*',
+                                   re.IGNORECASE)
+EPISODE_TITLE_PATTERN = re.compile(r'\bS\d+\s*E\d+\s+-\s+(.+)$', re.IGNORECASE)
+RELEASE_TAG_PATTERN = re.compile(r'\s*[\[(][^\[\]()]*\b\d{3,4}p\b[^\[\]()]*[\])]\s*$', re.IGNORECASE)
+MAX_EXTENSION_LENGTH = 5
+SHOW_NAME_SEPARATORS = str.maketrans({'.': ' ', '_': ' '})
+
+# Batches of at least this many names are parsed on a process pool when the number of workers is not given
+PARSE_PROCESS_THRESHOLD = 20000
+PARSE_CHUNK_SIZE = 4096
+# File names can not contain NUL, so a chunk of names is sent to a worker as one joined string
+NAME_SEPARATOR = '\0'
+
+
+class ParsedName(NamedTuple):
+    """
+    Structured record of everything extracted from a single file or directory name.
+    """
+    name: str
+    show: Optional[str]
+    season: Optional[str]
+    episode: Optional[str]
+    year: Optional[str]
+    extension: Optional[str]
+
+
+class FilenameParser(object):
+    """
+    Extracts show name, season, episode, year and extension from file and directory names.
+
+    All patterns are compiled once at import time and the upper year bound is taken once when the parser is created,
+    so parsing a name is a handful of regex searches without any other per call setup.
+    """
+
+    __slots__ = ('min_year', 'max_year', '_season', '_episode', '_year')
+
+    def __init__(self, min_year: int = MIN_MOVIE_YEAR, max_year: Optional[int] = None):
+        """
+        :param min_year: Oldest year accepted as a movie year.
+        :param max_year: Newest year accepted as a movie year, the current year if not given.
+        """
+        self.min_year = min_year
+        self.max_year = max_year if max_year is not None else datetime.now().year
+        self._season = SEASON_PATTERN.search
+        self._episode = EPISODE_PATTERN.search
+        self._year = YEAR_PATTERN.search
+
+    def season(self, name: str) -> Optional[str]:
+        match = self._season(name)
+        return match.group(1) if match else None
+
+    def episode(self, name: str) -> Optional[str]:
+        match = self._episode(name)
+        return match.group(1) if match else None
+
+    def year(self, name: str) -> Optional[str]:
+        match = self._year(name)
+        if match:
+            year = match.group(1)
+            if self.min_year <= int(year) <= self.max_year:
+                return year
+        return None
+
+    def show(self, name: str) -> Optional[str]:
+        show = SHOW_NAME_END_PATTERN.sub('', name, count=1).translate(SHOW_NAME_SEPARATORS)
+        show = ' '.join(show.split()).strip(' -')
+        return show or None
+
+    def episode_title(self, stem: str) -> Optional[str]:
+        match = EPISODE_TITLE_PATTERN.search(stem)
+        if not match:
+            return None
+        title = RELEASE_TAG_PATTERN.sub('', match.group(1)).strip(' -')
+        return title or None
+
+    def parse(self, name: str) -> ParsedName:
+        """
+        Parses a single name.
+
+        :param name: The file or directory name.
+
+        :return: The parsed record.
+        """
+        stem, separator, extension = name.rpartition('.')
+        if not separator or not stem or len(extension) > MAX_EXTENSION_LENGTH or not extension.isalnum() \
+                or extension.isdigit():
+            stem, extension = name, None
+        return ParsedName(name, self.show(stem), self.season(name), self.episode(name), self.year(name), extension)
+
+    def parse_many(self, names: Iterable[str]) -> List[ParsedName]:
+        """
+        Parses a batch of names in one pass.
+
+        :param names: The file or directory names.
+
+        :return: List of parsed records in the order of the names.
+        """
+        return [self.parse(name) for name in names]
+
+    def iter_parse(self, names: Iterable[str]) -> Iterator[ParsedName]:
+        """
+        Lazily parses a stream of names.
+
+        :param names: The file or directory names.
+
+        :return: Iterator of parsed records.
+        """
+        return map(self.parse, names)
+
+
+DEFAULT_PARSER = FilenameParser()
+
+
+def set_year_bounds(min_year: int = MIN_MOVIE_YEAR, max_year: Optional[int] = None):
+    """
+    Replaces the parser used by the extract functions with one accepting movie years between the bounds.
+
+    :param min_year: Oldest year accepted as a movie year.
+    :param max_year: Newest year accepted as a movie year, the current year if not given.
+    """
+    global DEFAULT_PARSER
+    DEFAULT_PARSER = FilenameParser(min_year, max_year)
+
+
+def _parse_chunk(chunk: str) -> List[tuple]:
+    parse = DEFAULT_PARSER.parse
+    return [parse(name)[1:] for name in chunk.split(NAME_SEPARATOR)]
+
+
+_pool_context = None
+
+
+def _get_pool_context():
+    # Pools are started from inside the walker threads. Forking a process that runs threads can copy a lock another
+    # thread holds, e.g. the logging or sqlite one, and hang the child on it, so workers come from a fork server or
+    # are spawned. The context is created once and its fork server shared by every pool.
+    global _pool_context
+    if _pool_context is None:
+        import multiprocessing
+        methods = multiprocessing.get_all_start_methods()
+        _pool_context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+    return _pool_context
+
+
+def parse_names(names: Sequence[str], workers: Optional[int] = None, chunk_size: int = PARSE_CHUNK_SIZE,
+                threshold: int = PARSE_PROCESS_THRESHOLD, parser: Optional[FilenameParser] = None) -> List[ParsedName]:
+    """
+    Parses a batch of names, on a process pool for very large batches.
+
+    Names are sent to the workers in chunks joined into a single string and the workers send back plain tuples
+    without the name, which keeps the pickling cost a small fraction of the parsing work.
+
+    :param names: The file or directory names.
+    :param workers: Number of worker processes, 1 parses in this process. When not given a pool of one worker per
+        CPU is used for batches of at least ``threshold`` names.
+    :param chunk_size: Number of names sent to a worker at once.
+    :param threshold: Smallest batch parsed on a process pool when workers is not given.
+    :param parser: Parser with the year bounds of the library, the one set by ``set_year_bounds`` if not given.
+
+    :return: List of parsed records in the order of the names.
+    """
+    parser = parser or DEFAULT_PARSER
+    if workers is None:
+        workers = (os.cpu_count() or 1) if len(names) >= threshold else 1
+    if workers <= 1 or len(names) <= chunk_size:
+        return parser.parse_many(names)
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    chunks = [NAME_SEPARATOR.join(names[start:start + chunk_size]) for start in range(0, len(names), chunk_size)]
+    fields = []
+    try:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=_get_pool_context(),
+                                 initializer=set_year_bounds,
+                                 initargs=(parser.min_year, parser.max_year)) as executor:
+            for chunk_fields in executor.map(_parse_chunk, chunks):
+                fields.extend(chunk_fields)
+    except Exception as e:
+        raise ParserException(str(e))
+    return [ParsedName(name, *name_fields) for name, name_fields in zip(names, fields)]
 
 
 def extract_season_number_from_directory_name(directory_name: str) -> Optional[str]:
@@ -19,10 +202,7 @@ def extract_season_number_from_directory_name(directory_name: str) -> Optional[s
     :return: The season number.
     """
     try:
-        match = re.search(r'(?:Season\s*|S)(\d+)', directory_name, re.IGNORECASE)
-        if match:
-            return match.group(1)
-        return None
+        return DEFAULT_PARSER.season(directory_name)
     except Exception as e:
         raise ParserException(str(e))
 
@@ -36,10 +216,24 @@ def extract_episode_number_from_file_name(file_name: str) -> Optional[str]:
     :return: The episode number.
     """
     try:
-        match = re.search(r'(?:Episode\s*|E|Part\s*)(\d+)', file_name, re.IGNORECASE)
-        if match:
-            return match.group(1)
-        return None
+        return DEFAULT_PARSER.episode(file_name)
+    except Exception as e:
+        raise ParserException(str(e))
+
+
+def extract_episode_title_from_file_name(file_name: str) -> Optional[str]:
+    """
+    Extracts the episode title from a file name in the ``Show - S01E01 - Title.ext`` form.
+
+    :param file_name: The file name.
+
+    :return: The episode title.
+    """
+    try:
+        stem, separator, extension = file_name.rpartition('.')
+        if not separator or len(extension) > MAX_EXTENSION_LENGTH:
+            stem = file_name
+        return DEFAULT_PARSER.episode_title(stem)
     except Exception as e:
         raise ParserException(str(e))
 
@@ -53,8 +247,7 @@ def extract_show_year_from_directory_name(directory_name: str) -> Optional[str]:
     :return: The tv show year.
     """
     try:
-        pattern = re.compile(r"\((\d+)\)")
-        numbers = pattern.findall(directory_name)
+        numbers = SHOW_YEAR_PATTERN.findall(directory_name)
         if not numbers:
             return None
         if len(numbers) == 0:
@@ -78,8 +271,7 @@ def extract_show_name_from_directory_basename(directory_basename:str) -> Optiona
         if not directory_basename:
             return None
 
-        pattern = re.compile(r"\((\d+)\)")
-        numbers = pattern.findall(directory_basename)
+        numbers = SHOW_YEAR_PATTERN.findall(directory_basename)
         if len(numbers) > 0:
             show_year = numbers[0]
         else:
@@ -99,22 +291,15 @@ def extract_show_name_from_directory_basename(directory_basename:str) -> Optiona
         raise ParserException(str(e))
 
 
-def extract_movie_year_from_string(movie_string: str) -> Optional[str]:
+def extract_movie_year_from_string(movie_string: str, parser: Optional[FilenameParser] = None) -> Optional[str]:
     """
     Extracts the movie year from a movie string.
 
     :param movie_string:
+    :param parser: Parser with the year bounds of the library, the one set by ``set_year_bounds`` if not given.
     :return:
     """
     try:
-        match = re.search(r'\b(\d{4})\b', movie_string)
-        if match:
-            year = match.group(1)
-            if int(year) < 1950 or int(year) > datetime.now().year:
-                return None
-            else:
-                return year
-        return None
-
+        return (parser or DEFAULT_PARSER).year(movie_string)
     except Exception as e:
         raise ParserException(str(e))
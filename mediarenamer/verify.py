@@ -0,0 +1,225 @@
+import os
+import struct
+from typing import Callable, Iterable, List, NamedTuple, Optional
+
+from .config import DEFAULT_JOBS
+from .exceptions import FileException, ParserException
+from .metrics import METRICS
+from .probe import MATROSKA, MP4, MP4_TOP_LEVEL_BOXES, EBML_ID, SEGMENT_ID, SEEK_HEAD_ID, INFO_ID, TRACKS_ID, \
+    CLUSTER_ID, read_ebml_id, read_ebml_size, ebml_elements, parse_matroska_seek_head
+
+# Bytes read from the start and the end of a file, a single positioned read each
+HEAD_READ_SIZE = 64 * 1024
+TAIL_READ_SIZE = 64 * 1024
+# A file ending in this many zero bytes may have been preallocated by a download client and never finished. Valid
+# files end in zero padding as well, e.g. an MP4 with a trailing free box, so it is only reported as a warning.
+ZERO_TAIL_SIZE = 4096
+# Fragmented MP4 files have a box pair per fragment, the chain is not followed further than this
+MAX_MP4_BOXES = 4096
+
+CUES_ID = 0x1C53BB6B
+TAGS_ID = 0x1254C367
+CHAPTERS_ID = 0x1043A770
+ATTACHMENTS_ID = 0x1941A469
+VOID_ID = 0xEC
+# Elements that can follow a cluster at the top level of a Matroska segment
+MATROSKA_TOP_LEVEL_IDS = frozenset([SEEK_HEAD_ID, INFO_ID, TRACKS_ID, CLUSTER_ID, CUES_ID, TAGS_ID, CHAPTERS_ID,
+                                    ATTACHMENTS_ID, VOID_ID])
+CLUSTER_ID_BYTES = CLUSTER_ID.to_bytes(4, 'big')
+
+
+class VerifyResult(NamedTuple):
+    """
+    Outcome of the integrity check of a media file.
+    """
+    path: str
+    size: int
+    container: Optional[str]
+    error: Optional[str]
+    warning: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        """
+        Whether the container framing is complete, files of other containers are never checked and always ok.
+        """
+        return self.error is None
+
+
+def _advise(fd: int, offset: int, length: int, advice: str):
+    if not hasattr(os, 'posix_fadvise') or not hasattr(os, advice):
+        return
+    try:
+        os.posix_fadvise(fd, offset, length, getattr(os, advice))
+    except OSError:
+        pass
+
+
+def _pread(fd: int, length: int, offset: int) -> bytes:
+    with METRICS.timed('pread'):
+        return os.pread(fd, length, offset)
+
+
+def _check_matroska(fd: int, size: int, head: bytes, tail: bytes) -> Optional[str]:
+    view = memoryview(head)
+    end = len(head)
+    _, position = read_ebml_id(view, 0, end)
+    header_size, position = read_ebml_size(view, position, end)
+    if header_size is None or position + header_size >= end:
+        return 'EBML header is cut off'
+    element_id, position = read_ebml_id(view, position + header_size, end)
+    if element_id != SEGMENT_ID:
+        return 'Missing Matroska segment'
+    segment_size, segment_start = read_ebml_size(view, position, end)
+    if segment_size is not None and segment_start + segment_size > size:
+        return f'Matroska segment ends at byte {segment_start + segment_size}, the file has {size} bytes'
+
+    # Muxers write the cues and tags after the last cluster and point the seek head at them, a file that was cut
+    # short has nothing or the wrong element at those positions
+    seek_positions = {}
+    for element_id, data_start, data_end in ebml_elements(view, segment_start, end):
+        if element_id == SEEK_HEAD_ID:
+            seek_positions = parse_matroska_seek_head(view, data_start, data_end)
+            break
+        if element_id == CLUSTER_ID:
+            break
+    for element_id, seek_position in sorted(seek_positions.items(), key=lambda item: item[1]):
+        position = segment_start + seek_position
+        element_bytes = element_id.to_bytes((element_id.bit_length() + 7) // 8, 'big')
+        if position + len(element_bytes) > size:
+            return f'Matroska seek head points past the end of the file at byte {position}'
+        found = head[position:position + len(element_bytes)] if position + len(element_bytes) <= end \
+            else _pread(fd, len(element_bytes), position)
+        if found != element_bytes:
+            return f'Matroska seek head entry {element_id:X} at byte {position} points at other data'
+
+    if segment_size is None:
+        # Without a segment size only the final cluster tells whether the file ends where the muxer stopped
+        tail_start = size - len(tail)
+        tail_view = memoryview(tail)
+        index = tail.rfind(CLUSTER_ID_BYTES)
+        while index >= 0:
+            try:
+                cluster_size, data_start = read_ebml_size(tail_view, index + 4, len(tail))
+            except (IndexError, ParserException):
+                index = tail.rfind(CLUSTER_ID_BYTES, 0, index)
+                continue
+            if cluster_size is None:
+                break
+            cluster_end = tail_start + data_start + cluster_size
+            if cluster_end > size:
+                return f'Final Matroska cluster ends at byte {cluster_end}, the file has {size} bytes'
+            if cluster_end < size:
+                next_id, _ = read_ebml_id(tail_view, cluster_end - tail_start, len(tail))
+                if next_id not in MATROSKA_TOP_LEVEL_IDS:
+                    return f'Unexpected data after the final Matroska cluster at byte {cluster_end}'
+            break
+    return None
+
+
+def _check_mp4(fd: int, size: int, head: bytes) -> Optional[str]:
+    position = 0
+    found_moov = False
+    for _ in range(MAX_MP4_BOXES):
+        if position >= size:
+            break
+        header = head[position:position + 16] if position + 16 <= len(head) else _pread(fd, 16, position)
+        if len(header) < 8:
+            return f'MP4 box header at byte {position} is cut off'
+        box_size, box_type = struct.unpack_from('>I4s', header)
+        if box_size == 1:
+            if len(header) < 16:
+                return f'MP4 box header at byte {position} is cut off'
+            box_size = struct.unpack_from('>Q', header, 8)[0]
+        elif box_size == 0:
+            box_size = size - position
+        if box_size < 8:
+            return f'Invalid MP4 box size at byte {position}'
+        if position + box_size > size:
+            return f'MP4 {box_type.decode("latin-1")} box ends at byte {position + box_size}, the file has {size} bytes'
+        found_moov = found_moov or box_type == b'moov'
+        position += box_size
+    else:
+        return None
+    if not found_moov:
+        return 'Missing MP4 movie box'
+    return None
+
+
+def check_file(file_name: str) -> VerifyResult:
+    """
+    Checks the container framing of a Matroska or MP4 file without reading the media data.
+
+    A Matroska file is checked against the segment size in its header, the elements its seek head points at and, for
+    files written without a segment size, the final cluster. An MP4 file is checked by following the top level box
+    chain to the end of the file. The head and the tail are read with one positioned read each, the kernel is told up
+    front so both are fetched at once and nothing else of the file is read ahead.
+
+    :param file_name: The media file.
+
+    :return: The check result, files of other containers are not checked.
+    """
+    try:
+        fd = os.open(file_name, os.O_RDONLY)
+    except Exception as e:
+        raise FileException(str(e))
+    try:
+        size = os.fstat(fd).st_size
+        _advise(fd, 0, 0, 'POSIX_FADV_RANDOM')
+        _advise(fd, 0, HEAD_READ_SIZE, 'POSIX_FADV_WILLNEED')
+        _advise(fd, max(0, size - TAIL_READ_SIZE), TAIL_READ_SIZE, 'POSIX_FADV_WILLNEED')
+        head = _pread(fd, HEAD_READ_SIZE, 0)
+        if head[:4] == EBML_ID.to_bytes(4, 'big'):
+            container = MATROSKA
+        elif head[4:8] in MP4_TOP_LEVEL_BOXES:
+            container = MP4
+        else:
+            return VerifyResult(file_name, size, None, None)
+        tail = head[-TAIL_READ_SIZE:] if size <= HEAD_READ_SIZE else _pread(fd, TAIL_READ_SIZE, size - TAIL_READ_SIZE)
+
+        try:
+            if container == MATROSKA:
+                error = _check_matroska(fd, size, head, tail)
+            else:
+                error = _check_mp4(fd, size, head)
+        except (IndexError, struct.error, ParserException) as e:
+            error = f'Corrupt {container} header, {e}'
+        warning = None
+        if error is None and size >= ZERO_TAIL_SIZE and not tail[-ZERO_TAIL_SIZE:].strip(b'\0'):
+            warning = f'File ends in {ZERO_TAIL_SIZE} zero bytes, the download may not have finished'
+        return VerifyResult(file_name, size, container, error, warning)
+    except OSError as e:
+        raise FileException(str(e))
+    finally:
+        os.close(fd)
+
+
+def verify_files(files: Iterable[str], jobs: int = DEFAULT_JOBS,
+                 on_error: Optional[Callable[[Exception], None]] = None) -> List[VerifyResult]:
+    """
+    Checks the container framing of media files on a thread pool.
+
+    :param files: The media files.
+    :param jobs: Number of files checked in parallel.
+    :param on_error: Called with the error when a file can not be read, the file is left out.
+
+    :return: List of check results, in the order of the files.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def _check(file_name: str):
+        try:
+            return check_file(file_name), None
+        except FileException as e:
+            return None, e
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, jobs), thread_name_prefix='verify') as executor:
+        for result, error in executor.map(_check, files):
+            if error is None:
+                results.append(result)
+            elif on_error is None:
+                raise error
+            else:
+                on_error(error)
+    return results
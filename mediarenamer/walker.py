@@ -0,0 +1,353 @@
+import os
+import logging
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from .config import DEFAULT_JOBS, DEFAULT_JOBS_PER_DEVICE, PARTIAL_FILE_EXTENSIONS
+from .exceptions import DirectoryScanException
+from .metrics import METRICS
+
+
+def normalize_path(path: str) -> str:
+    """
+    Normalizes a path so that two spellings of the same location compare equal.
+
+    :param path: The path to normalize.
+
+    :return: The normalized path.
+    """
+    return os.path.normcase(os.path.abspath(path))
+
+
+class PathClaims(object):
+    """
+    Thread safe registry of paths that a walker has taken ownership of.
+
+    Every path a walker reads from or writes to has to be claimed first, so two walkers running in parallel can never
+    touch the same file or directory.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._owners = {}
+
+    def claim(self, path: str, owner: str) -> bool:
+        """
+        Claims a path for an owner.
+
+        :param path: The path to claim.
+        :param owner: The folder the walker is working on.
+
+        :return: True if the path is now owned by the owner, False if another owner holds it.
+        """
+        key = normalize_path(path)
+        with self._lock:
+            current_owner = self._owners.setdefault(key, owner)
+        return current_owner == owner
+
+    def owner(self, path: str) -> Optional[str]:
+        """
+        Returns the owner of a path.
+
+        :param path: The claimed path.
+
+        :return: The owner or None.
+        """
+        with self._lock:
+            return self._owners.get(normalize_path(path))
+
+
+class WalkResult(object):
+    """
+    Result of a single folder walk.
+    """
+
+    __slots__ = ('folder', 'result', 'error')
+
+    def __init__(self, folder: str, result: Any = None, error: Optional[Exception] = None):
+        self.folder = folder
+        self.result = result
+        self.error = error
+
+    def __repr__(self) -> str:
+        return f'WalkResult({self.folder!r}, result={self.result!r}, error={self.error!r})'
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def walk_library(folders: Iterable[str], worker: Callable[[str, PathClaims], Any], jobs: int = DEFAULT_JOBS,
+                 claims: Optional[PathClaims] = None) -> List[WalkResult]:
+    """
+    Runs a worker for every folder of a library over a bounded thread pool.
+
+    Folders are de-duplicated on their real path and claimed before the worker starts, so no two workers are handed
+    the same folder. An exception raised by a worker is stored on its result instead of stopping the walk. Results
+    are returned in sorted folder order regardless of the order the workers finished in.
+
+    :param folders: The folders to walk.
+    :param worker: Callable taking the folder and the shared path claims.
+    :param jobs: Maximum number of folders walked at the same time.
+    :param claims: Shared path claims, a new registry is created if not given.
+
+    :return: List of walk results.
+    """
+    if jobs < 1:
+        raise DirectoryScanException(f'Invalid number of jobs: {jobs}')
+    if claims is None:
+        claims = PathClaims()
+
+    results = {}
+    pending = []
+    seen = set()
+    for folder in sorted(folders):
+        real_folder = normalize_path(os.path.realpath(folder))
+        if real_folder in seen:
+            continue
+        seen.add(real_folder)
+        if not claims.claim(folder, folder):
+            results[folder] = WalkResult(folder, error=DirectoryScanException(
+                f'Folder {folder} is already claimed by {claims.owner(folder)}'))
+            continue
+        pending.append(folder)
+
+    def _walk(folder: str) -> WalkResult:
+        try:
+            return WalkResult(folder, result=worker(folder, claims))
+        except Exception as e:
+            return WalkResult(folder, error=e)
+
+    if jobs == 1 or len(pending) <= 1:
+        for folder in pending:
+            results[folder] = _walk(folder)
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix='walker') as executor:
+            for walk_result in executor.map(_walk, pending):
+                results[walk_result.folder] = walk_result
+
+    return [results[folder] for folder in sorted(results)]
+
+
+def extract_device(path: str) -> int:
+    """
+    Extracts the device a path is stored on.
+
+    :param path: The path.
+
+    :return: The device number.
+    """
+    try:
+        return os.stat(path).st_dev
+    except Exception as e:
+        raise DirectoryScanException(str(e))
+
+
+def walk_roots(roots: Iterable[str], worker: Callable[[str], Any], jobs_per_device: int = DEFAULT_JOBS_PER_DEVICE,
+               device_of: Callable[[str], int] = extract_device) -> List[WalkResult]:
+    """
+    Runs a worker for every library root, roots on different devices in parallel.
+
+    Roots are grouped by the device they are stored on and every device gets ``jobs_per_device`` lanes that take its
+    roots one after another, so roots on the same disk do not compete for the same spindle while independent disks
+    are all kept busy. Errors are isolated per root and results are returned in sorted root order.
+
+    :param roots: The library roots.
+    :param worker: Callable taking the root.
+    :param jobs_per_device: Maximum number of roots of the same device processed at the same time.
+    :param device_of: Callable returning the device of a root.
+
+    :return: List of walk results.
+    """
+    if jobs_per_device < 1:
+        raise DirectoryScanException(f'Invalid number of jobs per device: {jobs_per_device}')
+
+    results = {}
+    devices = {}  # type: Dict[int, deque]
+    seen = set()
+    for root in sorted(roots):
+        real_root = normalize_path(os.path.realpath(root))
+        if real_root in seen:
+            continue
+        seen.add(real_root)
+        try:
+            device = device_of(root)
+        except Exception as e:
+            results[root] = WalkResult(root, error=e)
+            continue
+        devices.setdefault(device, deque()).append(root)
+
+    def _lane(pending: deque):
+        while True:
+            try:
+                root = pending.popleft()
+            except IndexError:
+                return
+            try:
+                results[root] = WalkResult(root, result=worker(root))
+            except Exception as e:
+                results[root] = WalkResult(root, error=e)
+
+    lanes = [pending for pending in devices.values() for _ in range(min(jobs_per_device, len(pending)))]
+    if len(lanes) <= 1:
+        for pending in lanes:
+            _lane(pending)
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=len(lanes), thread_name_prefix='root') as executor:
+            for future in [executor.submit(_lane, pending) for pending in lanes]:
+                future.result()
+
+    return [results[root] for root in sorted(results)]
+
+
+class TreeEntry(NamedTuple):
+    """
+    A file or folder found by ``iter_tree``.
+    """
+    path: str
+    name: str
+    is_dir: bool
+    is_symlink: bool
+    depth: int
+
+
+def prune_hidden(entry: TreeEntry) -> bool:
+    """
+    Prune predicate skipping hidden files and folders.
+    """
+    return entry.name.startswith('.')
+
+
+def prune_names(*names: str) -> Callable[[TreeEntry], bool]:
+    """
+    Creates a prune predicate skipping files and folders by name.
+
+    :param names: The names, e.g. ``Featurettes``.
+
+    :return: The prune predicate.
+    """
+    names = frozenset(names)
+    return lambda entry: entry.name in names
+
+
+def prune_extensions(*extensions: str) -> Callable[[TreeEntry], bool]:
+    """
+    Creates a prune predicate skipping files by extension.
+
+    :param extensions: The extensions without the dot, e.g. ``parts``.
+
+    :return: The prune predicate.
+    """
+    suffixes = tuple(f'.{extension}' for extension in extensions)
+    return lambda entry: not entry.is_dir and entry.name.endswith(suffixes)
+
+
+def prune_any(*predicates: Callable[[TreeEntry], bool]) -> Callable[[TreeEntry], bool]:
+    """
+    Combines prune predicates, an entry is skipped when one of them matches.
+
+    :param predicates: The prune predicates.
+
+    :return: The combined prune predicate.
+    """
+    return lambda entry: any(predicate(entry) for predicate in predicates)
+
+
+# Hidden entries and downloads that are still in progress
+PRUNE_DOWNLOADS = prune_any(prune_hidden, prune_extensions(*sorted(PARTIAL_FILE_EXTENSIONS)))
+
+
+def _open_directory(path: str):
+    with METRICS.timed('scandir'):
+        return os.scandir(path)
+
+
+def iter_tree(directory: str, prune: Optional[Callable[[TreeEntry], bool]] = None, max_depth: Optional[int] = None,
+              follow_symlinks: bool = False,
+              on_error: Optional[Callable[[Exception], None]] = None) -> Iterator[TreeEntry]:
+    """
+    Lazily walks a directory tree.
+
+    Entries are yielded while the directories are read, folders before their contents, so a caller can stream a tree
+    of any size with memory bounded by its depth and stop at any point. Only one directory per level is open at a
+    time and they are all closed when the iterator is closed.
+
+    :param directory: The directory to walk, it is not yielded itself.
+    :param prune: Predicate called with every entry, entries it returns True for are not yielded and folders are not
+        descended into.
+    :param max_depth: Deepest level yielded, 0 only yields the entries of the directory itself. Unlimited if not given.
+    :param follow_symlinks: Descend into symlinked folders. A symlink back to a folder that is already being walked is
+        yielded but not descended into, so a symlink loop can not make the walk endless.
+    :param on_error: Called with the error when a folder below the directory or a single entry can not be read, the
+        folder or the entry is skipped and the walk goes on. The error is raised if not given.
+
+    :return: Iterator of the entries.
+    """
+    try:
+        root_stat = os.stat(directory)
+        stack = [(_open_directory(directory), 0, (root_stat.st_dev, root_stat.st_ino))]
+    except Exception as e:
+        raise DirectoryScanException(str(e))
+
+    ancestors = {stack[0][2]}  # type: Set[Tuple[int, int]]
+    try:
+        while stack:
+            iterator, depth, directory_id = stack[-1]
+            try:
+                dir_entry = next(iterator, None)
+            except OSError as e:
+                dir_entry = None
+                if on_error is None:
+                    raise DirectoryScanException(str(e))
+                on_error(e)
+            if dir_entry is None:
+                iterator.close()
+                stack.pop()
+                ancestors.discard(directory_id)
+                continue
+            try:
+                is_symlink = dir_entry.is_symlink()
+                is_dir = dir_entry.is_dir()
+            except OSError as e:
+                # Only this entry is skipped, e.g. one unlinked while the directory is read
+                if on_error is None:
+                    raise DirectoryScanException(str(e))
+                on_error(e)
+                continue
+
+            entry = TreeEntry(dir_entry.path, dir_entry.name, is_dir, is_symlink, depth)
+            if prune is not None and prune(entry):
+                continue
+            yield entry
+            if not is_dir or (max_depth is not None and depth >= max_depth):
+                continue
+            if is_symlink and not follow_symlinks:
+                continue
+
+            try:
+                stat = dir_entry.stat()
+                entry_id = (stat.st_dev, stat.st_ino)
+                if entry_id in ancestors:
+                    continue
+                stack.append((_open_directory(dir_entry.path), depth + 1, entry_id))
+                ancestors.add(entry_id)
+            except OSError as e:
+                if on_error is None:
+                    raise DirectoryScanException(str(e))
+                on_error(e)
+    finally:
+        for iterator, _, _ in stack:
+            iterator.close()
+
+
+def skip_unreadable(error: Exception):
+    """
+    Logs a folder or entry that can not be read as a warning, pass it as ``on_error`` to skip such entries like
+    ``os.walk`` does.
+
+    :param error: The error raised reading the folder or entry.
+    """
+    logging.getLogger('media_log').warning(f'Skipping unreadable path: {error}')
@@ -0,0 +1,329 @@
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from .config import DEFAULT_SETTLE_SECONDS, PARTIAL_FILE_EXTENSIONS
+from .exceptions import FileException
+from .file_utils import extract_file_extension
+
+
+DEFAULT_POLL_INTERVAL = 5.0
+MAX_WAIT_SECONDS = 1.0
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+
+EVENT_HEADER = struct.Struct('iIII')
+EVENT_BUFFER_SIZE = 64 * 1024
+
+
+def is_partial_file(file_name: str) -> bool:
+    """
+    Checks if a file is still being downloaded.
+
+    :param file_name: The file name.
+
+    :return: True for partial download files.
+    """
+    return extract_file_extension(os.path.basename(file_name)) in PARTIAL_FILE_EXTENSIONS
+
+
+def extract_path_signature(path: str) -> Optional[Tuple[int, int, bool]]:
+    """
+    Extracts the size signature of a library entry, used to wait until a download stopped growing.
+
+    :param path: A file or a folder in the library root.
+
+    :return: Tuple of total size, number of files and whether a partial file is present, None if the path is gone.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        raise FileException(str(e))
+    if not os.path.isdir(path):
+        return stat.st_size, 1, is_partial_file(path)
+
+    size = 0
+    count = 0
+    partial = False
+    try:
+        with os.scandir(path) as iterator:
+            for entry in iterator:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                size += entry.stat(follow_symlinks=False).st_size
+                count += 1
+                partial = partial or is_partial_file(entry.name)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        raise FileException(str(e))
+    return size, count, partial
+
+
+class Debouncer(object):
+    """
+    Holds changed paths back until they stopped changing.
+
+    A path is ready once no event was seen for ``settle`` seconds and its size signature did not change over that
+    time. Partial download files are ignored, their final name shows up as a new event when the download completes.
+    """
+
+    def __init__(self, settle: float = DEFAULT_SETTLE_SECONDS, clock: Callable[[], float] = time.monotonic,
+                 signature: Callable[[str], Optional[tuple]] = extract_path_signature):
+        """
+        :param settle: Seconds a path has to be quiet before it is ready.
+        :param clock: Monotonic clock in seconds.
+        :param signature: Callable returning the size signature of a path.
+        """
+        self.settle = settle
+        self._clock = clock
+        self._signature = signature
+        self._pending = {}  # type: Dict[str, Tuple[float, Optional[tuple]]]
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, path: str):
+        """
+        Records an event on a path.
+
+        :param path: The changed path.
+        """
+        if is_partial_file(path):
+            return
+        self._pending[path] = (self._clock(), self._signature(path))
+
+    def next_deadline(self) -> Optional[float]:
+        """
+        :return: Seconds until the next pending path could be ready, None if nothing is pending.
+        """
+        if not self._pending:
+            return None
+        return max(0.0, min(seen for seen, _ in self._pending.values()) + self.settle - self._clock())
+
+    def ready(self) -> List[str]:
+        """
+        Pops the paths that stopped changing.
+
+        :return: Sorted list of ready paths.
+        """
+        now = self._clock()
+        ready = []
+        for path, (seen, signature) in list(self._pending.items()):
+            if now - seen < self.settle:
+                continue
+            current = self._signature(path)
+            if current is None:
+                del self._pending[path]
+            elif current != signature or current[2]:
+                self._pending[path] = (now, current)
+            else:
+                del self._pending[path]
+                ready.append(path)
+        return sorted(ready)
+
+
+class InotifyWatcher(object):
+    """
+    Reports the library root entries that changed, using inotify on the root and on each folder directly in it.
+    """
+
+    def __init__(self, directory: str):
+        """
+        :param directory: The library root.
+        """
+        self.directory = directory
+        self._watches = {}  # type: Dict[int, str]
+        library = ctypes.util.find_library('c') or 'libc.so.6'
+        try:
+            self._libc = ctypes.CDLL(library, use_errno=True)
+            inotify_init1 = self._libc.inotify_init1
+        except (OSError, AttributeError) as e:
+            raise FileException(f'inotify is not available: {e}')
+        self._fd = inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise FileException(f'inotify is not available: {os.strerror(ctypes.get_errno())}')
+        try:
+            self._add_watch(directory)
+            with os.scandir(directory) as iterator:
+                for entry in iterator:
+                    if entry.is_dir(follow_symlinks=False):
+                        self._add_watch(entry.path)
+        except Exception:
+            self.close()
+            raise
+
+    def _add_watch(self, path: str):
+        descriptor = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if descriptor < 0:
+            error = ctypes.get_errno()
+            if path != self.directory and error in (errno.ENOENT, errno.ENOTDIR):
+                return
+            raise FileException(f'Failed to watch {path}: {os.strerror(error)}')
+        self._watches[descriptor] = path
+
+    def _top_level(self, path: str) -> str:
+        return os.path.join(self.directory, os.path.relpath(path, self.directory).split(os.sep)[0])
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def poll(self, timeout: Optional[float] = None) -> Set[str]:
+        """
+        Waits for events.
+
+        :param timeout: Seconds to wait, None to wait until an event arrives.
+
+        :return: Set of library root entries that changed.
+        """
+        changed = set()
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return changed
+        try:
+            buffer = os.read(self._fd, EVENT_BUFFER_SIZE)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(buffer):
+            descriptor, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(buffer[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped, every entry of the root has to be looked at again
+                with os.scandir(self.directory) as iterator:
+                    changed.update(entry.path for entry in iterator)
+                continue
+            watched = self._watches.get(descriptor)
+            if watched is None:
+                continue
+            if mask & IN_IGNORED:
+                del self._watches[descriptor]
+                continue
+            if watched == self.directory:
+                if not name:
+                    continue
+                path = os.path.join(self.directory, name)
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    self._add_watch(path)
+                changed.add(path)
+            else:
+                changed.add(self._top_level(watched))
+        return changed
+
+
+class PollingWatcher(object):
+    """
+    Reports the library root entries that changed by comparing the mtimes and sizes of the root entries, for
+    filesystems without inotify support such as network mounts.
+    """
+
+    def __init__(self, directory: str, interval: float = DEFAULT_POLL_INTERVAL):
+        """
+        :param directory: The library root.
+        :param interval: Seconds between two polls.
+        """
+        self.directory = directory
+        self.interval = interval
+        self._state = self._take_state()
+
+    def _take_state(self) -> Dict[str, Tuple[int, int]]:
+        state = {}
+        try:
+            with os.scandir(self.directory) as iterator:
+                for entry in iterator:
+                    try:
+                        stat = entry.stat(follow_symlinks=False)
+                    except FileNotFoundError:
+                        continue
+                    state[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        except Exception as e:
+            raise FileException(str(e))
+        return state
+
+    def close(self):
+        pass
+
+    def poll(self, timeout: Optional[float] = None) -> Set[str]:
+        """
+        Waits one poll interval and compares the root entries.
+
+        :param timeout: Seconds to wait at most, the poll interval is used if None or longer.
+
+        :return: Set of library root entries that changed.
+        """
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+        state = self._take_state()
+        changed = set(path for path, signature in state.items() if self._state.get(path) != signature)
+        changed.update(path for path in self._state if path not in state)
+        self._state = state
+        return changed
+
+
+def create_watcher(directory: str, poll_interval: Optional[float] = None):
+    """
+    Creates the watcher of a library root, falling back to polling when inotify is not available.
+
+    :param directory: The library root.
+    :param poll_interval: Poll the root at this interval instead of using inotify.
+
+    :return: An inotify or polling watcher.
+    """
+    if poll_interval is None:
+        try:
+            return InotifyWatcher(directory)
+        except FileException:
+            poll_interval = DEFAULT_POLL_INTERVAL
+    return PollingWatcher(directory, poll_interval)
+
+
+def watch_directory(directory: str, handler: Callable[[List[str]], None], settle: float = DEFAULT_SETTLE_SECONDS,
+                    poll_interval: Optional[float] = None, should_stop: Callable[[], bool] = lambda: False,
+                    watcher=None):
+    """
+    Watches a library root and hands the entries that changed and settled to a handler.
+
+    :param directory: The library root.
+    :param handler: Called with the sorted list of settled root entries.
+    :param settle: Seconds an entry has to be quiet before it is handled.
+    :param poll_interval: Poll the root at this interval instead of using inotify.
+    :param should_stop: Checked after every wait, the watch ends when it returns True.
+    :param watcher: Watcher to use instead of creating one.
+    """
+    if watcher is None:
+        watcher = create_watcher(directory, poll_interval)
+    debouncer = Debouncer(settle)
+    try:
+        while not should_stop():
+            # Wake up at least once a second so should_stop is checked while idle
+            timeout = debouncer.next_deadline()
+            timeout = MAX_WAIT_SECONDS if timeout is None else min(timeout + 0.01, MAX_WAIT_SECONDS)
+            for path in watcher.poll(timeout):
+                debouncer.add(path)
+            ready = debouncer.ready()
+            if ready:
+                handler(ready)
+    finally:
+        watcher.close()
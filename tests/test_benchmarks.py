@@ -0,0 +1,31 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from benchmarks import generate
+
+
+class TestGenerate(TestCase):
+
+    def test_generate_movie_library(self):
+        with tempfile.TemporaryDirectory() as directory:
+            library = generate.generate_movie_library(directory, entries=200)
+
+            count = sum(len(folders) + len(files) for _, folders, files in os.walk(library))
+
+            self.assertEqual(os.path.basename(library), 'Movie')
+            self.assertGreaterEqual(count, 200)
+            self.assertLess(count, 220)
+
+    def test_generate_tv_library(self):
+        with tempfile.TemporaryDirectory() as directory:
+            library = generate.generate_tv_library(directory, entries=100, seasons=2, episodes=10)
+
+            shows = os.listdir(library)
+
+            self.assertEqual(os.path.basename(library), 'TV')
+            self.assertTrue(all(os.listdir(os.path.join(library, show)) for show in shows))
+
+    def test_names_are_deterministic(self):
+        self.assertEqual(generate.movie_names(50, seed=3), generate.movie_names(50, seed=3))
+        self.assertEqual(len(set(generate.movie_names(1000))), 1000)
@@ -1,4 +1,55 @@
+import os
+import sys
+import subprocess
 from unittest import TestCase
 
-class Test(TestCase):
-    pass
\ No newline at end of file
+# Modules only a run type needs, the entry point must not import any of them before the arguments are parsed
+LAZY_MODULES = ('logging', 'json', 'sqlite3', 'asyncio', 'concurrent', 'ctypes', 'mmap', 'hashlib', 'gzip',
+                'multiprocessing', 'mediarenamer.commands', 'mediarenamer.utils', 'mediarenamer.file_utils')
+
+# Cumulative import time of the entry point module, generous enough for a loaded machine
+IMPORT_TIME_BUDGET_US = 60000
+
+
+def import_entry_point() -> dict:
+    """
+    Imports the entry point module in a new interpreter.
+
+    :return: Dictionary of imported module name to cumulative import time in microseconds.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import mediarenamer.mediarenamer'],
+                            cwd=root, capture_output=True, text=True, check=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative)
+    return modules
+
+
+class TestStartup(TestCase):
+
+    def test_entry_point_imports_run_types_lazily(self):
+        modules = import_entry_point()
+
+        self.assertIn('mediarenamer.mediarenamer', modules)
+        for name in LAZY_MODULES:
+            self.assertNotIn(name, modules)
+
+    def test_entry_point_import_time_budget(self):
+        # Best of a few runs, the first one may still have to write the bytecode cache
+        import_time = min(import_entry_point()['mediarenamer.mediarenamer'] for _ in range(3))
+
+        self.assertLess(import_time, IMPORT_TIME_BUDGET_US)
+
+    def test_options_without_their_run_mode_are_rejected(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        for arguments in (['--root', 'Movie'], ['--roots-file', 'roots.txt', '--dry-run'], ['--verify'],
+                          ['--quarantine', 'Quarantine', '--find-duplicates']):
+            result = subprocess.run([sys.executable, '-m', 'mediarenamer', *arguments], cwd=root, capture_output=True,
+                                    text=True)
+
+            self.assertEqual(result.returncode, 2)
+            self.assertIn('need', result.stderr)
@@ -0,0 +1,93 @@
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from mediarenamer import duplicates, walker
+
+
+class TestDuplicates(TestCase):
+
+    def test_find_duplicates_narrows_down_by_size_and_hashes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            def write(name, content):
+                path = os.path.join(directory, name)
+                with open(path, 'wb') as f:
+                    f.write(content)
+                return path
+
+            content = bytes(range(256)) * 64
+            original = write('movie.mkv', content)
+            copy = write('movie copy.mkv', content)
+            # Same size, head and tail, only the middle differs so only the full hash tells them apart
+            middle = write('movie middle.mkv', content[:8000] + b'x' + content[8001:])
+            tail = write('movie tail.mkv', content[:-1] + b'x')
+            small = write('small.mp4', b'abc')
+            small_copy = write('small copy.mp4', b'abc')
+            write('empty.mkv', b'')
+            write('empty copy.mkv', b'')
+            os.link(original, os.path.join(directory, 'movie link.mkv'))
+
+            files = [os.path.join(directory, name) for name in sorted(os.listdir(directory))]
+            found = duplicates.find_duplicates(files, jobs=2, chunk_size=1024)
+
+            self.assertEqual([duplicate.files for duplicate in found], [
+                sorted([copy, os.path.join(directory, 'movie link.mkv')]),
+                sorted([small, small_copy]),
+            ])
+            self.assertEqual(found[0].digest, duplicates.full_hash(original, block_size=1000))
+            self.assertNotEqual(duplicates.partial_hash(tail, 1024), duplicates.partial_hash(original, 1024))
+            self.assertEqual(duplicates.partial_hash(middle, 1024), duplicates.partial_hash(original, 1024))
+
+    def test_find_duplicate_media_matches_extensions_in_any_case(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ('Movie.MKV', 'movie copy.mkv', 'Episode.Mp4', 'episode copy.mp4', 'cover.jpg', 'copy.jpg'):
+                extension = name.rsplit('.', 1)[1].lower()
+                with open(os.path.join(directory, name), 'wb') as f:
+                    f.write(extension.encode() * 100)
+
+            found = duplicates.find_duplicate_media([directory], {'mkv', 'MP4'})
+
+            self.assertEqual(sorted(len(duplicate.files) for duplicate in found), [2, 2])
+            self.assertFalse([file for duplicate in found for file in duplicate.files if file.endswith('.jpg')])
+
+    def test_find_duplicate_media_skips_unreadable_folders(self):
+        open_directory = walker._open_directory
+
+        def deny_lost_found(path):
+            if os.path.basename(path) == 'lost+found':
+                raise PermissionError(13, 'Permission denied', path)
+            return open_directory(path)
+
+        with tempfile.TemporaryDirectory() as directory:
+            os.mkdir(os.path.join(directory, 'lost+found'))
+            for name in ('movie.mkv', 'movie copy.mkv'):
+                with open(os.path.join(directory, name), 'wb') as f:
+                    f.write(b'mkv' * 100)
+
+            with mock.patch.object(walker, '_open_directory', deny_lost_found), \
+                    self.assertLogs('media_log', 'WARNING') as logs:
+                found = duplicates.find_duplicate_media([directory])
+
+            self.assertEqual([len(duplicate.files) for duplicate in found], [2])
+            self.assertIn('lost+found', logs.output[0])
+
+    def test_find_duplicates_skips_files_that_can_not_be_hashed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            files = []
+            for name in ('a.mkv', 'b.mkv', 'c.mkv'):
+                files.append(os.path.join(directory, name))
+                with open(files[-1], 'wb') as f:
+                    f.write(b'mkv' * 100)
+            partial_hash = duplicates.partial_hash
+
+            def vanish_b(file_name, chunk_size):
+                if file_name == files[1]:
+                    raise duplicates.FileException(f'No such file: {file_name}')
+                return partial_hash(file_name, chunk_size)
+
+            with mock.patch.object(duplicates, 'partial_hash', vanish_b), \
+                    self.assertLogs('media_log', 'WARNING') as logs:
+                found = duplicates.find_duplicates(files, jobs=2)
+
+            self.assertEqual([duplicate.files for duplicate in found], [[files[0], files[2]]])
+            self.assertIn('b.mkv', logs.output[0])
@@ -1,3 +1,5 @@
+import os
+import tempfile
 from unittest import TestCase
 
 from mediarenamer import file_utils
@@ -37,3 +39,16 @@ class TestFileUtils(TestCase):
                 self.assertEqual(file_utils.get_file_extension(file), "txt")
             else:
                 self.assertEqual(file_utils.get_file_extension(file), "mkv")
+
+    def test_take_directory_snapshot(self):
+        with tempfile.TemporaryDirectory() as directory:
+            os.mkdir(os.path.join(directory, 'Featurettes'))
+            for file in self.file_list:
+                open(os.path.join(directory, file), 'w').close()
+
+            snapshot = file_utils.take_directory_snapshot(directory)
+
+            self.assertEqual(snapshot.folders, [os.path.join(directory, 'Featurettes')])
+            self.assertEqual(snapshot.files, sorted(os.path.join(directory, file) for file in self.file_list))
+            self.assertEqual(snapshot.extension(os.path.join(directory, "Encoded by JoyBell.txt")), "txt")
+            self.assertEqual(snapshot.stat(snapshot.files[0]).st_size, 0)
@@ -0,0 +1,71 @@
+import os
+import logging
+import tempfile
+from unittest import TestCase
+
+from mediarenamer import gaps
+
+
+class TestGaps(TestCase):
+
+    def test_episode_set(self):
+        episodes = gaps.EpisodeSet([1, 2, 5, 9, 9, 12])
+        episodes.add(10, 11)
+        episodes.add(2)
+
+        self.assertEqual(len(episodes), 7)
+        self.assertEqual(episodes.last, 12)
+        self.assertIn(10, episodes)
+        self.assertNotIn(3, episodes)
+        self.assertEqual(episodes.missing(), [(3, 4), (6, 8)])
+        self.assertEqual(episodes.duplicates(), [2, 9])
+        self.assertEqual(gaps.format_ranges(episodes.missing()), '3-4, 6-8')
+        self.assertEqual(gaps.EpisodeSet().missing(), [])
+
+    def test_extract_episode_range_from_file_name(self):
+        self.assertEqual(gaps.extract_episode_range_from_file_name('Show - S01E03.mkv'), (3, 3))
+        self.assertEqual(gaps.extract_episode_range_from_file_name('Show.S01E03E04.720p.mkv'), (3, 4))
+        self.assertEqual(gaps.extract_episode_range_from_file_name('Show - S01E05-E07 - Title.mkv'), (5, 7))
+        self.assertIsNone(gaps.extract_episode_range_from_file_name('Show - Pilot.mkv'))
+
+    def test_find_show_gaps(self):
+        with tempfile.TemporaryDirectory() as directory:
+            show = os.path.join(directory, 'TV', 'The Expanse (2015)')
+            for season, names in (('Season 1', ['The Expanse - S01E01.mkv', 'The Expanse - S01E02E03.mkv',
+                                                'The Expanse - S01E06.mkv', 'The Expanse - S01E06.mp4',
+                                                'The Expanse - S02E01.mkv', 'cover.jpg']),
+                                  ('Season 3', ['The Expanse - S03E01.mkv', 'The Expanse - S03E02.mkv']),
+                                  ('Season 03', ['The Expanse - S03E03.mkv'])):
+                os.makedirs(os.path.join(show, season))
+                for name in names:
+                    open(os.path.join(show, season, name), 'w').close()
+
+            show_gaps = gaps.find_show_gaps(show, 'The Expanse')
+
+            self.assertFalse(show_gaps.complete)
+            self.assertEqual(show_gaps.missing_seasons, [(2, 2)])
+            self.assertEqual(show_gaps.duplicate_seasons, [3])
+            season = show_gaps.seasons[0]
+            self.assertEqual((season.season, season.episodes, season.last_episode), (1, 4, 6))
+            self.assertEqual(season.missing, [(4, 5)])
+            self.assertEqual(season.duplicates, [6])
+            self.assertEqual(season.out_of_range, ['The Expanse - S02E01.mkv'])
+            # Two folders for the same season are checked on their own
+            self.assertEqual(show_gaps.seasons[1].missing, [(1, 2)])
+            self.assertTrue(show_gaps.seasons[2].complete)
+            self.assertEqual(len(show_gaps.table_rows()), 3)
+            self.assertEqual(show_gaps.to_dict()['seasons'][0]['missing'], [(4, 5)])
+
+    def test_find_show_gaps_skips_folders_without_season_number(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # The season pattern matches the s1 in the path of the show but not the Extras folder name
+            show = os.path.join(directory, 's1', 'TV', 'Show')
+            os.makedirs(os.path.join(show, 'Extras'))
+            os.makedirs(os.path.join(show, 'Season 1'))
+            open(os.path.join(show, 'Season 1', 'Show - S01E01.mkv'), 'w').close()
+
+            with self.assertLogs('media_log', 'WARNING') as logs:
+                show_gaps = gaps.find_show_gaps(show, log=logging.getLogger('media_log'))
+
+            self.assertEqual([season.season for season in show_gaps.seasons], [1])
+            self.assertIn('Extras', logs.output[0])
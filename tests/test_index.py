@@ -0,0 +1,112 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from mediarenamer import file_utils, index
+
+
+class TestScanIndex(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.index_path = os.path.join(self.directory.name, 'index.sqlite')
+        self.show = os.path.join(self.directory.name, 'Futurama (1999)')
+        os.makedirs(os.path.join(self.show, 'Season 1'))
+        open(os.path.join(self.show, 'Futurama - S01E01 - Space Pilot 3000.mkv'), 'w').close()
+        open(os.path.join(self.show, 'cover.jpg'), 'w').close()
+        self.age(self.show, os.path.join(self.show, 'Season 1'))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def age(self, *directories):
+        for directory in directories:
+            os.utime(directory, ns=(10 ** 18, 10 ** 18))
+
+    def test_scan_directory_reuses_unchanged_results(self):
+        with index.ScanIndex(self.index_path) as scan_index:
+            first = file_utils.scan_directory(self.show, index=scan_index)
+
+        with index.ScanIndex(self.index_path) as scan_index:
+            self.assertEqual(scan_index.scan_results(self.show), first)
+            self.assertEqual(file_utils.scan_directory(self.show, index=scan_index), first)
+            self.assertEqual(scan_index.misses, 0)
+
+    def test_changed_directory_is_read_again(self):
+        with index.ScanIndex(self.index_path) as scan_index:
+            file_utils.scan_directory(self.show, index=scan_index)
+
+        open(os.path.join(self.show, 'Futurama - S01E02 - The Series Has Landed.mkv'), 'w').close()
+        os.utime(self.show, ns=(10 ** 18 + 1, 10 ** 18 + 1))
+
+        with index.ScanIndex(self.index_path) as scan_index:
+            self.assertIsNone(scan_index.scan_results(self.show))
+            self.assertEqual(len(file_utils.scan_directory(self.show, index=scan_index)['episode_files']), 2)
+
+    def test_full_rescan_and_fingerprint_bypass_index(self):
+        with index.ScanIndex(self.index_path, fingerprint='a') as scan_index:
+            file_utils.scan_directory(self.show, index=scan_index)
+
+        with index.ScanIndex(self.index_path, fingerprint='a', full_rescan=True) as scan_index:
+            self.assertIsNone(scan_index.scan_results(self.show))
+        with index.ScanIndex(self.index_path, fingerprint='b') as scan_index:
+            self.assertIsNone(scan_index.scan_results(self.show))
+
+    def test_fingerprint_of_other_root_keeps_rows(self):
+        other = os.path.join(self.directory.name, 'Other')
+        os.makedirs(other)
+        self.age(other)
+        with index.ScanIndex(self.index_path, fingerprints={self.show: 'a', other: 'b'}) as scan_index:
+            first = file_utils.scan_directory(self.show, index=scan_index)
+            scan_index.snapshot(other)
+
+        with index.ScanIndex(self.index_path, fingerprints={other: 'c'}) as scan_index:
+            self.assertIsNone(scan_index.scan_results(self.show))
+            scan_index.snapshot(other)
+            self.assertEqual(scan_index.misses, 1)
+
+        with index.ScanIndex(self.index_path, fingerprints={self.show: 'a'}) as scan_index:
+            self.assertEqual(file_utils.scan_directory(self.show, index=scan_index), first)
+            self.assertEqual(scan_index.misses, 0)
+
+    def test_is_clean_checks_sub_folders(self):
+        with index.ScanIndex(self.index_path) as scan_index:
+            stat = scan_index.stat(self.show)
+            scan_index.snapshot(self.show)
+            scan_index.touch(os.path.join(self.show, 'Season 1'))
+            scan_index.mark_clean(self.show, stat)
+
+        with index.ScanIndex(self.index_path) as scan_index:
+            self.assertTrue(scan_index.is_clean(self.show))
+
+        open(os.path.join(self.show, 'Season 1', 'cover.jpg'), 'w').close()
+        os.utime(os.path.join(self.show, 'Season 1'), ns=(10 ** 18 + 1, 10 ** 18 + 1))
+
+        with index.ScanIndex(self.index_path) as scan_index:
+            self.assertFalse(scan_index.is_clean(self.show))
+
+    def test_recursively_list_contents_in_directory(self):
+        expected = file_utils.recursively_list_contents_in_directory(self.show)
+
+        with index.ScanIndex(self.index_path) as scan_index:
+            folders, files = file_utils.recursively_list_contents_in_directory(self.show, index=scan_index)
+
+        self.assertEqual(sorted(folders), sorted(expected[0]))
+        self.assertEqual(sorted(files), sorted(expected[1]))
+
+    def test_writes_are_committed_in_batches(self):
+        with index.ScanIndex(self.index_path) as scan_index:
+            scan_index.snapshot(self.show)
+            scan_index.commit()
+            # Another run can write while this one is still open
+            with index.ScanIndex(self.index_path) as other_index:
+                other_index.touch(os.path.join(self.show, 'Season 1'))
+
+            for number in range(index.COMMIT_INTERVAL):
+                folder = os.path.join(self.directory.name, f'Folder {number}')
+                os.makedirs(folder)
+                scan_index.touch(folder)
+            # A full batch is visible to other runs before this one closes
+            with index.ScanIndex(self.index_path) as other_index:
+                self.assertEqual(other_index._connection.execute('SELECT COUNT(*) FROM directories').fetchone()[0],
+                                 index.COMMIT_INTERVAL + 2)
@@ -0,0 +1,59 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from mediarenamer import journal, plan
+
+
+class TestJournal(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.library = self.directory.name
+        self.journal_path = os.path.join(self.library, 'journal', 'run.jsonl')
+        self.movie_directory = os.path.join(self.library, 'Alien (1979)')
+        open(os.path.join(self.library, 'Alien.1979.mkv'), 'w').close()
+
+        self.plan = plan.RenamePlan()
+        self.plan.mkdir(self.movie_directory)
+        self.plan.move(os.path.join(self.library, 'Alien.1979.mkv'), os.path.join(self.movie_directory, 'Alien.1979.mkv'))
+        self.plan.rename(os.path.join(self.movie_directory, 'Alien.1979.mkv'),
+                         os.path.join(self.movie_directory, 'Alien (1979).mkv'))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_apply_plan_records_journal(self):
+        with journal.RenameJournal(self.journal_path) as rename_journal:
+            plan.apply_plan(self.plan, journal=rename_journal, root=self.library)
+
+        records = list(journal.read_journal(self.journal_path))
+
+        self.assertEqual([record['type'] for record in records],
+                         ['run', 'plan', 'plan', 'plan', 'begin', 'done', 'begin', 'done', 'begin', 'done'])
+        self.assertEqual(list(journal.pending_operations(self.journal_path)), [])
+
+    def test_resume_interrupted_run(self):
+        with journal.RenameJournal(self.journal_path) as rename_journal:
+            rename_journal.record_plan(self.plan.batched())
+            rename_journal.begin(0, self.plan.operations[0])
+            plan.apply_operation(self.plan.operations[0])
+            rename_journal.done(0)
+            rename_journal.begin(1, self.plan.operations[1])
+            plan.apply_operation(self.plan.operations[1])
+        with open(self.journal_path, 'a') as f:
+            f.write('{"type": "do')
+
+        self.assertEqual([sequence for sequence, _ in journal.pending_operations(self.journal_path)], [1, 2])
+        self.assertEqual(journal.resume_journal(self.journal_path), [])
+        self.assertEqual(os.listdir(self.movie_directory), ['Alien (1979).mkv'])
+        self.assertEqual(list(journal.pending_operations(self.journal_path)), [])
+
+    def test_rollback(self):
+        with journal.RenameJournal(self.journal_path) as rename_journal:
+            plan.apply_plan(self.plan, journal=rename_journal)
+
+        self.assertEqual(journal.rollback_journal(self.journal_path), [])
+        self.assertFalse(os.path.exists(self.movie_directory))
+        self.assertTrue(os.path.exists(os.path.join(self.library, 'Alien.1979.mkv')))
+        self.assertEqual(journal.completed_operations(self.journal_path), [])
@@ -1,4 +1,96 @@
+import os
+import logging
+import tempfile
 from unittest import TestCase
 
+from mediarenamer import mediarenamer, file_utils
+
 class Test(TestCase):
-    pass
\ No newline at end of file
+    pass
+
+
+class TestMovieLibrary(TestCase):
+
+    def test_plan_movie_library_does_not_touch_disk(self):
+        log = logging.getLogger('media_log')
+        with tempfile.TemporaryDirectory() as directory:
+            library = os.path.join(directory, 'Movie')
+            os.makedirs(os.path.join(library, 'The.Matrix.1999.1080p'))
+            open(os.path.join(library, 'The.Matrix.1999.1080p', 'the.matrix.1999.mkv'), 'w').close()
+            open(os.path.join(library, 'The.Matrix.1999.1080p', 'cover.jpg'), 'w').close()
+            open(os.path.join(library, 'Alien.1979.mkv'), 'w').close()
+            before = sorted(os.walk(library))
+
+            plan = mediarenamer.plan_movie_library(library, file_utils.take_directory_snapshot(library), 2, log)
+
+            self.assertEqual(sorted(os.walk(library)), before)
+            self.assertEqual([operation.describe() for operation in plan.batched()], [
+                f'MKDIR  {library}/Alien (1979)',
+                f'MOVE   {library}/Alien.1979.mkv -> {library}/Alien (1979)/Alien.1979.mkv',
+                f'RENAME {library}/Alien (1979)/Alien.1979.mkv -> {library}/Alien (1979)/Alien (1979).mkv',
+                f'RENAME {library}/The.Matrix.1999.1080p -> {library}/The Matrix (1999)',
+                f'RENAME {library}/The Matrix (1999)/the.matrix.1999.mkv -> {library}/The Matrix (1999)/The Matrix (1999).mkv',
+                f'DELETE {library}/The Matrix (1999)/cover.jpg',
+            ])
+
+    def test_plan_movie_entries_plans_only_the_entry(self):
+        log = logging.getLogger('media_log')
+        with tempfile.TemporaryDirectory() as directory:
+            library = os.path.join(directory, 'Movie')
+            os.makedirs(os.path.join(library, 'Some.Movie.2021.1080p', 'Subs'))
+            open(os.path.join(library, 'Some.Movie.2021.1080p', 'some.movie.2021.mkv'), 'w').close()
+            open(os.path.join(library, 'Some.Movie.2021.1080p', 'cover.jpg'), 'w').close()
+            open(os.path.join(library, 'Alien.1979.mkv'), 'w').close()
+
+            library_entry = file_utils.extract_library_entry_for_path(
+                os.path.join(library, 'Some.Movie.2021.1080p', 'Subs'), 'Movie')
+            plan = mediarenamer.plan_movie_entries(library, [library_entry[1]], 1, log)
+
+            self.assertEqual(library_entry, (library, os.path.join(library, 'Some.Movie.2021.1080p')))
+            self.assertIsNone(file_utils.extract_library_entry_for_path(directory, 'Movie'))
+            self.assertEqual([operation.describe() for operation in plan.batched()], [
+                f'RENAME {library}/Some.Movie.2021.1080p -> {library}/Some Movie (2021)',
+                f'RENAME {library}/Some Movie (2021)/some.movie.2021.mkv -> {library}/Some Movie (2021)/Some Movie (2021).mkv',
+                f'DELETE {library}/Some Movie (2021)/cover.jpg',
+            ])
+
+    def test_run_path_files_a_loose_movie_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            library = os.path.join(directory, 'Movie')
+            os.makedirs(os.path.join(library, 'Alien.1979'))
+            path = os.path.join(library, 'Some.Movie.2021.1080p.mkv')
+            open(path, 'w').close()
+
+            mediarenamer.run_path(path, use_journal=False)
+
+            self.assertEqual(sorted(os.listdir(library)), ['Alien.1979', 'Some Movie (2021)'])
+            self.assertEqual(os.listdir(os.path.join(library, 'Some Movie (2021)')), ['Some Movie (2021).mkv'])
+
+
+class TestTVLibrary(TestCase):
+
+    def test_plan_tv_library_streams_season_plans(self):
+        log = logging.getLogger('media_log')
+        with tempfile.TemporaryDirectory() as directory:
+            library = os.path.join(directory, 'TV')
+            season = os.path.join(library, 'The Expanse (2015)', 'Season 2')
+            os.makedirs(season)
+            os.makedirs(os.path.join(library, 'Futurama (1999)', 'Season 1'))
+            for name in ('The.Expanse.S02E01.720p.WEBRip.x264-GalaxyTV.mkv',
+                         'The Expanse - S02E02 - Doors & Corners (1080p WEB-DL x265).mkv',
+                         'The Expanse - S02E03.mkv', 'cover.jpg'):
+                open(os.path.join(season, name), 'w').close()
+            before = sorted(os.walk(library))
+
+            season_plans = mediarenamer.plan_tv_library(library, file_utils.take_directory_snapshot(library), log)
+
+            self.assertEqual(len(next(season_plans)), 0)
+            plan = next(season_plans)
+            self.assertEqual(list(season_plans), [])
+            self.assertEqual(sorted(os.walk(library)), before)
+            self.assertEqual([operation.describe() for operation in plan.batched()], [
+                f'RENAME {season}/The Expanse - S02E02 - Doors & Corners (1080p WEB-DL x265).mkv -> '
+                f'{season}/The Expanse - S02E02 - Doors & Corners.mkv',
+                f'RENAME {season}/The.Expanse.S02E01.720p.WEBRip.x264-GalaxyTV.mkv -> {season}/The Expanse - S02E01.mkv',
+                f'DELETE {season}/cover.jpg',
+            ])
@@ -0,0 +1,39 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from mediarenamer import file_utils, metrics
+
+
+class TestMetrics(TestCase):
+
+    def test_histogram_buckets(self):
+        histogram = metrics.Histogram()
+        for elapsed_ns in (500, 1500, 3000, 3000, 10 ** 9):
+            histogram.observe(elapsed_ns)
+
+        self.assertEqual(histogram.count, 5)
+        self.assertEqual(histogram.min_ns, 500)
+        self.assertEqual(histogram.max_ns, 10 ** 9)
+        self.assertEqual(histogram.percentile(50), 4 / 1e6)
+        self.assertEqual(histogram.percentile(100), 1.0)
+
+    def test_file_utils_calls_are_recorded(self):
+        metrics.METRICS.reset()
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, 'movie.mkv')
+            open(file_name, 'w').close()
+            with metrics.METRICS.phase('list'):
+                snapshot = file_utils.take_directory_snapshot(directory)
+            file_utils.rename_file(file_name, file_name + '.old')
+            file_utils.delete_file(file_name + '.old')
+
+        document = metrics.METRICS.to_dict()
+
+        self.assertEqual(len(snapshot.files), 1)
+        self.assertIn('list', document['phases'])
+        self.assertEqual(document['counters']['renames'], 1)
+        self.assertEqual(document['counters']['deletes'], 1)
+        self.assertEqual(document['counters']['syscalls'], 3)
+        self.assertEqual(document['calls']['scandir']['count'], 1)
+        self.assertIn('rename', metrics.METRICS.summary_table())
@@ -0,0 +1,35 @@
+import pickle
+from unittest import TestCase
+
+from mediarenamer import naming
+from mediarenamer.exceptions import ParserException
+
+
+class TestNaming(TestCase):
+
+    def test_plex_templates(self):
+        templates = naming.compile_templates(naming.PLEX_TEMPLATES, naming.TEMPLATE_DEPTHS)
+
+        self.assertEqual(templates['movie'].render(title='Star Wars: A New Hope', year='1977', ext='mkv'),
+                         'Star Wars - A New Hope (1977)/Star Wars - A New Hope (1977).mkv')
+        self.assertEqual(templates['episode'].render_many([
+            {'show': 'The Expanse', 'season': 2, 'episode': 2, 'title': 'Doors & Corners', 'ext': 'mkv'},
+            {'show': 'The Expanse', 'season': 2, 'episode': 13, 'title': None, 'ext': 'mp4'},
+        ]), [['The Expanse - S02E02 - Doors & Corners.mkv'], ['The Expanse - S02E13.mp4']])
+
+    def test_sanitize_and_clean_title(self):
+        self.assertEqual(naming.sanitize_name('What If...? <AC/DC>\t|  "Live"'), "What If... AC-DC - 'Live'")
+        self.assertEqual(naming.clean_title('The.Matrix.('), 'The Matrix')
+
+    def test_template_syntax(self):
+        template = naming.NameTemplate('[[{year}]] {title}[ ({show})]')
+
+        self.assertEqual(template.render(title='Heat', year='1995'), '[1995] Heat')
+        self.assertEqual(template.render(title='Heat', year='1995', show='Crime'), '[1995] Heat (Crime)')
+        self.assertEqual(pickle.loads(pickle.dumps(template)), template)
+        for invalid in ('{name}', '{title!r}', '{title', '[{title}', '{title}]', '[[{title}]', '{title}//{ext}',
+                        '{season:s}'):
+            with self.assertRaises(ParserException):
+                naming.NameTemplate(invalid)
+        with self.assertRaises(ParserException):
+            naming.compile_templates({'movie': '{title}'}, naming.TEMPLATE_DEPTHS)
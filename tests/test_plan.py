@@ -0,0 +1,101 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from mediarenamer import plan
+
+
+class TestPlan(TestCase):
+
+    def test_rename_plan_counts_and_batching(self):
+        rename_plan = plan.RenamePlan()
+        rename_plan.mkdir('/Movie/Alien')
+        rename_plan.delete('/Movie/Alien/cover.jpg')
+        rename_plan.move('/Movie/Alien.1979.mkv', '/Movie/Alien/Alien.1979.mkv')
+        rename_plan.rename('/Movie/Alien', '/Movie/Alien (1979)', is_directory=True)
+
+        self.assertEqual(rename_plan.counts(), {'mkdir': 1, 'move': 1, 'rename': 1, 'delete': 1})
+        self.assertEqual([operation.kind for operation in rename_plan.batched()], ['mkdir', 'move', 'rename', 'delete'])
+
+    def test_rename_operation_validation(self):
+        with self.assertRaises(plan.MediaRenamerException):
+            plan.RenameOperation('copy', '/a', '/b')
+        with self.assertRaises(plan.MediaRenamerException):
+            plan.RenameOperation(plan.RENAME, '/a')
+
+    def test_apply_plan(self):
+        with tempfile.TemporaryDirectory() as directory:
+            open(os.path.join(directory, 'Alien.1979.mkv'), 'w').close()
+            open(os.path.join(directory, 'cover.jpg'), 'w').close()
+            movie_directory = os.path.join(directory, 'Alien (1979)')
+
+            rename_plan = plan.RenamePlan()
+            rename_plan.delete(os.path.join(movie_directory, 'cover.jpg'))
+            rename_plan.mkdir(movie_directory)
+            rename_plan.move(os.path.join(directory, 'Alien.1979.mkv'), os.path.join(movie_directory, 'Alien.1979.mkv'))
+            rename_plan.move(os.path.join(directory, 'cover.jpg'), os.path.join(movie_directory, 'cover.jpg'))
+
+            self.assertEqual(plan.apply_plan(rename_plan), [])
+            self.assertEqual(os.listdir(movie_directory), ['Alien.1979.mkv'])
+
+    def test_apply_plan_collects_failures(self):
+        with tempfile.TemporaryDirectory() as directory:
+            rename_plan = plan.RenamePlan()
+            rename_plan.rename(os.path.join(directory, 'missing.mkv'), os.path.join(directory, 'other.mkv'))
+            rename_plan.mkdir(os.path.join(directory, 'Heat (1995)'))
+
+            with self.assertRaises(plan.FileException):
+                plan.apply_plan(rename_plan)
+
+            failed = plan.apply_plan(rename_plan, ignore_errors=True)
+
+            self.assertEqual(failed, [rename_plan.operations[0]])
+            self.assertTrue(os.path.isdir(os.path.join(directory, 'Heat (1995)')))
+
+    def test_build_dependencies_follows_path_ancestry(self):
+        operations = [
+            plan.RenameOperation(plan.MKDIR, '/Movie/Alien'),
+            plan.RenameOperation(plan.RENAME, '/Movie/Heat.1995', '/Movie/Heat (1995)', is_directory=True),
+            plan.RenameOperation(plan.MOVE, '/Movie/Alien.1979.mkv', '/Movie/Alien/Alien.1979.mkv'),
+            plan.RenameOperation(plan.RENAME, '/Movie/Heat (1995)/heat.mp4', '/Movie/Heat (1995)/Heat (1995).mp4'),
+            plan.RenameOperation(plan.DELETE, '/Movie/Heat (1995)/cover.jpg'),
+            plan.RenameOperation(plan.DELETE, '/Movie/Alien', is_directory=True),
+        ]
+
+        self.assertEqual(plan.build_dependencies(operations), [set(), set(), {0}, {1}, {1}, {0, 2}])
+
+    def test_apply_plan_concurrently_skips_dependents_of_failures(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ('Heat.1995', 'Dune.2021'):
+                os.mkdir(os.path.join(directory, name))
+                open(os.path.join(directory, name, 'movie.mkv'), 'w').close()
+            rename_plan = plan.RenamePlan()
+            for name, new_name in (('Heat.1995', 'Heat (1995)'), ('Missing.2000', 'Missing (2000)'),
+                                   ('Dune.2021', 'Dune (2021)')):
+                folder = os.path.join(directory, new_name)
+                rename_plan.rename(os.path.join(directory, name), folder, is_directory=True)
+                rename_plan.rename(os.path.join(folder, 'movie.mkv'), os.path.join(folder, f'{new_name}.mkv'))
+
+            failed = plan.apply_plan(rename_plan, ignore_errors=True, concurrency=4)
+
+            self.assertEqual([operation.source for operation in failed], [
+                os.path.join(directory, 'Missing.2000'), os.path.join(directory, 'Missing (2000)', 'movie.mkv')])
+            self.assertEqual(sorted(os.listdir(directory)), ['Dune (2021)', 'Heat (1995)'])
+            self.assertTrue(os.path.exists(os.path.join(directory, 'Dune (2021)', 'Dune (2021).mkv')))
+            self.assertTrue(os.path.exists(os.path.join(directory, 'Heat (1995)', 'Heat (1995).mkv')))
+
+    def test_apply_plan_concurrently_stops_after_failure(self):
+        with tempfile.TemporaryDirectory() as directory:
+            rename_plan = plan.RenamePlan()
+            rename_plan.rename(os.path.join(directory, 'missing.mkv'), os.path.join(directory, 'Missing.mkv'))
+            for number in range(50):
+                open(os.path.join(directory, f'movie.{number}.mkv'), 'w').close()
+                rename_plan.rename(os.path.join(directory, f'movie.{number}.mkv'),
+                                   os.path.join(directory, f'Movie {number}.mkv'))
+
+            with self.assertRaises(plan.FileException):
+                plan.apply_plan(rename_plan, concurrency=2)
+
+            # Only the operation already running next to the failed one is applied
+            renamed = [name for name in os.listdir(directory) if name.startswith('Movie ')]
+            self.assertLessEqual(len(renamed), 1)
@@ -0,0 +1,121 @@
+import os
+import struct
+import tempfile
+from unittest import TestCase
+
+from mediarenamer import commands, probe
+from mediarenamer.exceptions import ParserException
+
+
+def ebml(element_id: int, payload: bytes) -> bytes:
+    id_bytes = element_id.to_bytes((element_id.bit_length() + 7) // 8, 'big')
+    return id_bytes + (0x0100000000000000 | len(payload)).to_bytes(8, 'big') + payload
+
+
+def ebml_uint(element_id: int, value: int) -> bytes:
+    return ebml(element_id, value.to_bytes(4, 'big'))
+
+
+def matroska(tracks_after_clusters: bool = False) -> bytes:
+    header = ebml(probe.EBML_ID, ebml(probe.EBML_DOC_TYPE_ID, b'matroska'))
+    info = ebml(probe.INFO_ID, ebml_uint(probe.TIMECODE_SCALE_ID, 1000000)
+                + ebml(probe.DURATION_ID, struct.pack('>d', 5400500.0)))
+    video = ebml(probe.TRACK_ENTRY_ID, ebml_uint(probe.TRACK_TYPE_ID, 1) + ebml(probe.CODEC_ID_ID, b'V_MPEGH/ISO/HEVC')
+                 + ebml(probe.VIDEO_ID, ebml_uint(probe.PIXEL_WIDTH_ID, 3840) + ebml_uint(probe.PIXEL_HEIGHT_ID, 2160)))
+    english = ebml(probe.TRACK_ENTRY_ID, ebml_uint(probe.TRACK_TYPE_ID, 2) + ebml(probe.CODEC_ID_ID, b'A_EAC3'))
+    german = ebml(probe.TRACK_ENTRY_ID, ebml_uint(probe.TRACK_TYPE_ID, 2) + ebml(probe.CODEC_ID_ID, b'A_AAC/MPEG4/LC')
+                  + ebml(probe.LANGUAGE_ID, b'ger'))
+    tracks = ebml(probe.TRACKS_ID, video + english + german)
+    cluster = ebml(probe.CLUSTER_ID, bytes(range(1, 256)) * 16)
+    if not tracks_after_clusters:
+        return header + ebml(probe.SEGMENT_ID, info + tracks + cluster)
+    seek_head_size = len(ebml(probe.SEEK_HEAD_ID, ebml(probe.SEEK_ID, ebml_uint(probe.SEEK_ID_ID, probe.TRACKS_ID)
+                                                        + ebml_uint(probe.SEEK_POSITION_ID, 0))))
+    seek_head = ebml(probe.SEEK_HEAD_ID, ebml(probe.SEEK_ID, ebml_uint(probe.SEEK_ID_ID, probe.TRACKS_ID)
+                                              + ebml_uint(probe.SEEK_POSITION_ID,
+                                                          seek_head_size + len(info) + len(cluster))))
+    return header + ebml(probe.SEGMENT_ID, seek_head + info + cluster + tracks)
+
+
+def box(box_type: bytes, payload: bytes) -> bytes:
+    return struct.pack('>I', len(payload) + 8) + box_type + payload
+
+
+def mp4_track(handler: bytes, codec: bytes, language: str, width: int = 0, height: int = 0) -> bytes:
+    tkhd = box(b'tkhd', b'\0' * 76 + struct.pack('>II', width << 16, height << 16))
+    packed = sum((ord(letter) - 0x60) << shift for letter, shift in zip(language, (10, 5, 0)))
+    mdhd = box(b'mdhd', b'\0' * 20 + struct.pack('>H', packed) + b'\0\0')
+    hdlr = box(b'hdlr', b'\0' * 8 + handler + b'\0' * 12)
+    stsd = box(b'stsd', b'\0' * 4 + struct.pack('>I', 1) + box(codec, b'\0' * 78))
+    minf = box(b'minf', box(b'stbl', stsd))
+    return box(b'trak', tkhd + box(b'mdia', mdhd + hdlr + minf))
+
+
+def mp4() -> bytes:
+    mvhd = box(b'mvhd', b'\0' * 12 + struct.pack('>II', 1000, 2700000) + b'\0' * 80)
+    moov = box(b'moov', mvhd + mp4_track(b'vide', b'avc1', 'und', 1920, 1080) + mp4_track(b'soun', b'mp4a', 'jpn'))
+    # Media data in front of the movie box, as written by encoders that do not move it to the start
+    return box(b'ftyp', b'isom' + b'\0' * 4) + box(b'mdat', b'\0' * 8192) + moov
+
+
+class TestProbe(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name: str, content: bytes) -> str:
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def test_probe_matroska(self):
+        expected = probe.MediaInfo('matroska', 5400.5, 3840, 2160, 'hevc', ['eac3', 'aac'], ['eng', 'ger'])
+
+        self.assertEqual(probe.probe_file(self.write('movie.mkv', matroska())), expected)
+        self.assertEqual(probe.probe_file(self.write('seek.mkv', matroska(tracks_after_clusters=True))), expected)
+        self.assertEqual(expected.describe(), '3840x2160, 1:30:00, hevc, eng/ger')
+
+    def test_probe_mp4(self):
+        info = probe.probe_file(self.write('movie.mp4', mp4()))
+
+        self.assertEqual(info, probe.MediaInfo('mp4', 2700.0, 1920, 1080, 'h264', ['aac'], ['jpn']))
+
+    def test_probe_unsupported_and_broken_files(self):
+        self.assertIsNone(probe.probe_file(self.write('movie.avi', b'RIFF' + b'\0' * 60)))
+        self.assertIsNone(probe.probe_file(self.write('empty.mkv', b'')))
+        with self.assertRaises(ParserException):
+            probe.probe_file(self.write('broken.mp4', box(b'ftyp', b'isom') + b'\0\0\0\x04mdat'))
+
+    def test_probe_files_caches_results(self):
+        files = [self.write('movie.mkv', matroska()), self.write('movie.mp4', mp4()),
+                 self.write('broken.mp4', box(b'ftyp', b'isom') + b'\0\0\0\x04mdat')]
+        cache_path = os.path.join(self.directory.name, 'cache', 'probe.pickle')
+        errors = []
+
+        with probe.ProbeCache(cache_path) as cache:
+            probed = probe.probe_files(files, jobs=2, cache=cache, on_error=errors.append)
+        self.assertEqual(sorted(probed), sorted(files[:2]))
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(cache.misses, 3)
+
+        renamed = os.path.join(self.directory.name, 'renamed.mkv')
+        os.rename(files[0], renamed)
+        with probe.ProbeCache(cache_path) as cache:
+            self.assertEqual(probe.probe_files([renamed, files[1]], cache=cache),
+                             {renamed: probed[files[0]], files[1]: probed[files[1]]})
+        self.assertEqual((cache.hits, cache.misses), (2, 0))
+
+        with open(files[1], 'ab') as f:
+            f.write(b'\0' * 8)
+        with probe.ProbeCache(cache_path) as cache:
+            probe.probe_files([renamed, files[1]], cache=cache)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_list_media_files_matches_extensions_in_any_case(self):
+        files = [self.write('movie.MKV', matroska()), self.write('episode.Mp4', mp4()), self.write('cover.JPG', b'')]
+
+        self.assertEqual(commands.list_media_files(self.directory.name), sorted(files[:2]))
@@ -0,0 +1,38 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from mediarenamer import plan, report
+
+
+class TestReport(TestCase):
+
+    def test_report_round_trip(self):
+        operations = [plan.RenameOperation(plan.RENAME, f'/Movie/movie.{number}', f'/Movie/Movie ({number})')
+                      for number in range(2500)]
+        for filename in ('report.jsonl', 'report.jsonl.gz'):
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, filename)
+                with report.ReportWriter(path, flush_every=100) as writer:
+                    for operation in operations:
+                        writer.write_operation(operation)
+                    writer.write_operation(plan.RenameOperation(plan.DELETE, '/Movie/cover.jpg'), 'failed', 'denied')
+
+                records = list(report.read_report(path))
+
+                self.assertEqual(len(records), 2501)
+                self.assertEqual(records[0], {'op': 'rename', 'old': '/Movie/movie.0', 'new': '/Movie/Movie (0)',
+                                              'status': 'applied'})
+                self.assertEqual(records[-1], {'op': 'delete', 'old': '/Movie/cover.jpg', 'new': None,
+                                               'status': 'failed', 'error': 'denied'})
+
+    def test_apply_plan_writes_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'report.jsonl')
+            rename_plan = plan.RenamePlan()
+            rename_plan.mkdir(os.path.join(directory, 'Heat (1995)'))
+
+            with report.ReportWriter(path) as writer:
+                plan.apply_plan(rename_plan, dry_run=True, report=writer)
+
+            self.assertEqual([record['status'] for record in report.read_report(path)], ['planned'])
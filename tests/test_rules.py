@@ -0,0 +1,57 @@
+import os
+import logging
+import tempfile
+from unittest import TestCase
+
+from mediarenamer import rules, file_utils, mediarenamer
+from mediarenamer.config import DEFAULT_RULES
+from mediarenamer.exceptions import ParserException
+from mediarenamer.walker import PathClaims
+
+
+class TestRules(TestCase):
+
+    def tearDown(self):
+        rules.set_rules(None)
+
+    def test_parse_rule(self):
+        self.assertEqual(rules.parse_rule('srt move Subs/'), rules.Rule('*', 'srt', 'move', 'Subs'))
+        self.assertEqual(rules.parse_rule('featurettes:.TXT delete'), rules.Rule('featurettes', 'txt', 'delete'))
+        for rule in ('nfo', 'nfo rename', 'shows:nfo keep', 'nfo keep Subs', 'srt move'):
+            with self.assertRaises(ParserException):
+                rules.parse_rule(rule)
+
+    def test_later_rules_override_defaults(self):
+        table = rules.compile_rules(DEFAULT_RULES + ['srt move Subs', 'nfo keep', 'movie:jpg keep', 'season:* keep'])
+
+        self.assertEqual(table.classify(rules.MOVIE, 'MKV').action, rules.MEDIA)
+        self.assertEqual(table.classify(rules.MOVIE, 'jpg').action, rules.KEEP)
+        self.assertEqual(table.classify(rules.FEATURETTES, 'jpg').action, rules.DELETE)
+        self.assertEqual(table.classify(rules.MOVIE, 'srt'), rules.Rule('movie', 'srt', 'move', 'Subs'))
+        self.assertEqual(table.classify(rules.SUBS, 'srt').action, rules.KEEP)
+        self.assertEqual(table.classify(rules.SEASON, 'nfo').action, rules.KEEP)
+        self.assertEqual(table.classify(rules.SEASON, None).action, rules.KEEP)
+        self.assertEqual(table.classify(rules.MOVIE, 'txt').action, rules.UNKNOWN)
+        self.assertEqual(table.extensions(rules.MOVIE, rules.MEDIA), frozenset(['mkv', 'mp4']))
+        self.assertNotEqual(table.fingerprint, rules.compile_rules(DEFAULT_RULES).fingerprint)
+
+    def test_plan_movie_folder_applies_rules(self):
+        rules.set_rules(rules.compile_rules(DEFAULT_RULES + ['srt move Subs', 'nfo keep', 'txt delete']))
+        log = logging.getLogger('media_log')
+        with tempfile.TemporaryDirectory() as directory:
+            library = os.path.join(directory, 'Movie')
+            folder = os.path.join(library, 'Heat (1995)')
+            os.makedirs(os.path.join(folder, 'Featurettes'))
+            for name in ('heat.mkv', 'heat.srt', 'heat.nfo', 'Featurettes/heat.en.srt', 'Featurettes/readme.txt'):
+                open(os.path.join(folder, name), 'w').close()
+
+            plan = mediarenamer.plan_movie_folder(folder, PathClaims(), library, log)
+
+            self.assertEqual([operation.describe() for operation in plan.batched()], [
+                f'RENAME {folder}/heat.mkv -> {folder}/Heat (1995).mkv',
+                f'MKDIR  {folder}/Subs',
+                f'MOVE   {folder}/heat.srt -> {folder}/Subs/heat.srt',
+                f'MOVE   {folder}/Featurettes/heat.en.srt -> {folder}/Subs/heat.en.srt',
+                f'DELETE {folder}/Featurettes/readme.txt',
+            ])
+            self.assertEqual(file_utils.parse_files_in_directory_to_delete(['a.txt', 'b.nfo', 'c.mkv']), ['a.txt'])
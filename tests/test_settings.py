@@ -0,0 +1,99 @@
+import os
+import logging
+import tempfile
+from datetime import datetime
+from unittest import TestCase, mock
+
+from mediarenamer import settings, mediarenamer, utils
+from mediarenamer.exceptions import ParserException
+from mediarenamer.walker import PathClaims
+
+CONFIG = b'''
+roots = ["Movie", "/mnt/TV"]
+rules = ["nfo keep"]
+
+[extensions]
+media = ["m4v"]
+delete = ["txt"]
+
+[templates]
+movie = "{title} [[{year}]]/{title}.{ext}"
+
+[years]
+min = 1920
+
+[concurrency]
+jobs = 4
+'''
+
+
+class TestSettings(TestCase):
+
+    def tearDown(self):
+        settings.apply_config(None)
+
+    def test_compile_config_validates(self):
+        for content in ({'unknown': 1}, {'rules': 'nfo keep'}, {'rules': ['nfo rename']},
+                        {'templates': {'movie': '{name}/{name}.{ext}'}}, {'templates': {'movie': '{title}'}}, {'templates': {'film': '{title}'}},
+                        {'years': {'min': 2000, 'max': 1990}}, {'concurrency': {'jobs': 0}}):
+            with self.assertRaises(ParserException):
+                settings.compile_config(content)
+
+    def test_load_config_caches_compiled_config(self):
+        with tempfile.TemporaryDirectory() as directory, mock.patch.dict(os.environ, {'XDG_CACHE_HOME': directory}):
+            path = os.path.join(directory, '.mediarenamer.toml')
+            with open(path, 'wb') as f:
+                f.write(CONFIG)
+
+            config = settings.load_config(path)
+
+            self.assertTrue(os.path.exists(settings.extract_config_cache_path(path)))
+            self.assertEqual(settings.find_config_path(directory), path)
+            self.assertEqual(config.roots, [os.path.join(directory, 'Movie'), '/mnt/TV'])
+            self.assertEqual((config.jobs, config.concurrency, config.min_year), (4, None, 1920))
+            self.assertEqual(config.rules.classify('movie', 'm4v').action, 'media')
+            self.assertEqual(config.rules.classify('subs', 'txt').action, 'delete')
+            self.assertEqual(config.rules.classify('season', 'nfo').action, 'keep')
+            with mock.patch('tomllib.load', side_effect=AssertionError('config parsed again')):
+                self.assertEqual(settings.load_config(path).fingerprint, config.fingerprint)
+
+            with open(path, 'ab') as f:
+                f.write(b'threads = 2\n')
+            with self.assertRaises(ParserException):
+                settings.load_config(path)
+
+    def test_fingerprint_includes_effective_year_bounds(self):
+        config = settings.compile_config({})
+
+        self.assertIn(f'-{datetime.now().year}', config.fingerprint)
+        self.assertNotEqual(config.fingerprint, settings.compile_config({'years': {'max': 2000}}).fingerprint)
+
+    def test_apply_config(self):
+        settings.apply_config(settings.compile_config({'templates': {'movie': '{title} [[{year}]]/{title}.{ext}'},
+                                                       'years': {'min': 1920}}))
+        log = logging.getLogger('media_log')
+        with tempfile.TemporaryDirectory() as directory:
+            folder = os.path.join(directory, 'Movie', 'Metropolis.1927')
+            os.makedirs(folder)
+
+            plan = mediarenamer.plan_movie_folder(folder, PathClaims(), os.path.dirname(folder), log)
+
+            self.assertEqual(utils.extract_movie_year_from_string('Metropolis.1927'), '1927')
+            self.assertEqual([operation.describe() for operation in plan],
+                             [f'RENAME {folder} -> {os.path.dirname(folder)}/Metropolis [1927]'])
+
+    def test_run_roots_uses_config_of_every_root(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.dict(os.environ, {'XDG_CACHE_HOME': directory, 'XDG_CONFIG_HOME': directory}):
+            roots = [os.path.join(directory, name, 'Movie') for name in ('a', 'b')]
+            for root in roots:
+                os.makedirs(os.path.join(root, 'The.Matrix.1999.1080p'))
+                open(os.path.join(root, 'The.Matrix.1999.1080p', 'the.matrix.1999.mkv'), 'w').close()
+            with open(os.path.join(roots[0], '.mediarenamer.toml'), 'wb') as f:
+                f.write(b'[templates]\nmovie = "{title} [[{year}]]/{title}.{ext}"\n')
+
+            mediarenamer.run_roots(roots, use_journal=False, use_index=False)
+
+            self.assertTrue(os.path.isfile(os.path.join(roots[0], 'The Matrix [1999]', 'The Matrix.mkv')))
+            self.assertTrue(os.path.isfile(os.path.join(roots[1], 'The Matrix (1999)', 'The Matrix (1999).mkv')))
+            self.assertEqual(settings.get_config().fingerprint, settings.default_config().fingerprint)
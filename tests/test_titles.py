@@ -0,0 +1,108 @@
+import os
+import sys
+import logging
+import subprocess
+import tempfile
+from unittest import TestCase
+
+from mediarenamer import commands, file_utils, titles, utils
+from mediarenamer.exceptions import ParserException
+from mediarenamer.walker import PathClaims
+
+TITLE_BASICS = [
+    ('tt0062622', 'movie', '2001: A Space Odyssey', '2001: A Space Odyssey', '0', '1968'),
+    ('tt0078748', 'movie', 'Alien', 'Alien', '0', '1979'),
+    ('tt0211915', 'movie', 'Amélie', 'Le fabuleux destin d\'Amélie Poulain', '0', '2001'),
+    ('tt0133093', 'movie', 'The Matrix', 'The Matrix', '0', '1999'),
+    ('tt0234215', 'movie', 'The Matrix Reloaded', 'The Matrix Reloaded', '0', '2003'),
+    ('tt0081505', 'movie', 'The Shining', 'The Shining', '0', '1980'),
+    ('tt0118691', 'tvMovie', 'The Shining', 'The Shining', '0', '1997'),
+    ('tt4158110', 'tvSeries', 'Mr. Robot', 'Mr. Robot', '0', '2015'),
+    ('tt3230854', 'tvSeries', 'The Expanse', 'The Expanse', '0', '2015'),
+    ('tt5753856', 'tvSeries', 'Darko', 'Darko', '0', '2017'),
+    ('tt0000001', 'short', 'Carmencita', 'Carmencita', '0', '1894'),
+]
+
+
+class TestTitles(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        tsv_path = os.path.join(self.directory.name, 'title.basics.tsv')
+        with open(tsv_path, 'w', encoding='utf-8') as f:
+            f.write('tconst\ttitleType\tprimaryTitle\toriginalTitle\tisAdult\tstartYear\tendYear\n')
+            for row in TITLE_BASICS:
+                f.write('\t'.join(row) + '\t\\N\n')
+        self.index_path = os.path.join(self.directory.name, 'cache', 'titles.idx')
+        self.count = titles.build_title_index(tsv_path, self.index_path)
+        self.index = titles.TitleIndex(self.index_path)
+
+    def tearDown(self):
+        titles.set_title_index(None)
+        self.index.close()
+        self.directory.cleanup()
+
+    def test_normalize_title(self):
+        self.assertEqual(titles.normalize_title('Amélie: The Movie'), 'amelie the movie')
+        self.assertEqual(titles.normalize_title('Law & Order'), 'law and order')
+        self.assertEqual(titles.normalize_title('  Mr.  Robot '), 'mr robot')
+
+    def test_match(self):
+        # Original titles are indexed as well, the short is left out
+        self.assertEqual((self.count, len(self.index)), (11, 11))
+        self.assertEqual(self.index.match('mr robot'), titles.TitleMatch('Mr. Robot', 2015, titles.SHOW, 1.0))
+        self.assertEqual(self.index.match('Le Fabuleux Destin d Amelie Poulain').title, 'Amélie')
+        self.assertEqual(self.index.match('The Shining', 1997).year, 1997)
+        self.assertEqual(self.index.match('The Shining', 1980).year, 1980)
+        self.assertIsNone(self.index.match('The Shining', 2010))
+        self.assertIsNone(self.index.match('Alien', kind=titles.SHOW))
+        self.assertIsNone(self.index.match('Carmencita'))
+
+        fuzzy = self.index.match('The Matirx', 1999)
+        self.assertEqual((fuzzy.title, fuzzy.year), ('The Matrix', 1999))
+        self.assertLess(fuzzy.score, 1.0)
+        self.assertEqual(self.index.match('The Matrix Reloded').title, 'The Matrix Reloaded')
+        self.assertIsNone(self.index.match('Something Else Entirely'))
+        self.assertIsNone(self.index.match('The Matirx', 1999, fuzzy=False))
+
+    def test_prefix(self):
+        self.assertEqual([match.title for match in self.index.prefix('the mat')], ['The Matrix', 'The Matrix Reloaded'])
+        self.assertEqual([match.year for match in self.index.prefix('The Shining', kind=titles.MOVIE)], [1980, 1997])
+        self.assertEqual(self.index.prefix('zzz'), [])
+
+    def test_invalid_index(self):
+        broken_path = os.path.join(self.directory.name, 'broken.idx')
+        with open(broken_path, 'wb') as f:
+            f.write(b'not an index')
+        with self.assertRaises(ParserException):
+            titles.TitleIndex(broken_path)
+
+    def test_names_snap_to_canonical_titles(self):
+        log = logging.getLogger('media_log')
+        library = os.path.join(self.directory.name, 'TV')
+        for show in ('Mr Robot (2015)', 'The Expanse', 'Dark', 'Darko (2017)', 'Unknown Show (2020)'):
+            os.makedirs(os.path.join(library, show))
+        snapshot = file_utils.take_directory_snapshot(library)
+        self.assertEqual(utils.extract_show_name_from_directory_basename('Mr Robot (2015)'), 'Mr Robot')
+
+        titles.set_title_index(self.index)
+        with self.assertLogs('media_log', 'INFO') as logs:
+            shows = dict((os.path.basename(folder), show_name) for folder, show_name in
+                         commands.iter_tv_shows(snapshot, log))
+        self.assertEqual(shows, {'Mr Robot (2015)': 'Mr. Robot', 'The Expanse': 'The Expanse', 'Darko (2017)': 'Darko',
+                                 'Unknown Show (2020)': 'Unknown Show',
+                                 # Without a year only the same title matches, a similar one may be another show
+                                 'Dark': 'Dark'})
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('Mr. Robot', logs.output[0])
+
+        folder = os.path.join(self.directory.name, 'Movie', 'amelie.2001.1080p')
+        os.makedirs(folder)
+        plan = commands.plan_movie_folder(folder, PathClaims(), os.path.dirname(folder), log)
+        self.assertEqual(plan.operations[0].target, os.path.join(os.path.dirname(folder), 'Amélie (2001)'))
+
+    def test_utils_does_not_import_titles(self):
+        code = 'import sys, mediarenamer.utils; print("mediarenamer.titles" in sys.modules)'
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual(output.stdout.strip(), 'False')
@@ -47,3 +47,38 @@ class TestUtils(TestCase):
         self.assertEqual(utils.get_episode_number_from_file_name(self.file_list[4]), 1)
         self.assertEqual(utils.get_episode_number_from_file_name(self.file_list[5]), 1)
         self.assertEqual(utils.get_episode_number_from_file_name(self.file_list[6]), 1)
+
+    def test_filename_parser_parse_many(self):
+        parser = utils.FilenameParser(max_year=2025)
+
+        records = parser.parse_many([self.file_list[0], self.file_list[4], self.season_directory_list[0], "Alien.1979"])
+
+        self.assertEqual(records[0], utils.ParsedName(self.file_list[0], 'Chernobyl', '01', '01', '2019', 'mkv'))
+        self.assertEqual(records[1], utils.ParsedName(self.file_list[4], 'Riverdale US', '02', '01', None, 'mkv'))
+        self.assertEqual(records[2], utils.ParsedName(self.season_directory_list[0], 'Futurama', '8', None, '1999', None))
+        self.assertEqual(records[3], utils.ParsedName("Alien.1979", 'Alien', None, None, '1979', None))
+
+    def test_filename_parser_year_bounds(self):
+        parser = utils.FilenameParser(min_year=1950, max_year=2020)
+
+        self.assertEqual(parser.year("Heat.1995.mkv"), '1995')
+        self.assertIsNone(parser.year("Metropolis.1927.mkv"))
+        self.assertIsNone(parser.year("Dune.2021.mkv"))
+
+    def test_wrappers_match_parser(self):
+        for file in self.file_list:
+            record = utils.DEFAULT_PARSER.parse(file)
+            self.assertEqual(utils.extract_episode_number_from_file_name(file), record.episode)
+            self.assertEqual(utils.extract_season_number_from_directory_name(file), record.season)
+            self.assertEqual(utils.extract_movie_year_from_string(file), record.year)
+        with self.assertRaises(utils.ParserException):
+            utils.extract_movie_year_from_string(None)
+
+    def test_parse_names_on_process_pool(self):
+        names = (self.file_list + self.season_directory_list) * 20
+
+        records = utils.parse_names(names, workers=2, chunk_size=7)
+
+        self.assertEqual(records, utils.DEFAULT_PARSER.parse_many(names))
+        # Pools are started from walker threads, forking a threaded process is not safe
+        self.assertNotEqual(utils._get_pool_context().get_start_method(), 'fork')
@@ -0,0 +1,100 @@
+import os
+import logging
+import tempfile
+from unittest import TestCase
+
+from mediarenamer import mediarenamer, file_utils, probe, verify
+from mediarenamer.exceptions import FileException
+from tests.test_probe import box, ebml, ebml_uint, matroska, mp4
+
+
+def live_matroska(cluster_count: int = 3) -> bytes:
+    # Segment of unknown size, as written by recorders that never seek back to fill it in
+    header = ebml(probe.EBML_ID, ebml(probe.EBML_DOC_TYPE_ID, b'matroska'))
+    clusters = b''.join(ebml(probe.CLUSTER_ID, bytes([index + 1]) * 1000) for index in range(cluster_count))
+    cues = ebml(verify.CUES_ID, ebml_uint(0xBB, 1))
+    return header + probe.SEGMENT_ID.to_bytes(4, 'big') + b'\x01\xff\xff\xff\xff\xff\xff\xff' + clusters + cues
+
+
+class TestVerify(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name: str, content: bytes) -> str:
+        path = os.path.join(self.directory.name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def check(self, name: str, content: bytes) -> verify.VerifyResult:
+        return verify.check_file(self.write(name, content))
+
+    def test_check_matroska(self):
+        self.assertTrue(self.check('movie.mkv', matroska()).ok)
+        self.assertTrue(self.check('seek.mkv', matroska(tracks_after_clusters=True)).ok)
+        self.assertTrue(self.check('live.mkv', live_matroska()).ok)
+
+        self.assertIn('segment ends at byte', self.check('cut.mkv', matroska()[:-100]).error)
+        self.assertIn('Final Matroska cluster ends', self.check('live cut.mkv', live_matroska()[:-600]).error)
+
+    def test_check_mp4(self):
+        self.assertTrue(self.check('movie.mp4', mp4()).ok)
+        self.assertEqual(self.check('movie.mp4', mp4()).container, 'mp4')
+
+        self.assertIn('moov box ends at byte', self.check('cut.mp4', mp4()[:-10]).error)
+        self.assertEqual(self.check('no moov.mp4', box(b'ftyp', b'isom') + b'\0\0\0\0mdat' + b'\1' * 100).error,
+                         'Missing MP4 movie box')
+        preallocated = box(b'ftyp', b'isom') + box(b'moov', b'\1' * 100) + box(b'mdat', b'\0' * 8192)
+        # Zero padding alone does not prove the file is truncated
+        result = self.check('preallocated.mp4', preallocated)
+        self.assertTrue(result.ok)
+        self.assertIn('zero bytes', result.warning)
+
+    def test_check_other_files(self):
+        result = self.check('movie.avi', b'RIFF' + b'\0' * 100)
+
+        self.assertTrue(result.ok)
+        self.assertIsNone(result.container)
+        self.assertEqual([result.path for result in verify.verify_files(
+            [self.write('a.mkv', matroska()), self.write('b.mkv', matroska()[:-1])], jobs=2) if not result.ok],
+            [os.path.join(self.directory.name, 'b.mkv')])
+
+    def test_verify_library_quarantines_truncated_files(self):
+        log = logging.getLogger('media_log')
+        library = os.path.join(self.directory.name, 'Movie')
+        quarantine = os.path.join(self.directory.name, 'Quarantine')
+        truncated = self.write('Movie/Alien.1979/alien.1979.mkv', matroska()[:-100])
+        self.write('Movie/The.Matrix.1999/the.matrix.1999.mkv', matroska())
+
+        self.assertEqual(mediarenamer.verify_library(library, 2, log, quarantine, dry_run=True), {truncated})
+        plan = mediarenamer.plan_movie_library(library, file_utils.take_directory_snapshot(library), 1, log,
+                                               truncated_files={truncated})
+        self.assertEqual(len(plan), 2)
+        self.assertFalse([operation for operation in plan if 'Alien' in operation.source])
+
+        self.assertEqual(mediarenamer.verify_library(library, 2, log, quarantine), set())
+        self.assertTrue(os.path.isfile(os.path.join(quarantine, 'Movie', 'Alien.1979', 'alien.1979.mkv')))
+        self.assertFalse(os.path.exists(truncated))
+
+    def test_verify_library_rejects_quarantine_inside_library(self):
+        library = os.path.join(self.directory.name, 'Movie')
+        self.write('Movie/Alien.1979/alien.1979.mkv', matroska()[:-100])
+
+        with self.assertRaises(FileException):
+            mediarenamer.verify_library(library, 1, logging.getLogger('media_log'), os.path.join(library, 'Broken'))
+        self.assertTrue(os.path.exists(os.path.join(library, 'Alien.1979', 'alien.1979.mkv')))
+
+    def test_run_path_leaves_truncated_download_alone(self):
+        library = os.path.join(self.directory.name, 'Movie')
+        truncated = self.write('Movie/Alien.1979.mkv', matroska()[:-100])
+        self.write('Movie/The.Matrix.1999.mkv', matroska())
+
+        mediarenamer.run_path(truncated, use_journal=False, verify=True)
+        mediarenamer.run_path(os.path.join(library, 'The.Matrix.1999.mkv'), use_journal=False, verify=True)
+
+        self.assertEqual(sorted(os.listdir(library)), ['Alien.1979.mkv', 'The Matrix (1999)'])
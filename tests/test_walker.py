@@ -0,0 +1,130 @@
+import os
+import tempfile
+import threading
+from unittest import TestCase, mock
+
+from mediarenamer import walker
+
+
+class TestWalker(TestCase):
+
+    def test_walk_library_merges_results_in_folder_order(self):
+        folders = [f'/library/Movie/{name}' for name in ('c', 'a', 'b', 'd')]
+
+        results = walker.walk_library(folders, lambda folder, claims: os.path.basename(folder), jobs=4)
+
+        self.assertEqual([result.folder for result in results], sorted(folders))
+        self.assertEqual([result.result for result in results], ['a', 'b', 'c', 'd'])
+
+    def test_walk_library_isolates_errors(self):
+        def worker(folder, claims):
+            if folder.endswith('b'):
+                raise ValueError('broken')
+            return folder
+
+        results = walker.walk_library(['/x/a', '/x/b', '/x/c'], worker, jobs=2)
+
+        self.assertEqual([result.ok for result in results], [True, False, True])
+        self.assertIsInstance(results[1].error, ValueError)
+
+    def test_walk_library_never_hands_out_the_same_path_twice(self):
+        with tempfile.TemporaryDirectory() as directory:
+            folder = os.path.join(directory, 'Heat (1995)')
+            os.mkdir(folder)
+            seen = []
+            lock = threading.Lock()
+
+            def worker(path, claims):
+                with lock:
+                    seen.append(path)
+
+            walker.walk_library([folder, folder, os.path.join(directory, '.', 'Heat (1995)')], worker, jobs=3)
+
+            self.assertEqual(len(seen), 1)
+
+    def test_path_claims(self):
+        claims = walker.PathClaims()
+
+        self.assertTrue(claims.claim('/Movie/Heat (1995)', '/Movie/Heat.1995'))
+        self.assertTrue(claims.claim('/Movie/Heat (1995)', '/Movie/Heat.1995'))
+        self.assertFalse(claims.claim('/Movie/Heat (1995)', '/Movie/heat 1995'))
+        self.assertEqual(claims.owner('/Movie/Heat (1995)'), '/Movie/Heat.1995')
+
+    def test_walk_roots_limits_concurrency_per_device(self):
+        devices = {'/mnt/a/Movie': 1, '/mnt/a/TV': 1, '/mnt/a/Music': 1, '/mnt/b/Movie': 2, '/mnt/b/TV': 2}
+        lock = threading.Lock()
+        running = {1: 0, 2: 0}
+        peak = {1: 0, 2: 0}
+        both_devices_busy = threading.Event()
+
+        def worker(root):
+            device = devices[root]
+            with lock:
+                running[device] += 1
+                peak[device] = max(peak[device], running[device])
+                if running[1] and running[2]:
+                    both_devices_busy.set()
+            both_devices_busy.wait(1)
+            with lock:
+                running[device] -= 1
+            return device
+
+        results = walker.walk_roots(list(devices) + ['/mnt/a/Movie'], worker, device_of=devices.__getitem__)
+
+        self.assertEqual([result.folder for result in results], sorted(devices))
+        self.assertEqual([result.result for result in results], [1, 1, 1, 2, 2])
+        self.assertEqual(peak, {1: 1, 2: 1})
+        self.assertTrue(both_devices_busy.is_set())
+
+    def test_iter_tree_prunes_and_stops_on_symlink_loops(self):
+        with tempfile.TemporaryDirectory() as directory:
+            show = os.path.join(directory, 'Show (2001)')
+            os.makedirs(os.path.join(show, 'Season 1', 'Featurettes'))
+            os.makedirs(os.path.join(directory, '.hidden'))
+            for name in ('Season 1/e01.mkv', 'Season 1/e02.mkv.parts', 'Season 1/Featurettes/x.mkv'):
+                open(os.path.join(show, name), 'w').close()
+            os.symlink(directory, os.path.join(show, 'Season 1', 'loop'))
+
+            prune = walker.prune_any(walker.PRUNE_DOWNLOADS, walker.prune_names('Featurettes'))
+            entries = list(walker.iter_tree(directory, prune=prune, follow_symlinks=True))
+
+            self.assertEqual(sorted((entry.path, entry.is_dir, entry.depth) for entry in entries), [
+                (show, True, 0),
+                (os.path.join(show, 'Season 1'), True, 1),
+                (os.path.join(show, 'Season 1', 'e01.mkv'), False, 2),
+                (os.path.join(show, 'Season 1', 'loop'), True, 2),
+            ])
+            self.assertEqual([entry.name for entry in walker.iter_tree(directory, prune=prune, max_depth=0)],
+                             ['Show (2001)'])
+
+            tree = walker.iter_tree(directory)
+            self.assertTrue(next(tree).path.startswith(directory))
+            tree.close()
+            with self.assertRaises(walker.DirectoryScanException):
+                next(walker.iter_tree(os.path.join(directory, 'missing')))
+
+    def test_iter_tree_skips_entries_that_fail(self):
+        class VanishedEntry(object):
+            def __init__(self, entry):
+                self.path, self.name = entry.path, entry.name
+
+            def is_symlink(self):
+                raise FileNotFoundError(self.path)
+
+        def open_directory(path):
+            with os.scandir(path) as iterator:
+                entries = sorted(iterator, key=lambda entry: entry.name)
+            return (VanishedEntry(entry) if entry.name == 'b.mkv' else entry for entry in entries)
+
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ('a.mkv', 'b.mkv', 'c.mkv'):
+                open(os.path.join(directory, name), 'w').close()
+            errors = []
+
+            with mock.patch.object(walker, '_open_directory', open_directory):
+                names = [entry.name for entry in walker.iter_tree(directory, on_error=errors.append)]
+                with self.assertRaises(walker.DirectoryScanException):
+                    list(walker.iter_tree(directory))
+
+            self.assertEqual(names, ['a.mkv', 'c.mkv'])
+            self.assertEqual(len(errors), 1)
@@ -0,0 +1,60 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from mediarenamer import watch
+
+
+class TestWatch(TestCase):
+
+    def test_debouncer_waits_for_stable_size(self):
+        now = [0.0]
+        sizes = {'/Movie/Dune (2021)': (100, 1, False)}
+        debouncer = watch.Debouncer(settle=2.0, clock=lambda: now[0], signature=lambda path: sizes.get(path))
+
+        debouncer.add('/Movie/Dune (2021)')
+        debouncer.add('/Movie/Dune.2021.mkv.parts')
+        now[0] = 1.0
+        self.assertEqual(debouncer.ready(), [])
+
+        # Still growing after the settle time, the path stays pending
+        sizes['/Movie/Dune (2021)'] = (200, 1, False)
+        now[0] = 2.5
+        self.assertEqual(debouncer.ready(), [])
+        self.assertEqual(len(debouncer), 1)
+
+        now[0] = 5.0
+        self.assertEqual(debouncer.ready(), ['/Movie/Dune (2021)'])
+        self.assertEqual(len(debouncer), 0)
+        self.assertIsNone(debouncer.next_deadline())
+
+    def test_debouncer_holds_folders_with_partial_files(self):
+        now = [0.0]
+        debouncer = watch.Debouncer(settle=1.0, clock=lambda: now[0], signature=lambda path: (10, 2, True))
+
+        debouncer.add('/Movie/Dune (2021)')
+        now[0] = 10.0
+
+        self.assertEqual(debouncer.ready(), [])
+        self.assertEqual(len(debouncer), 1)
+
+    def test_watchers_report_root_entries(self):
+        with tempfile.TemporaryDirectory() as directory:
+            os.mkdir(os.path.join(directory, 'Heat (1995)'))
+            watchers = [watch.PollingWatcher(directory, interval=0.01)]
+            try:
+                watchers.append(watch.InotifyWatcher(directory))
+            except watch.FileException:
+                pass
+
+            open(os.path.join(directory, 'Alien.1979.mkv'), 'w').close()
+            open(os.path.join(directory, 'Heat (1995)', 'heat.mp4'), 'w').close()
+
+            for watcher in watchers:
+                try:
+                    changed = watcher.poll(1.0)
+                finally:
+                    watcher.close()
+                self.assertIn(os.path.join(directory, 'Alien.1979.mkv'), changed)
+                if isinstance(watcher, watch.InotifyWatcher):
+                    self.assertIn(os.path.join(directory, 'Heat (1995)'), changed)